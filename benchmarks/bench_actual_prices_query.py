@@ -0,0 +1,68 @@
+"""
+Сравнение скорости и результата запросов актуальных цен на комплектацию:
+search_actual_prices_by_version_old_query (general_table + GROUP BY) и
+search_actual_prices_by_version_query (DISTINCT ON по latest_prices_phones_table).
+
+Запуск из корня проекта: python -m benchmarks.bench_actual_prices_query [кол-во комплектаций] [кол-во повторов]
+"""
+import sys
+import time
+
+from modules.common.db_wrapper import DataBase
+import modules.common.sql_req as sr
+
+
+def run_query(db, query, versions_list, repeat):
+    """
+    Выполнение запроса для всех комплектаций @repeat раз. Возвращает время в секундах и результаты последнего прохода
+    """
+    result_dict = {}
+    time_start = time.perf_counter()
+    for _ in range(repeat):
+        for version in versions_list:
+            result_dict[version] = db.execute_read_query(query, version) or []
+
+    return time.perf_counter() - time_start, result_dict
+
+
+def main():
+    num_versions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    db = DataBase()
+    if not db.connect_or_create("parser", "postgres", "1990", "127.0.0.1", "5432"):
+        print("Нет подключения к БД")
+        return
+
+    versions_list = [tuple(item) for item in db.execute_read_query(sr.select_versions_names_query,
+                                                                   (num_versions,)) or []]
+    if not versions_list:
+        print("В БД нет комплектаций")
+        db.disconnect()
+        return
+
+    # Прогрев кэша PostgreSQL
+    run_query(db, sr.search_actual_prices_by_version_old_query, versions_list, 1)
+    run_query(db, sr.search_actual_prices_by_version_query, versions_list, 1)
+
+    old_time, old_result = run_query(db, sr.search_actual_prices_by_version_old_query, versions_list, repeat)
+    new_time, new_result = run_query(db, sr.search_actual_prices_by_version_query, versions_list, repeat)
+
+    # Старый запрос при совпадении datetime может вернуть несколько строк на один url, новый - всегда одну
+    mismatch_list = [version for version in versions_list
+                     if set(old_result[version]) != set(new_result[version])]
+
+    num_queries = len(versions_list) * repeat
+    print("Комплектаций: {}, повторов: {}".format(len(versions_list), repeat))
+    print("old: {:.3f} сек, {:.2f} мс/запрос".format(old_time, old_time * 1000 / num_queries))
+    print("new: {:.3f} сек, {:.2f} мс/запрос".format(new_time, new_time * 1000 / num_queries))
+    print("Ускорение: x{:.1f}".format(old_time / new_time if new_time else 0))
+    print("Расхождений в результатах: {}".format(len(mismatch_list)))
+    for version in mismatch_list[:10]:
+        print("  {}: old = {}, new = {}".format(version, old_result[version], new_result[version]))
+
+    db.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Сравнение движков разбора страниц каталога (bs4 и lxml) на сохраненных html страницах всех магазинов.
+Страницы берутся из каталога <pages_dir>/<shop>/*.html или *.html.gz, где shop - mvideo, mts, dns, citilink, eldorado.
+Парсеры создаются без браузера, для каждой страницы сравнивается время и результат _parse_catalog_page.
+
+Запуск из корня проекта: python -m benchmarks.bench_html_extractor [pages_dir] [кол-во повторов]
+"""
+import os
+import sys
+import glob
+import gzip
+import time
+
+import modules.runner.runner_helper as rh
+from modules.data_receiver.parsers import html_extractor
+from modules.data_receiver.parsers.mvideo_parse import MVideoParse
+from modules.data_receiver.parsers.mts_parse import MTSParse
+from modules.data_receiver.parsers.dns_parse import DNSParse
+from modules.data_receiver.parsers.citilink_parse import CitilinkParse
+from modules.data_receiver.parsers.eldorado_parse import EldoradoParse
+
+PARSERS_LIST = [MVideoParse, MTSParse, DNSParse, CitilinkParse, EldoradoParse]
+
+
+def load_pages(path):
+    """
+    Чтение всех сохраненных страниц магазина
+    """
+    pages_list = []
+    for file_path in sorted(glob.glob(os.path.join(path, '*.html')) + glob.glob(os.path.join(path, '*.html.gz'))):
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'rt', encoding='utf-8') as f:
+            pages_list.append(f.read())
+
+    return pages_list
+
+
+def parse_pages(parser_class, engine, pages_list, repeat):
+    """
+    Разбор всех страниц @repeat раз. Вернет время в секундах и результат последнего прохода
+    """
+    parser = parser_class(with_browser=False)
+    parser.html_engine = engine
+    # Кэш названий отключен, чтобы сравнивать только разбор html
+    parser.model_name_cache.max_size = 0
+
+    time_start = time.perf_counter()
+    for _ in range(repeat):
+        parser.pr_result_list = []
+        for html in pages_list:
+            parser._parse_catalog_page(html)
+
+    return time.perf_counter() - time_start, parser.pr_result_list
+
+
+def main():
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join('benchmarks', 'pages')
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    if not html_extractor.IS_LXML_AVAILABLE:
+        print("lxml или cssselect не установлены")
+        return
+
+    rh.load_data()
+
+    print("{:<10} {:>6} {:>8} {:>10} {:>10} {:>8} {}".format(
+        "shop", "pages", "blocks", "bs4, s", "lxml, s", "x", "same result"))
+    for parser_class in PARSERS_LIST:
+        shop = parser_class(with_browser=False).shop
+        pages_list = load_pages(os.path.join(pages_dir, shop))
+        if not pages_list:
+            print("{:<10} нет сохраненных страниц".format(shop))
+            continue
+
+        bs4_time, bs4_result = parse_pages(parser_class, html_extractor.ENGINE_BS4, pages_list, repeat)
+        lxml_time, lxml_result = parse_pages(parser_class, html_extractor.ENGINE_LXML, pages_list, repeat)
+
+        print("{:<10} {:>6} {:>8} {:>10.3f} {:>10.3f} {:>8.1f} {}".format(
+            shop, len(pages_list), len(bs4_result), bs4_time, lxml_time,
+            bs4_time / lxml_time if lxml_time else 0, bs4_result == lxml_result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Сравнение трафика и времени загрузки первой страницы каталога каждого магазина в обычном и облегченном профиле
+браузера (lean_profile). Облегченный профиль берется из config.ini (lean_block и lean_allow_<shop>), если он
+выключен - блокируются все категории. Для каждого профиля страница загружается в новом браузере без постоянного
+профиля, чтобы кэш не влиял на результат.
+
+Запуск из корня проекта: python -m benchmarks.bench_lean_profile [кол-во повторов]
+"""
+import sys
+import time
+
+import modules.runner.runner_helper as rh
+from modules.runner.runner import PARSERS_LIST
+from modules.data_receiver.parsers import lean_profile, webdriver_profiles
+
+
+def load_page(url, shop, blocked_set):
+    """
+    Загрузка страницы в новом браузере. Вернет (время загрузки в секундах, байт, запросов, заблокировано запросов)
+    или None, если браузер не запустился
+    """
+    driver = webdriver_profiles.create_driver(shop=shop, blocked_set=blocked_set, is_report=True)
+    if not driver:
+        return None
+
+    try:
+        time_start = time.perf_counter()
+        driver.get(url)
+        load_time = time.perf_counter() - time_start
+        stats = lean_profile.collect_traffic_stats(driver)
+    finally:
+        driver.quit()
+
+    return (load_time,) + stats if stats else None
+
+
+def load_page_avg(url, shop, blocked_set, repeat):
+    """
+    Среднее по @repeat загрузкам страницы
+    """
+    result_list = [item for item in (load_page(url, shop, blocked_set) for _ in range(repeat)) if item]
+    if not result_list:
+        return None
+
+    return tuple(sum(item) / len(result_list) for item in zip(*result_list))
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+    rh.load_data()
+
+    print("{:<10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        "shop", "full, KB", "lean, KB", "saved, KB", "full, s", "lean, s", "saved, s", "blocked"))
+    for parser_class, _, url in PARSERS_LIST:
+        shop = parser_class(with_browser=False).shop
+        blocked_set = lean_profile.get_blocked_categories(shop) or \
+            set(lean_profile.BLOCKED_URL_PATTERNS_DICT.keys())
+
+        full = load_page_avg(url, shop, set(), repeat)
+        lean = load_page_avg(url, shop, blocked_set, repeat)
+        if not full or not lean:
+            print("{:<10} не удалось загрузить страницу".format(shop))
+            continue
+
+        print("{:<10} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.2f} {:>10.2f} {:>10.2f} {:>8.0f}".format(
+            shop, full[1] / 1024, lean[1] / 1024, (full[1] - lean[1]) / 1024,
+            full[0], lean[0], full[0] - lean[0], lean[3]))
+
+
+if __name__ == '__main__':
+    main()
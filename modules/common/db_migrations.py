@@ -0,0 +1,86 @@
+from modules.common import sql_req as sr, helper as h
+
+logger = h.logging.getLogger('DBMigrations')
+
+# Ключ advisory-блокировки PostgreSQL на время применения миграции
+MIGRATION_LOCK_KEY = 20210601
+
+# Список миграций схемы: (версия, описание, список запросов). Версии идут строго по возрастанию,
+# уже примененные миграции не изменяются - для новых изменений схемы добавляется новая запись в конец
+MIGRATIONS_LIST = [
+    (1, "latest_prices_phones_table", [
+        sr.create_latest_prices_phones_table_query,
+        sr.fill_latest_prices_phones_table_query,
+    ]),
+    (2, "lookup and price indexes", [
+        sr.create_lookup_indexes_query,
+    ]),
+    # Удаление дубликатов добавлено в миграцию 3 после выпуска: в базах с дубликатами она не применялась,
+    # а в базах, где она применена, дубликатов нет
+    (3, "unique lookup indexes", [
+        sr.delete_duplicate_lookup_rows_query,
+        sr.create_unique_lookup_indexes_query,
+    ]),
+]
+
+
+def get_schema_version(db):
+    """
+    Текущая версия схемы базы данных
+    """
+    result = db.execute_read_query(sr.select_schema_version_query)
+    return result[0][0] if result else 0
+
+
+def _apply_migration(db, version, description, query_list):
+    """
+    Применение одной миграции в отдельной транзакции. Версия отмечается в той же транзакции, поэтому
+    при ошибке база остается на предыдущей версии
+    """
+    if not db.begin_transaction():
+        return False
+
+    if not db.execute_query(sr.lock_schema_migration_query, (MIGRATION_LOCK_KEY,)):
+        db.rollback_transaction()
+        return False
+
+    # Пока ждали блокировку, миграцию мог применить другой модуль
+    if get_schema_version(db) >= version:
+        db.rollback_transaction()
+        return True
+
+    for query in query_list:
+        if not db.execute_query(query):
+            logger.error("Миграция {} '{}' не применена".format(version, description))
+            db.rollback_transaction()
+            return False
+
+    if not db.execute_query(sr.insert_schema_version_query, (version, description)) or \
+            not db.commit_transaction():
+        db.rollback_transaction()
+        return False
+
+    logger.info("Применена миграция {} '{}'".format(version, description))
+    return True
+
+
+def apply_migrations(db):
+    """
+    Применение всех еще не примененных миграций к базе данных по порядку.
+    При ошибке миграции следующие не применяются
+    """
+    if not db.execute_query(sr.create_schema_version_table_query):
+        logger.error("Не удалось создать таблицу версий схемы")
+        return False
+
+    cur_version = get_schema_version(db)
+    for version, description, query_list in MIGRATIONS_LIST:
+        if version <= cur_version:
+            continue
+
+        if not _apply_migration(db, version, description, query_list):
+            logger.error("Схема базы данных остается на версии {}, миграции с {} не применены".format(
+                get_schema_version(db), version))
+            return False
+
+    return True
@@ -1,6 +1,10 @@
+import io
+import csv
+
 import psycopg2
+import psycopg2.extras
 from psycopg2 import OperationalError
-from modules.common import sql_req as sr, helper as h
+from modules.common import sql_req as sr, helper as h, db_migrations
 
 logger = h.logging.getLogger('DBWrapper')
 
@@ -12,9 +16,14 @@ class DataBase:
 
     :method connect: Подключение к БД
     :method create_database: Создание базы данных
-    :method connect_or_create: Попытка подключиться к запрашиваемой БД, если не получилось - создание этой БД
+    :method connect_or_create: Попытка подключиться к запрашиваемой БД, если не получилось - создание этой БД.
+        В обоих случаях к БД применяются миграции схемы из db_migrations, без них соединение закрывается
     :method execute_query: Отправка sql запроса в БД
     :method execute_read_query: Отправка sql запроса в БД с получением ответа
+    :method execute_copy_query: Загрузка списка кортежей в таблицу через COPY
+    :method begin_transaction: Начало транзакции (отключение autocommit)
+    :method commit_transaction: Подтверждение транзакции
+    :method rollback_transaction: Откат транзакции
     :method disconnect: Отключение от БД
     :method __create_tables_and_views: Создание таблиц, если они отсутствуют и заполнение вспомогательных данными.
         Необходимо реализовать отдельные методы по созданию и заполнению таблиц и вызывать их здесь.
@@ -119,7 +128,7 @@ class DataBase:
         # Попытка подключится к запрашиваемой базе данных
         if self.connect(db_name, db_user, db_password, db_host, db_port):
             logger.info("Connected to Database {}".format(db_name))
-            return True
+            return self.__apply_migrations(db_name)
 
         # Если такой базы не существует, подключаемся к основной и создаем новую
         logger.info("Database '{}' not found, create '{}'".format(db_name, db_name))
@@ -138,7 +147,19 @@ class DataBase:
             return False
 
         self.__create_tables_and_views()
-        return True
+        return self.__apply_migrations(db_name)
+
+    def __apply_migrations(self, db_name):
+        """
+        Применение миграций схемы. Запросы DbInserter рассчитаны на последнюю версию схемы, поэтому с базой,
+        к которой миграции не применились, не работаем
+        """
+        if db_migrations.apply_migrations(self):
+            return True
+
+        logger.error("Не удалось применить миграции схемы к базе '{}', соединение закрыто".format(db_name))
+        self.disconnect()
+        return False
 
     def execute_query(self, query, variables=None):
         """
@@ -151,7 +172,7 @@ class DataBase:
 
         try:
             self.cursor.execute(query, variables)
-        except OperationalError as e:
+        except psycopg2.Error as e:
             logger.info("The error '{}' occurred".format(e))
             return False
 
@@ -175,10 +196,67 @@ class DataBase:
             result = self.cursor.fetchall()
             return result
 
-        except OperationalError as e:
+        except psycopg2.Error as e:
             logger.error("The error '{}' occurred".format(e))
             return None
 
+    def execute_copy_query(self, query, data_list):
+        """
+        Загрузка списка кортежей @data_list в таблицу через COPY ... FROM STDIN WITH (FORMAT csv).
+        Значения None записываются как NULL
+        """
+        if not self.connection:
+            logger.error("Can't execute copy query - no connection")
+            return False
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(data_list)
+        buffer.seek(0)
+
+        try:
+            self.cursor.copy_expert(query, buffer)
+        except psycopg2.Error as e:
+            logger.error("The error '{}' occurred".format(e))
+            return False
+
+        return True
+
+    def begin_transaction(self):
+        """
+        Начало транзакции - все следующие запросы выполняются до commit_transaction или rollback_transaction
+        """
+        if not self.connection:
+            logger.error("Can't begin transaction - no connection")
+            return False
+
+        self.connection.autocommit = False
+        return True
+
+    def commit_transaction(self):
+        """
+        Подтверждение транзакции и возврат в режим autocommit
+        """
+        try:
+            self.connection.commit()
+        except psycopg2.Error as e:
+            logger.error("The error '{}' occurred".format(e))
+            self.rollback_transaction()
+            return False
+
+        self.connection.autocommit = True
+        return True
+
+    def rollback_transaction(self):
+        """
+        Откат транзакции и возврат в режим autocommit
+        """
+        try:
+            self.connection.rollback()
+        except psycopg2.Error as e:
+            logger.error("The error '{}' occurred".format(e))
+
+        self.connection.autocommit = True
+
     def disconnect(self):
         """
         ОБЯЗАТЕЛЬНЫЙ МЕТОД
@@ -189,3 +267,6 @@ class DataBase:
 
         if self.connection:
             self.connection.close()
+
+        self.cursor = None
+        self.connection = None
@@ -1,5 +1,7 @@
+import os
 import re
 import csv
+import time
 from enum import Enum, auto
 from typing import Union
 from collections import namedtuple
@@ -30,6 +32,95 @@ def convert_namedtuple_fields_name(name):
     return name.replace('_', ' ').title()
 
 
+class FileLock:
+    """
+    Межпроцессная блокировка на основе файла: файл @path создается атомарно (O_CREAT | O_EXCL) на время работы
+    внутри with и удаляется при выходе. Файл блокировки старше @stale_sec считается оставшимся от упавшего процесса.
+    Если блокировку не удалось захватить за @timeout_sec, with выбрасывает TimeoutError
+    """
+    def __init__(self, path, timeout_sec=30.0, stale_sec=120.0, poll_sec=0.05):
+        self.path = path
+        self.timeout_sec = timeout_sec
+        self.stale_sec = stale_sec
+        self.poll_sec = poll_sec
+        self.is_locked = False
+
+    def acquire(self):
+        """
+        Захват блокировки. Вернет False, если не удалось захватить за timeout_sec
+        """
+        time_start = time.time()
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                self.is_locked = True
+                return True
+            except FileExistsError:
+                pass
+
+            # Удаление зависшей блокировки
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                continue
+
+            if time.time() - stat.st_mtime > self.stale_sec:
+                self.__remove_stale(stat)
+                continue
+
+            if time.time() - time_start > self.timeout_sec:
+                logger.error("Не удалось захватить блокировку {}".format(self.path))
+                return False
+
+            time.sleep(self.poll_sec)
+
+    def __remove_stale(self, stat):
+        """
+        Удаление зависшей блокировки, найденной как @stat. Файл сначала переименовывается, и удаляется, только если
+        это тот же файл: иначе между проверкой и переименованием зависшую блокировку уже удалил другой процесс и
+        захватил новую - она возвращается на место
+        """
+        stale_path = "{}.stale.{}.{}".format(self.path, os.getpid(), time.time_ns())
+        try:
+            os.rename(self.path, stale_path)
+        except OSError:
+            return
+
+        try:
+            renamed_stat = os.stat(stale_path)
+            if (renamed_stat.st_ino, renamed_stat.st_mtime) == (stat.st_ino, stat.st_mtime):
+                logger.warning("Удаляю зависшую блокировку {}".format(self.path))
+            else:
+                # Возврат чужой блокировки, если за это время не создана еще одна
+                os.link(stale_path, self.path)
+            os.remove(stale_path)
+        except OSError as e:
+            logger.error("Ошибка удаления зависшей блокировки {}, e = {}".format(self.path, e))
+
+    def release(self):
+        """
+        Освобождение блокировки
+        """
+        if not self.is_locked:
+            return
+
+        self.is_locked = False
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            logger.error("Не удалось удалить файл блокировки {}, e = {}".format(self.path, e))
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError("Не удалось захватить блокировку {}".format(self.path))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
 class FileWorker(Enum):
     """
     Класс, работающий с данными, которые впоследствии сохраняются в файлы. Имеет разные типы и, соответственно, разные
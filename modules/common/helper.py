@@ -2,10 +2,11 @@
 Главный общий файл-хэлпер с общими для многих файлов функциями и константами
 """
 import sys
+import re
 import collections
 import logging
-import random
 import os
+import threading
 from datetime import datetime, timedelta
 import modules.common.file_worker as fw
 
@@ -29,20 +30,13 @@ def del_old_logs():
             os.remove("logs/" + element.name)
 
 
-def get_proxy():
+def get_proxy(domain=None):
     """
-    Получить proxy из файла
+    Получить proxy для домена @domain из пула proxy (см. proxy_pool.ProxyPool)
     """
-    proxy_list = fw.FileWorker.list_data.load(PROXY_PATH)
+    from modules.common import proxy_pool
 
-    if not proxy_list:
-        logger.error("ОШИБКА PROXY, СПИСОК ПУСТ")
-        return None
-
-    proxy = proxy_list[random.randint(0, len(proxy_list) - 1)]
-    logger.info("Выбран PROXY: {}".format(proxy))
-
-    return proxy
+    return proxy_pool.get_pool().get_proxy(domain)
 
 
 def is_all_elem_equal_in_tuple_list(elements, pos):
@@ -77,15 +71,183 @@ def replace_value_from_dictionary(dictionary: dict, value):
     return value
 
 
+def compile_model_names_data():
+    """
+    Подготовка словаря исключений и списка разрешенных моделей к быстрому поиску: один регулярный шаблон по всем
+    ключам EXCEPT_MODEL_NAMES_DICT и множество названий ALLOWED_MODEL_NAMES_LIST_FOR_BASE в нижнем регистре.
+    Вызывается после загрузки этих данных
+    """
+    global EXCEPT_MODEL_NAMES_PATTERN, ALLOWED_MODEL_NAMES_SET
+
+    # Длинные ключи раньше коротких, чтобы при пересечении ключей совпадение было по самому длинному
+    keys = sorted(EXCEPT_MODEL_NAMES_DICT or {}, key=len, reverse=True)
+    EXCEPT_MODEL_NAMES_PATTERN = re.compile('|'.join(re.escape(key) for key in keys)) if keys else None
+    ALLOWED_MODEL_NAMES_SET = {item.lower() for item in ALLOWED_MODEL_NAMES_LIST_FOR_BASE or []}
+
+
+def find_and_replace_except_model_name(name):
+    """
+    Замена фраз в названии по словарю исключений EXCEPT_MODEL_NAMES_DICT. Если ни одного ключа в названии нет
+    (обычный случай), это определяется одним поиском по шаблону. Иначе - замена по словарю в том же порядке,
+    что и в replace_value_from_dictionary
+    """
+    if ALLOWED_MODEL_NAMES_SET is None:
+        compile_model_names_data()
+
+    if not EXCEPT_MODEL_NAMES_PATTERN or not EXCEPT_MODEL_NAMES_PATTERN.search(name):
+        return name
+
+    return replace_value_from_dictionary(EXCEPT_MODEL_NAMES_DICT, name)
+
+
 def find_allowed_model_names(model_name):
     """
     Поиск названия из списка известных моделей
     """
-    for item in ALLOWED_MODEL_NAMES_LIST_FOR_BASE:
-        if item.lower() == model_name.lower():
-            return True
+    if ALLOWED_MODEL_NAMES_SET is None:
+        compile_model_names_data()
+
+    return model_name.lower() in ALLOWED_MODEL_NAMES_SET
+
+
+def save_undefined_model_name(name):
+    """
+    Добавление неизвестной модели в общий для процесса набор. На диск набор записывается
+    flush_undefined_model_names один раз за работу парсера
+    """
+    with UNDEFINED_MODEL_NAMES_MUTEX:
+        UNDEFINED_MODEL_NAMES_SET.add(name)
+
+
+def flush_undefined_model_names():
+    """
+    Запись накопленных неизвестных моделей в UNDEFINED_MODEL_NAME_LIST_PATH: объединение с содержимым файла без
+    повторов и атомарная замена файла. Пока идет запись, существует лок-файл UNDEFINED_MODEL_NAME_LIST_LOCK_PATH,
+    запрещающий сервисному боту читать список (если его не создал runner, он создается здесь).
+    Одновременная запись из нескольких парсеров исключается блокировкой UNDEFINED_MODEL_NAME_LIST_WRITE_LOCK_PATH
+    """
+    with UNDEFINED_MODEL_NAMES_MUTEX:
+        new_names_set = set(UNDEFINED_MODEL_NAMES_SET)
+        UNDEFINED_MODEL_NAMES_SET.clear()
+
+    if not new_names_set:
+        return True
+
+    is_own_lock = not os.path.isfile(UNDEFINED_MODEL_NAME_LIST_LOCK_PATH)
+    if is_own_lock:
+        open(UNDEFINED_MODEL_NAME_LIST_LOCK_PATH, 'w').close()
+
+    is_saved = False
+    write_lock = fw.FileLock(UNDEFINED_MODEL_NAME_LIST_WRITE_LOCK_PATH)
+    try:
+        if write_lock.acquire():
+            names_list = fw.FileWorker.list_data.load(UNDEFINED_MODEL_NAME_LIST_PATH) + sorted(new_names_set)
+            tmp_path = UNDEFINED_MODEL_NAME_LIST_PATH + '.tmp'
+            fw.FileWorker.list_data.save(tmp_path, data=list(dict.fromkeys(names_list)))
+            os.replace(tmp_path, UNDEFINED_MODEL_NAME_LIST_PATH)
+            is_saved = True
+    except OSError as e:
+        logger.error("Не удалось сохранить список неизвестных моделей, e = {}".format(e))
+    finally:
+        write_lock.release()
+        if is_own_lock and os.path.isfile(UNDEFINED_MODEL_NAME_LIST_LOCK_PATH):
+            os.remove(UNDEFINED_MODEL_NAME_LIST_LOCK_PATH)
+
+    # При ошибке модели вернутся в набор и будут записаны при следующей попытке
+    if not is_saved:
+        with UNDEFINED_MODEL_NAMES_MUTEX:
+            UNDEFINED_MODEL_NAMES_SET.update(new_names_set)
+
+    return is_saved
+
+
+class IndexedNamedTupleList(list):
+    """
+    Список namedtuple с хэш-индексами для find_in_namedtuple_list. Индекс по набору полей строится при первом
+    поиске по этому набору и дополняется при append. Любое другое изменение списка сбрасывает индексы.
+    Как и в find_in_namedtuple_list, параметры поиска с пустым значением (None, 0, '') не учитываются
+    """
+    def __init__(self, *args):
+        super().__init__(*args)
+        # (поля, ...) -> {(значения, ...) -> [элементы в порядке списка]}
+        self.__indexes = {}
+
+    def __reduce__(self):
+        # pickle и copy восстанавливают список через __init__, индексы строятся заново при поиске
+        return self.__class__, (list(self),)
+
+    def __invalidate(self):
+        self.__indexes.clear()
+
+    def __build_index(self, fields):
+        index = {}
+        for item in self:
+            index.setdefault(tuple(getattr(item, field, None) for field in fields), []).append(item)
+
+        self.__indexes[fields] = index
+        return index
+
+    def find(self, limit_one=False, **kwargs):
+        """
+        Поиск элементов, у которых все переданные непустые поля равны заданным значениям
+        """
+        filters = sorted((field, value) for field, value in kwargs.items() if value)
+        if not filters:
+            return list(self[:1]) if limit_one else list(self)
+
+        fields = tuple(field for field, _ in filters)
+        index = self.__indexes.get(fields)
+        if index is None:
+            index = self.__build_index(fields)
+
+        result_list = index.get(tuple(value for _, value in filters), [])
+        return result_list[:1] if limit_one else list(result_list)
+
+    def append(self, item):
+        super().append(item)
+        for fields, index in self.__indexes.items():
+            index.setdefault(tuple(getattr(item, field, None) for field in fields), []).append(item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self.__invalidate()
 
-    return False
+    def remove(self, item):
+        super().remove(item)
+        self.__invalidate()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self.__invalidate()
+        return item
+
+    def clear(self):
+        super().clear()
+        self.__invalidate()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self.__invalidate()
+
+    def reverse(self):
+        super().reverse()
+        self.__invalidate()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self.__invalidate()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self.__invalidate()
 
 
 def find_in_namedtuple_list(namedtuple_list, brand_name=None, model_name=None, shop=None, category=None, color=None,
@@ -94,11 +256,19 @@ def find_in_namedtuple_list(namedtuple_list, brand_name=None, model_name=None, s
                             hist_min_price=None, hist_min_shop=None, hist_min_date=None, diff_cur_avg=None,
                             limit_one=False):
     """
-    Поиск элемента по любым параметрам в любом namedtuple
+    Поиск элемента по любым параметрам в любом namedtuple. Для IndexedNamedTupleList поиск идет по хэш-индексу
     """
     if not namedtuple_list:
         return []
 
+    if isinstance(namedtuple_list, IndexedNamedTupleList):
+        return namedtuple_list.find(
+            limit_one=limit_one, brand_name=brand_name, model_name=model_name, shop=shop, category=category,
+            color=color, ram=ram, rom=rom, price=price, img_url=img_url, url=url, rating=rating,
+            num_rating=num_rating, product_code=product_code, date_time=date_time, avg_actual_price=avg_actual_price,
+            hist_min_price=hist_min_price, hist_min_shop=hist_min_shop, hist_min_date=hist_min_date,
+            diff_cur_avg=diff_cur_avg)
+
     result_list = []
     for item in namedtuple_list:
         if brand_name and getattr(item, 'brand_name', None) != brand_name:
@@ -185,6 +355,7 @@ CSV_PATH = ROOT_PATH + "data/cache/goods.csv"
 CSV_PATH_RAW = ROOT_PATH + "data/cache/"
 # Путь к proxy
 PROXY_PATH = ROOT_PATH + "data/proxy/proxy.txt"
+PROXY_STATS_PATH = ROOT_PATH + "data/proxy/proxy_stats.csv"
 # Пути к словарям
 EXCEPT_MODEL_NAMES_PATH = ROOT_PATH + "data/dictionaries/except_model_names.dic"
 EXCEPT_MODEL_NAMES_TELEGRAM_PATH = ROOT_PATH + "data/dictionaries/except_model_names_telegram.dic"
@@ -195,9 +366,20 @@ NUM_POSTS_IN_TELEGRAM_PATH = ROOT_PATH + "data/databases/num_posts_in_telegram.d
 LIST_MODEL_NAMES_BASE_PATH = ROOT_PATH + "data/databases/list_model_names_base.dat"
 UNDEFINED_MODEL_NAME_LIST_PATH = ROOT_PATH + "data/databases/undefined_model_name.dat"
 UNDEFINED_MODEL_NAME_LIST_LOCK_PATH = ROOT_PATH + "data/databases/undefined_model_name.lock"
+UNDEFINED_MODEL_NAME_LIST_WRITE_LOCK_PATH = ROOT_PATH + "data/databases/undefined_model_name.write.lock"
 CRASH_DATA_PATH = ROOT_PATH + "data/databases/crash_data.dat"
 BOT_ACCOUNT_PATH = ROOT_PATH + "modules/data_sender/telegram/my_account"
 IMAGE_FOR_SEND_IN_TELEGRAM_PATH = ROOT_PATH + "data/cache/for_send/"
+# Путь к снимку кэша id продуктов, комплектаций и магазинов
+ID_CACHE_SNAPSHOT_PATH = ROOT_PATH + "data/cache/id_cache.pkl"
+MODEL_NAME_CACHE_PATH = ROOT_PATH + "data/cache/model_names/"
+HTTP_COOKIES_PATH = ROOT_PATH + "data/cache/cookies/"
+WEBDRIVER_PROFILES_PATH = ROOT_PATH + "data/cache/profiles/"
+PAGE_CACHE_PATH = ROOT_PATH + "data/cache/pages/"
+CRAWL_STATE_PATH = ROOT_PATH + "data/cache/crawl_state/"
+CRAWL_CHECKPOINT_PATH = ROOT_PATH + "data/cache/checkpoints/"
+SPAN_METRICS_PATH = ROOT_PATH + "data/cache/metrics/"
+RATE_LIMIT_PATH = ROOT_PATH + "data/cache/rate_limits/"
 
 # ----------------------------- КОЛЛЕКЦИЯ -----------------------------
 
@@ -205,6 +387,12 @@ IMAGE_FOR_SEND_IN_TELEGRAM_PATH = ROOT_PATH + "data/cache/for_send/"
 ALLOWED_MODEL_NAMES_LIST_FOR_BASE = []
 # Словарь исключений названий моделей
 EXCEPT_MODEL_NAMES_DICT = {}
+# Шаблон поиска ключей EXCEPT_MODEL_NAMES_DICT и множество разрешенных моделей, см. compile_model_names_data
+EXCEPT_MODEL_NAMES_PATTERN = None
+ALLOWED_MODEL_NAMES_SET = None
+# Неизвестные модели, найденные парсерами, до записи в UNDEFINED_MODEL_NAME_LIST_PATH
+UNDEFINED_MODEL_NAMES_SET = set()
+UNDEFINED_MODEL_NAMES_MUTEX = threading.Lock()
 # Единое название для всех восстановленных айфонов
 REBUILT_IPHONE_NAME = ""
 # Список слов, которые необходимо исключать из названий цветов
@@ -217,6 +405,19 @@ REF_LINK_MTS = ''
 REF_LINK_ELDORADO = ''
 REF_LINK_CITILINK = ''
 
+# ------------------- НАСТРОЙКИ БРАУЗЕРОВ И PROXY --------------------
+# Облегченный профиль браузера (см. lean_profile): включен ли, блокируемые категории ресурсов, разрешенные
+# категории по магазинам (lean_allow_<shop>) и сбор статистики трафика страниц
+LEAN_PROFILE = False
+LEAN_BLOCK_SET = set()
+LEAN_ALLOW_DICT = {}
+LEAN_REPORT = False
+# Постоянные профили браузеров магазинов (см. webdriver_profiles.ProfileSlots)
+WEBDRIVER_PROFILES = False
+# Остывание proxy после ошибки и доля ошибок, после которой proxy не используется (см. proxy_pool)
+PROXY_COOLDOWN_SEC = 600
+PROXY_MAX_FAILURE_RATE = 0.5
+
 DOMAIN_DNS = 'dns.ru'
 DOMAIN_MVIDEO = 'mvideo.ru'
 DOMAIN_MTS = 'mts.ru'
@@ -269,6 +470,21 @@ PriceChanges = collections.namedtuple(
     ),
 )
 
+# Статистика proxy для домена (см. proxy_pool.ProxyPool)
+ProxyStats = collections.namedtuple(
+    'ProxyStats',
+    (
+        'proxy',
+        'domain',
+        'num_requests',
+        'num_failures',
+        'num_bans',
+        'num_failures_in_row',
+        'avg_latency',
+        'cooldown_until',
+    ),
+)
+
 # -------------------- СПИСОК СООБЩЕНИЙ ТЕЛЕГРАМ ---------------------- #
 
 # Коллекция для хранения результатов парсинга одного товара (смартфоны)
@@ -0,0 +1,205 @@
+import os
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+import modules.common.helper as h
+from modules.common.file_worker import FileWorker, FileLock
+
+logger = h.logging.getLogger('ProxyPool')
+
+# Сглаживание средней задержки: доля нового измерения
+LATENCY_ALPHA = 0.3
+# Максимальный множитель времени остывания при повторных ошибках подряд
+MAX_COOLDOWN_FACTOR = 32
+
+
+class ProxyPool:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Пул proxy с учетом качества каждого proxy для каждого домена: средняя задержка загрузки страниц, доля ошибок,
+    кол-во банов. Для домена выбирается самый быстрый исправный proxy, еще не проверенные proxy выбираются в первую
+    очередь. После ошибки proxy остывает cooldown_sec, время остывания удваивается при каждой ошибке подряд.
+    Статистика сохраняется в csv (h.ProxyStats) и используется при следующих запусках.
+
+    :method get_proxy: Выбор proxy для домена
+    :method report_success: Успешная загрузка страницы через proxy
+    :method report_failure: Ошибка загрузки страницы или бан
+    :method probe: Проверка всех proxy запросом к url
+    :method save: Сохранение статистики на диск
+    """
+    def __init__(self, proxy_list=None, stats_path=None, cooldown_sec=600, max_failure_rate=0.5, min_requests=3):
+        self.proxy_list = proxy_list if proxy_list is not None else FileWorker.list_data.load(h.PROXY_PATH)
+        self.stats_path = stats_path
+        self.cooldown_sec = cooldown_sec
+        self.max_failure_rate = max_failure_rate
+        self.min_requests = min_requests
+        self.mutex = threading.Lock()
+        # (proxy, domain) -> h.ProxyStats
+        self.stats_dict = {}
+        self.__load()
+
+    def __load(self):
+        """
+        Чтение статистики прошлых запусков. В csv все значения - строки
+        """
+        if not self.stats_path or not os.path.isfile(self.stats_path):
+            return
+
+        for item in FileWorker.csv_data.load(self.stats_path, namedtuple_type=h.ProxyStats) or []:
+            try:
+                self.stats_dict[(item.proxy, item.domain)] = h.ProxyStats(
+                    proxy=item.proxy, domain=item.domain,
+                    num_requests=int(item.num_requests), num_failures=int(item.num_failures),
+                    num_bans=int(item.num_bans), num_failures_in_row=int(item.num_failures_in_row),
+                    avg_latency=float(item.avg_latency), cooldown_until=float(item.cooldown_until))
+            except ValueError:
+                continue
+
+    def __get_stats(self, proxy, domain):
+        return self.stats_dict.get((proxy, domain)) or h.ProxyStats(
+            proxy=proxy, domain=domain, num_requests=0, num_failures=0, num_bans=0, num_failures_in_row=0,
+            avg_latency=0.0, cooldown_until=0.0)
+
+    @staticmethod
+    def __get_priority(stats):
+        """
+        Порядок выбора proxy: непроверенные, затем с успешными запросами по задержке, затем только с ошибками
+        """
+        if not stats.num_requests:
+            return 0, 0.0
+        if stats.num_requests > stats.num_failures:
+            return 1, stats.avg_latency
+        return 2, 0.0
+
+    def is_healthy(self, stats):
+        """
+        Proxy исправен, если доля ошибок не превышает max_failure_rate (после min_requests запросов)
+        """
+        if stats.num_requests < self.min_requests:
+            return True
+        return stats.num_failures / stats.num_requests <= self.max_failure_rate
+
+    def get_proxy(self, domain=None):
+        """
+        Самый быстрый исправный proxy для домена @domain среди не остывающих. Если исправных нет - proxy, который
+        раньше всех закончит остывать. Вернет None, если список proxy пуст
+        """
+        if not self.proxy_list:
+            logger.error("ОШИБКА PROXY, СПИСОК ПУСТ")
+            return None
+
+        domain = domain or ''
+        now = time.time()
+        with self.mutex:
+            stats_list = [self.__get_stats(proxy, domain) for proxy in self.proxy_list]
+
+        ready_list = [item for item in stats_list if item.cooldown_until <= now and self.is_healthy(item)]
+        if ready_list:
+            # Непроверенные proxy в первую очередь, затем proxy с успешными запросами по средней задержке
+            random.shuffle(ready_list)
+            stats = min(ready_list, key=self.__get_priority)
+        else:
+            stats = min(stats_list, key=lambda item: item.cooldown_until)
+            logger.warning("Нет исправных proxy для {}, выбран остывающий".format(domain))
+
+        logger.info("Выбран PROXY: {} для {}".format(stats.proxy, domain))
+        return stats.proxy
+
+    def report_success(self, proxy, domain, latency_sec):
+        """
+        Успешная загрузка страницы через @proxy за @latency_sec
+        """
+        domain = domain or ''
+        with self.mutex:
+            stats = self.__get_stats(proxy, domain)
+            num_success = stats.num_requests - stats.num_failures
+            avg_latency = latency_sec if not num_success else \
+                stats.avg_latency + LATENCY_ALPHA * (latency_sec - stats.avg_latency)
+            self.stats_dict[(proxy, domain)] = stats._replace(
+                num_requests=stats.num_requests + 1, num_failures_in_row=0, avg_latency=avg_latency)
+
+    def report_failure(self, proxy, domain, is_ban=False):
+        """
+        Ошибка загрузки страницы через @proxy. Proxy остывает, при бане - в 4 раза дольше
+        """
+        domain = domain or ''
+        with self.mutex:
+            stats = self.__get_stats(proxy, domain)
+            num_failures_in_row = stats.num_failures_in_row + 1
+            cooldown_sec = self.cooldown_sec * min(2 ** (num_failures_in_row - 1), MAX_COOLDOWN_FACTOR)
+            if is_ban:
+                cooldown_sec *= 4
+
+            self.stats_dict[(proxy, domain)] = stats._replace(
+                num_requests=stats.num_requests + 1, num_failures=stats.num_failures + 1,
+                num_bans=stats.num_bans + int(is_ban), num_failures_in_row=num_failures_in_row,
+                cooldown_until=time.time() + cooldown_sec)
+
+        logger.warning("PROXY {} для {}: {}, остывание {} сек".format(
+            proxy, domain, "бан" if is_ban else "ошибка", int(cooldown_sec)))
+
+    def probe(self, url, timeout_sec=10):
+        """
+        Проверка всех proxy http запросом к @url, результат учитывается в статистике домена url
+        """
+        domain = "{0.scheme}://{0.netloc}".format(urlsplit(url))
+        for proxy in self.proxy_list:
+            time_start = time.time()
+            try:
+                response = requests.get(url, timeout=timeout_sec,
+                                        proxies={'http': 'http://' + proxy, 'https': 'http://' + proxy})
+            except requests.RequestException:
+                self.report_failure(proxy, domain)
+                continue
+
+            if response.status_code == 200:
+                self.report_success(proxy, domain, time.time() - time_start)
+            else:
+                self.report_failure(proxy, domain, is_ban=response.status_code in (403, 429))
+
+    def save(self):
+        """
+        Сохранение статистики. Запись из нескольких процессов разделяется блокировкой файла
+        """
+        if not self.stats_path or not self.stats_dict:
+            return
+
+        with self.mutex:
+            stats_list = [self.stats_dict[key] for key in sorted(self.stats_dict)]
+
+        try:
+            with FileLock(self.stats_path + '.lock'):
+                FileWorker.csv_data.save(self.stats_path, data=stats_list, namedtuple_type=h.ProxyStats)
+        except TimeoutError as e:
+            logger.error("Статистика proxy не сохранена, {}".format(e))
+
+
+# Пул proxy процесса, создается при первом обращении
+PROXY_POOL = None
+PROXY_POOL_MUTEX = threading.Lock()
+
+
+def get_pool():
+    """
+    Пул proxy текущего процесса с настройками из config.ini (читает runner_helper.read_config)
+    """
+    global PROXY_POOL
+
+    with PROXY_POOL_MUTEX:
+        if PROXY_POOL is None:
+            PROXY_POOL = ProxyPool(stats_path=h.PROXY_STATS_PATH, cooldown_sec=h.PROXY_COOLDOWN_SEC,
+                                   max_failure_rate=h.PROXY_MAX_FAILURE_RATE)
+
+    return PROXY_POOL
+
+
+def save_pool():
+    """
+    Сохранение статистики пула proxy текущего процесса
+    """
+    if PROXY_POOL:
+        PROXY_POOL.save()
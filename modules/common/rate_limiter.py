@@ -0,0 +1,108 @@
+import os
+import re
+import json
+import time
+import threading
+
+import modules.common.helper as h
+from modules.common.file_worker import FileLock
+
+logger = h.logging.getLogger('RateLimiter')
+
+# Блокировка файла состояния держится миллисекунды, поэтому файл старше STALE_LOCK_SEC оставлен упавшим процессом.
+# Должно быть меньше LOCK_TIMEOUT_SEC, иначе зависшая блокировка не успеет удалиться до таймаута
+STALE_LOCK_SEC = 5
+LOCK_TIMEOUT_SEC = 10
+# Состояние корзин процесса на случай, когда блокировку файла захватить не удалось: путь -> (токены, время)
+_LOCAL_STATE_DICT = {}
+_LOCAL_STATE_MUTEX = threading.Lock()
+
+
+class RateLimiter:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Ограничение частоты запросов к домену по алгоритму token bucket: в корзине не больше @burst токенов, токены
+    пополняются со скоростью @rate_per_min в минуту, каждый переход на страницу забирает один токен.
+    Состояние корзины хранится в файле домена и меняется под FileLock, поэтому ограничение общее для всех потоков
+    и процессов, работающих с доменом. Если блокировку файла захватить не удалось, используется корзина процесса.
+
+    :method acquire: Получить токен, при необходимости дождавшись его
+    """
+    def __init__(self, domain, rate_per_min, burst=1, state_dir=None):
+        self.domain = domain
+        self.rate_per_sec = rate_per_min / 60
+        self.burst = max(burst, 1)
+        state_dir = state_dir or h.RATE_LIMIT_PATH
+        # Имя файла - домен без схемы и спецсимволов
+        name = re.sub(r'[^\w.-]', '_', re.sub(r'^\w+://', '', domain))
+        self.path = os.path.join(state_dir, name + '.json')
+
+    def __read_state(self, now):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return float(state['tokens']), float(state['updated'])
+        except (OSError, ValueError, KeyError):
+            return float(self.burst), now
+
+    def __write_state(self, tokens, now):
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'tokens': tokens, 'updated': now}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def __take_token(self, tokens, updated, now):
+        """
+        Пополнение корзины с момента @updated и попытка забрать токен. Вернет (новое кол-во токенов, время до
+        появления токена в секундах или 0, если токен получен)
+        """
+        tokens = min(self.burst, tokens + max(now - updated, 0) * self.rate_per_sec)
+        if tokens >= 1:
+            return tokens - 1, 0
+
+        return tokens, (1 - tokens) / self.rate_per_sec
+
+    def __try_acquire_local(self):
+        """
+        Попытка забрать токен из корзины процесса
+        """
+        with _LOCAL_STATE_MUTEX:
+            now = time.time()
+            tokens, updated = _LOCAL_STATE_DICT.get(self.path, (float(self.burst), now))
+            tokens, delay = self.__take_token(tokens, updated, now)
+            _LOCAL_STATE_DICT[self.path] = (tokens, now)
+            return delay
+
+    def __try_acquire(self):
+        """
+        Попытка забрать токен. Вернет 0, если токен получен, иначе время до появления токена в секундах
+        """
+        # Своя блокировка на каждый вызов: экземпляр может использоваться из нескольких потоков
+        lock = FileLock(self.path + '.lock', timeout_sec=LOCK_TIMEOUT_SEC, stale_sec=STALE_LOCK_SEC)
+        if not lock.acquire():
+            # Без блокировки ограничение действует хотя бы внутри процесса
+            logger.warning("Нет блокировки {}, ограничение частоты только в пределах процесса".format(self.path))
+            return self.__try_acquire_local()
+
+        try:
+            now = time.time()
+            tokens, delay = self.__take_token(*self.__read_state(now), now)
+            self.__write_state(tokens, now)
+            return delay
+        except OSError as e:
+            logger.error("Ошибка состояния ограничения частоты {}, e = {}".format(self.path, e))
+            return self.__try_acquire_local()
+        finally:
+            lock.release()
+
+    def acquire(self):
+        """
+        Получить токен домена. Вернет время ожидания в секундах
+        """
+        time_start = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            delay = self.__try_acquire()
+            if not delay:
+                return time.time() - time_start
+
+            time.sleep(delay)
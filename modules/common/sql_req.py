@@ -88,6 +88,132 @@ create_prices_phone_table_query = """
     );
 """
 
+# Таблица: Последняя цена каждого магазина - latest_prices_phones_table. Поддерживается DbInserter-ом при каждом
+# добавлении цены, чтобы не читать всю историю prices_phones_table ради последнего значения
+create_latest_prices_phones_table_query = """
+    CREATE TABLE IF NOT EXISTS latest_prices_phones_table (
+        ID_Shop_Phone    INTEGER PRIMARY KEY,
+        Price            INTEGER NOT NULL,
+        Datetime         TIMESTAMP NOT NULL,
+
+        FOREIGN KEY (ID_Shop_Phone)
+            REFERENCES shops_phones_table(ID_Shop_Phone) MATCH SIMPLE
+            ON UPDATE NO ACTION
+            ON DELETE CASCADE
+            NOT VALID
+    );
+"""
+
+# Первичное заполнение latest_prices_phones_table из истории цен (только если таблица пуста)
+fill_latest_prices_phones_table_query = """
+    INSERT INTO latest_prices_phones_table (id_shop_phone, price, datetime)
+    SELECT DISTINCT ON (id_shop_phone) id_shop_phone, price, datetime
+    FROM prices_phones_table
+    WHERE NOT EXISTS (SELECT 1 FROM latest_prices_phones_table)
+    ORDER BY id_shop_phone, datetime DESC, id DESC
+    ON CONFLICT (id_shop_phone) DO NOTHING
+"""
+
+# ------------------------- МИГРАЦИИ СХЕМЫ ------------------------------
+
+# Таблица: Примененные миграции схемы - schema_version_table
+create_schema_version_table_query = """
+    CREATE TABLE IF NOT EXISTS schema_version_table (
+        Version          INTEGER PRIMARY KEY,
+        Description      VARCHAR(200) NOT NULL,
+        Applied_At       TIMESTAMP NOT NULL DEFAULT now()
+    );
+"""
+
+# Текущая версия схемы
+select_schema_version_query = """
+    SELECT COALESCE(MAX(version), 0) FROM schema_version_table
+"""
+
+# Блокировка на время транзакции миграции, чтобы несколько модулей не мигрировали базу одновременно
+lock_schema_migration_query = """
+    SELECT pg_advisory_xact_lock(%s)
+"""
+
+# Отметка о примененной миграции
+insert_schema_version_query = """
+    INSERT INTO schema_version_table (version, description) VALUES (%s, %s)
+"""
+
+# Миграция 2: составные индексы под поиск id и выборки цен
+create_lookup_indexes_query = """
+    CREATE INDEX IF NOT EXISTS products_brand_model_idx 
+        ON products_table (brand_name, model_name);
+    CREATE INDEX IF NOT EXISTS versions_product_ram_rom_idx 
+        ON versions_phones_table (id_product, ram, rom);
+    CREATE INDEX IF NOT EXISTS shops_ver_shop_url_idx 
+        ON shops_phones_table (id_ver_phone, id_shop_name, url_product);
+    CREATE INDEX IF NOT EXISTS prices_shop_phone_datetime_idx 
+        ON prices_phones_table (id_shop_phone, datetime DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS prices_datetime_idx 
+        ON prices_phones_table (datetime);
+"""
+
+# Миграция 3, перед уникальными индексами: удаление дубликатов продуктов, комплектаций и магазинов, которые могли
+# появиться в старой базе до уникальных индексов. Остается запись с наименьшим id, ссылки на дубликаты переносятся
+# на нее, последняя цена магазина пересчитывается по объединенной истории цен
+delete_duplicate_lookup_rows_query = """
+    CREATE TEMP TABLE dup_products_map ON COMMIT DROP AS
+        SELECT id_old, id_new FROM (
+            SELECT id_product AS id_old, MIN(id_product) OVER (PARTITION BY brand_name, model_name) AS id_new
+            FROM products_table
+        ) AS ids
+        WHERE id_old <> id_new;
+    UPDATE versions_phones_table AS ver SET id_product = map.id_new
+        FROM dup_products_map AS map WHERE ver.id_product = map.id_old;
+    UPDATE shops_phones_table AS shop SET id_product = map.id_new
+        FROM dup_products_map AS map WHERE shop.id_product = map.id_old;
+    UPDATE prices_phones_table AS price SET id_product = map.id_new
+        FROM dup_products_map AS map WHERE price.id_product = map.id_old;
+    DELETE FROM products_table WHERE id_product IN (SELECT id_old FROM dup_products_map);
+
+    CREATE TEMP TABLE dup_versions_map ON COMMIT DROP AS
+        SELECT id_old, id_new FROM (
+            SELECT id_ver_phone AS id_old, MIN(id_ver_phone) OVER (PARTITION BY id_product, ram, rom) AS id_new
+            FROM versions_phones_table
+        ) AS ids
+        WHERE id_old <> id_new;
+    UPDATE shops_phones_table AS shop SET id_ver_phone = map.id_new
+        FROM dup_versions_map AS map WHERE shop.id_ver_phone = map.id_old;
+    DELETE FROM versions_phones_table WHERE id_ver_phone IN (SELECT id_old FROM dup_versions_map);
+
+    CREATE TEMP TABLE dup_shops_map ON COMMIT DROP AS
+        SELECT id_old, id_new FROM (
+            SELECT id_shop_phone AS id_old,
+                MIN(id_shop_phone) OVER (PARTITION BY id_ver_phone, id_shop_name, url_product) AS id_new
+            FROM shops_phones_table
+        ) AS ids
+        WHERE id_old <> id_new;
+    UPDATE prices_phones_table AS price SET id_shop_phone = map.id_new
+        FROM dup_shops_map AS map WHERE price.id_shop_phone = map.id_old;
+    DELETE FROM latest_prices_phones_table
+        WHERE id_shop_phone IN (SELECT id_old FROM dup_shops_map UNION SELECT id_new FROM dup_shops_map);
+    INSERT INTO latest_prices_phones_table (id_shop_phone, price, datetime)
+        SELECT DISTINCT ON (id_shop_phone) id_shop_phone, price, datetime
+        FROM prices_phones_table
+        WHERE id_shop_phone IN (SELECT id_new FROM dup_shops_map)
+        ORDER BY id_shop_phone, datetime DESC, id DESC;
+    DELETE FROM shops_phones_table WHERE id_shop_phone IN (SELECT id_old FROM dup_shops_map);
+"""
+
+# Миграция 3: уникальность ключей поиска id. Заменяет неуникальные индексы миграции 2
+create_unique_lookup_indexes_query = """
+    CREATE UNIQUE INDEX IF NOT EXISTS products_brand_model_uidx 
+        ON products_table (brand_name, model_name);
+    CREATE UNIQUE INDEX IF NOT EXISTS versions_product_ram_rom_uidx 
+        ON versions_phones_table (id_product, ram, rom);
+    CREATE UNIQUE INDEX IF NOT EXISTS shops_ver_shop_url_uidx 
+        ON shops_phones_table (id_ver_phone, id_shop_name, url_product);
+    DROP INDEX IF EXISTS products_brand_model_idx;
+    DROP INDEX IF EXISTS versions_product_ram_rom_idx;
+    DROP INDEX IF EXISTS shops_ver_shop_url_idx;
+"""
+
 # ----------------------- СОЗДАНИЕ ПРЕДСТАВЛЕНИЙ --------------------------
 
 # Создать представление общей таблицы, где все таблицы соеденены в одну
@@ -133,14 +259,37 @@ select_id_shop_phone_query = """
         url_product = %s
 """
 
-# Поиск наличия цены у данного магазина данной комплектации в таблице price_phones_table
-select_price_in_price_phone_query = """
+# Поиск последней цены у данного магазина данной комплектации в таблице latest_prices_phones_table
+select_latest_price_query = """
     SELECT price 
-    FROM prices_phones_table 
+    FROM latest_prices_phones_table 
     WHERE 
         id_shop_phone = %s
 """
 
+# Все продукты для кэша id
+select_all_products_query = """
+    SELECT id_product, brand_name, model_name FROM products_table ORDER BY id_product
+"""
+
+# Все комплектации для кэша id
+select_all_versions_query = """
+    SELECT id_ver_phone, id_product, ram, rom FROM versions_phones_table ORDER BY id_ver_phone
+"""
+
+# Все магазины для кэша id
+select_all_shops_phones_query = """
+    SELECT id_shop_phone, id_ver_phone, id_shop_name, url_product FROM shops_phones_table ORDER BY id_shop_phone
+"""
+
+# Кол-во записей и максимальные id таблиц - для проверки актуальности снимка кэша id
+select_id_tables_state_query = """
+    SELECT
+        (SELECT COUNT(*) FROM products_table), (SELECT MAX(id_product) FROM products_table),
+        (SELECT COUNT(*) FROM versions_phones_table), (SELECT MAX(id_ver_phone) FROM versions_phones_table),
+        (SELECT COUNT(*) FROM shops_phones_table), (SELECT MAX(id_shop_phone) FROM shops_phones_table)
+"""
+
 select_img_url_query = """
     SELECT img_url 
     FROM general_table
@@ -161,10 +310,16 @@ insert_into_shops_name_table_query = "INSERT INTO shops_name_table (Shop_Name) V
 # Заполнить таблицу названий категорий
 insert_into_categories_name_table_query = "INSERT INTO categories_name_table (Category_Name) VALUES %s"
 
-# Добавление цены в prices_phone
+# Добавление цены в prices_phone и обновление последней цены в latest_prices_phones_table
 insert_into_prices_phones_table_query = """
-    INSERT INTO prices_phones_table (id_shop_name, id_product, id_shop_phone, price, datetime) 
-    VALUES %s
+    WITH new_price AS (
+        INSERT INTO prices_phones_table (id_shop_name, id_product, id_shop_phone, price, datetime) 
+        VALUES %s
+        RETURNING id_shop_phone, price, datetime
+    )
+    INSERT INTO latest_prices_phones_table (id_shop_phone, price, datetime)
+    SELECT id_shop_phone, price, datetime FROM new_price
+    ON CONFLICT (id_shop_phone) DO UPDATE SET price = EXCLUDED.price, datetime = EXCLUDED.datetime
 """
 
 insert_into_shops_phones_table_query = """
@@ -199,6 +354,65 @@ search_all_prices_by_version_query = """
     ORDER BY datetime DESC
 """
 
+# Пакетный поиск данных для проверки выгоды сразу для всех комплектаций. На вход - массивы brand_name, model_name,
+# ram, rom одинаковой длины, idx - порядковый номер комплектации в массивах (с 1). На каждую комплектацию - строки
+# актуальных цен (как в search_actual_prices_by_version_query) с историческим минимумом (price, id_shop_name, datetime)
+# по всем ценам и по ценам без последних, добавленных в течение секунды до самой свежей (для товара в одном магазине)
+search_prices_data_by_versions_batch_query = """
+    WITH keys AS (
+        SELECT * 
+        FROM unnest(%s::VARCHAR[], %s::VARCHAR[], %s::INTEGER[], %s::INTEGER[]) 
+            WITH ORDINALITY AS keys(brand_name, model_name, ram, rom, idx)
+    ),
+    key_shops AS (
+        SELECT keys.idx, shops_phones_table.id_shop_phone, shops_phones_table.id_shop_name, 
+            shops_phones_table.color, shops_phones_table.url_product
+        FROM keys
+            JOIN products_table ON 
+                products_table.brand_name = keys.brand_name AND 
+                products_table.model_name = keys.model_name
+            JOIN versions_phones_table ON 
+                versions_phones_table.id_product = products_table.id_product AND 
+                (versions_phones_table.ram = keys.ram OR versions_phones_table.ram = 0) AND 
+                versions_phones_table.rom = keys.rom
+            JOIN shops_phones_table ON 
+                shops_phones_table.id_ver_phone = versions_phones_table.id_ver_phone
+    ),
+    history AS (
+        SELECT key_shops.idx, prices_phones_table.price, key_shops.id_shop_name, prices_phones_table.datetime
+        FROM key_shops
+            JOIN prices_phones_table USING (id_shop_phone)
+    ),
+    hist_min AS (
+        SELECT DISTINCT ON (idx) idx, price, id_shop_name, datetime
+        FROM history
+        ORDER BY idx, price, id_shop_name, datetime
+    ),
+    hist_min_without_last AS (
+        SELECT DISTINCT ON (history.idx) history.idx, history.price, history.id_shop_name, history.datetime
+        FROM history
+            JOIN (SELECT idx, MAX(datetime) AS max_datetime FROM history GROUP BY idx) AS last_datetime 
+            ON history.idx = last_datetime.idx
+        WHERE history.datetime <= last_datetime.max_datetime - INTERVAL '1 second'
+        ORDER BY history.idx, history.price, history.id_shop_name, history.datetime
+    ),
+    actual AS (
+        SELECT DISTINCT ON (key_shops.idx, key_shops.url_product) 
+            key_shops.idx, latest_prices_phones_table.price, key_shops.id_shop_name, 
+            latest_prices_phones_table.datetime, key_shops.color, key_shops.url_product
+        FROM key_shops
+            JOIN latest_prices_phones_table USING (id_shop_phone)
+        ORDER BY key_shops.idx, key_shops.url_product, latest_prices_phones_table.datetime DESC
+    )
+    SELECT actual.idx, actual.price, actual.id_shop_name, actual.datetime, actual.color, actual.url_product,
+        hist_min.price, hist_min.id_shop_name, hist_min.datetime,
+        hist_min_without_last.price, hist_min_without_last.id_shop_name, hist_min_without_last.datetime
+    FROM actual
+        JOIN hist_min ON hist_min.idx = actual.idx
+        LEFT JOIN hist_min_without_last ON hist_min_without_last.idx = actual.idx
+    ORDER BY actual.idx, actual.url_product
+"""
+
 # Поиск минимальной цены (исторической) по названию бренда, модели, ROM и RAM
 search_min_historical_price_by_version_query = """
     SELECT price, id_shop_name, datetime::DATE
@@ -210,9 +424,36 @@ search_min_historical_price_by_version_query = """
     ORDER BY price ASC LIMIT 1
 """
 
-# Поиск только актуальных (с самой свежей датой) цен всех магазинов и цветов
-# SELECT price, id_shop_name, datetime, color, general_table.url_product
+# Поиск только актуальных (с самой свежей датой) цен всех магазинов и цветов: последняя цена по каждому url_product
+# из latest_prices_phones_table. Формат ответа тот же, что у search_actual_prices_by_version_old_query:
+# price, id_shop_name, datetime, color, url_product
 search_actual_prices_by_version_query = """
+    SELECT DISTINCT ON (shops_phones_table.url_product) 
+        latest_prices_phones_table.price, shops_phones_table.id_shop_name, latest_prices_phones_table.datetime, 
+        shops_phones_table.color, shops_phones_table.url_product
+    FROM products_table
+        JOIN versions_phones_table USING (id_product)
+        JOIN shops_phones_table USING (id_ver_phone)
+        JOIN latest_prices_phones_table USING (id_shop_phone)
+    WHERE brand_name = %s       AND 
+          model_name = %s       AND 
+          (ram = %s OR ram = 0) AND 
+          rom = %s
+    ORDER BY shops_phones_table.url_product, latest_prices_phones_table.datetime DESC
+"""
+
+# Список комплектаций (brand_name, model_name, ram, rom) для сравнения запросов в benchmarks
+select_versions_names_query = """
+    SELECT brand_name, model_name, ram, rom
+    FROM products_table
+        JOIN versions_phones_table USING (id_product)
+    ORDER BY id_ver_phone
+    LIMIT %s
+"""
+
+# Прежний вариант поиска актуальных цен через general_table, оставлен для сравнения в benchmarks
+# SELECT price, id_shop_name, datetime, color, general_table.url_product
+search_actual_prices_by_version_old_query = """
     SELECT price, id_shop_name, datetime, color, general_table.url_product
     FROM general_table
     JOIN (
@@ -246,6 +487,239 @@ search_actual_prices_by_version_and_shop_query = """
        general_table.url_product = group_table.url_product
 """
 
+# ----------------------- ПАКЕТНОЕ ДОБАВЛЕНИЕ ---------------------------
+# Порядок запросов: создание и очистка временной таблицы, COPY всех товаров, добавление новых продуктов,
+# комплектаций, магазинов и цен набором запросов. Результат - классификация каждого товара такая же, как при
+# поштучном добавлении в DbInserter: 'product', 'shop', 'version', 'price', 'error' или NULL (без изменений).
+# Добавляются только записи, которых нет в БД. ON CONFLICT DO NOTHING по уникальным индексам миграции 3 защищает
+# от одновременного добавления: запись, которую успел добавить другой DbInserter, находится следующим запросом
+# поиска id
+
+# Временная таблица со всеми товарами одного пакета
+create_tmp_parse_result_table_query = """
+    CREATE TEMP TABLE IF NOT EXISTS tmp_parse_result_table (
+        Idx              INTEGER PRIMARY KEY,
+        ID_Category      INTEGER NOT NULL,
+        ID_Shop_Name     INTEGER NOT NULL,
+        Brand_Name       VARCHAR(20) NOT NULL,
+        Model_Name       VARCHAR(100) NOT NULL,
+        RAM              INTEGER NOT NULL,
+        ROM              INTEGER NOT NULL,
+        Img_URL          VARCHAR(200) NOT NULL,
+        URL_Product      VARCHAR(200) NOT NULL,
+        Product_Code     VARCHAR(20) NOT NULL,
+        Color            VARCHAR(50) NOT NULL,
+        Local_Rating     REAL,
+        Num_Local_Rating INTEGER,
+        Bonus_Rubles     INTEGER,
+        Price            INTEGER NOT NULL,
+        ID_Product       INTEGER,
+        ID_Ver_Phone     INTEGER,
+        ID_Shop_Phone    INTEGER,
+        Is_New_Product   BOOLEAN NOT NULL DEFAULT FALSE,
+        Is_New_Version   BOOLEAN NOT NULL DEFAULT FALSE,
+        Is_New_Shop      BOOLEAN NOT NULL DEFAULT FALSE,
+        Last_Price       INTEGER,
+        Status           VARCHAR(10)
+    )
+"""
+
+truncate_tmp_parse_result_table_query = "TRUNCATE tmp_parse_result_table"
+
+# Загрузка всего пакета во временную таблицу
+copy_into_tmp_parse_result_table_query = """
+    COPY tmp_parse_result_table (idx, id_category, id_shop_name, brand_name, model_name, ram, rom, img_url,
+                                 url_product, product_code, color, local_rating, num_local_rating, bonus_rubles,
+                                 price, id_product, id_ver_phone, id_shop_phone)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+# Добавление отсутствующих продуктов, по одному на (brand_name, model_name). Здесь и далее товары с id из кэша id
+# DbInserter не проверяются
+bulk_insert_products_query = """
+    WITH new_products AS (
+        INSERT INTO products_table (id_category, brand_name, model_name, total_rating)
+        SELECT DISTINCT ON (tmp.brand_name, tmp.model_name) tmp.id_category, tmp.brand_name, tmp.model_name, 0
+        FROM tmp_parse_result_table AS tmp
+        WHERE tmp.id_product IS NULL AND NOT EXISTS (
+            SELECT 1 FROM products_table
+            WHERE products_table.brand_name = tmp.brand_name AND
+                  products_table.model_name = tmp.model_name
+        )
+        ORDER BY tmp.brand_name, tmp.model_name, tmp.idx
+        ON CONFLICT (brand_name, model_name) DO NOTHING
+        RETURNING id_product, brand_name, model_name
+    )
+    UPDATE tmp_parse_result_table AS tmp
+    SET id_product = new_products.id_product,
+        is_new_product = TRUE
+    FROM new_products
+    WHERE tmp.brand_name = new_products.brand_name AND
+          tmp.model_name = new_products.model_name
+"""
+
+# Поиск id уже существующих продуктов
+bulk_select_id_product_query = """
+    UPDATE tmp_parse_result_table AS tmp
+    SET id_product = (
+        SELECT id_product FROM products_table
+        WHERE products_table.brand_name = tmp.brand_name AND
+              products_table.model_name = tmp.model_name
+        ORDER BY id_product LIMIT 1
+    )
+    WHERE tmp.id_product IS NULL
+"""
+
+# Добавление отсутствующих комплектаций. Комплектация с RAM = 0 подходит под любой RAM, поэтому товар не создает
+# свою комплектацию, если такая уже есть в БД или раньше него в пакете есть товар с RAM = 0 и тем же ROM.
+# Комплектации, добавленные одновременно другим DbInserter, пропускаются и находятся следующим запросом
+bulk_insert_versions_query = """
+    WITH missing AS (
+        SELECT idx, id_product, ram, rom, img_url FROM tmp_parse_result_table AS tmp
+        WHERE tmp.id_ver_phone IS NULL AND NOT EXISTS (
+            SELECT 1 FROM versions_phones_table AS ver
+            WHERE ver.id_product = tmp.id_product      AND
+                  (ver.ram = tmp.ram OR ver.ram = 0)   AND
+                  ver.rom = tmp.rom
+        )
+    ), new_versions AS (
+        INSERT INTO versions_phones_table (id_product, ram, rom, img_url)
+        SELECT DISTINCT ON (missing.id_product, missing.ram, missing.rom)
+            missing.id_product, missing.ram, missing.rom, missing.img_url
+        FROM missing
+        WHERE NOT EXISTS (
+            SELECT 1 FROM missing AS prev
+            WHERE prev.id_product = missing.id_product AND
+                  prev.rom = missing.rom               AND
+                  prev.ram = 0                         AND
+                  prev.idx < missing.idx
+        )
+        ORDER BY missing.id_product, missing.ram, missing.rom, missing.idx
+        ON CONFLICT (id_product, ram, rom) DO NOTHING
+        RETURNING id_ver_phone, id_product, ram, rom
+    )
+    UPDATE tmp_parse_result_table AS tmp
+    SET id_ver_phone = found.id_ver_phone,
+        is_new_version = TRUE
+    FROM (
+        SELECT missing.idx, (
+            SELECT id_ver_phone FROM new_versions
+            WHERE new_versions.id_product = missing.id_product             AND
+                  (new_versions.ram = missing.ram OR new_versions.ram = 0) AND
+                  new_versions.rom = missing.rom
+            ORDER BY new_versions.ram = missing.ram DESC, id_ver_phone LIMIT 1
+        ) AS id_ver_phone
+        FROM missing
+    ) AS found
+    WHERE tmp.idx = found.idx AND
+          found.id_ver_phone IS NOT NULL
+"""
+
+# Поиск id уже существующих комплектаций
+bulk_select_id_ver_phone_query = """
+    UPDATE tmp_parse_result_table AS tmp
+    SET id_ver_phone = (
+        SELECT id_ver_phone FROM versions_phones_table AS ver
+        WHERE ver.id_product = tmp.id_product    AND
+              (ver.ram = tmp.ram OR ver.ram = 0) AND
+              ver.rom = tmp.rom
+        ORDER BY ver.ram = tmp.ram DESC, id_ver_phone LIMIT 1
+    )
+    WHERE tmp.id_ver_phone IS NULL
+"""
+
+# Добавление отсутствующих магазинов для комплектаций
+bulk_insert_shops_phones_query = """
+    WITH new_shops AS (
+        INSERT INTO shops_phones_table (id_shop_name, id_product, id_ver_phone, url_product, product_code, color,
+                                        local_rating, num_local_rating, bonus_rubles)
+        SELECT DISTINCT ON (tmp.id_ver_phone, tmp.id_shop_name, tmp.url_product)
+            tmp.id_shop_name, tmp.id_product, tmp.id_ver_phone, tmp.url_product, tmp.product_code, tmp.color,
+            tmp.local_rating, tmp.num_local_rating, tmp.bonus_rubles
+        FROM tmp_parse_result_table AS tmp
+        WHERE tmp.id_shop_phone IS NULL AND NOT EXISTS (
+            SELECT 1 FROM shops_phones_table AS shop
+            WHERE shop.id_ver_phone = tmp.id_ver_phone AND
+                  shop.id_shop_name = tmp.id_shop_name AND
+                  shop.url_product = tmp.url_product
+        )
+        ORDER BY tmp.id_ver_phone, tmp.id_shop_name, tmp.url_product, tmp.idx
+        ON CONFLICT (id_ver_phone, id_shop_name, url_product) DO NOTHING
+        RETURNING id_shop_phone, id_ver_phone, id_shop_name, url_product
+    )
+    UPDATE tmp_parse_result_table AS tmp
+    SET id_shop_phone = new_shops.id_shop_phone,
+        is_new_shop = TRUE
+    FROM new_shops
+    WHERE tmp.id_ver_phone = new_shops.id_ver_phone AND
+          tmp.id_shop_name = new_shops.id_shop_name AND
+          tmp.url_product = new_shops.url_product
+"""
+
+# Поиск id уже существующих магазинов
+bulk_select_id_shop_phone_query = """
+    UPDATE tmp_parse_result_table AS tmp
+    SET id_shop_phone = (
+        SELECT id_shop_phone FROM shops_phones_table AS shop
+        WHERE shop.id_ver_phone = tmp.id_ver_phone AND
+              shop.id_shop_name = tmp.id_shop_name AND
+              shop.url_product = tmp.url_product
+        ORDER BY id_shop_phone LIMIT 1
+    )
+    WHERE tmp.id_shop_phone IS NULL
+"""
+
+# Последняя известная цена для уже существующих магазинов
+bulk_select_last_price_query = """
+    UPDATE tmp_parse_result_table AS tmp
+    SET last_price = latest_prices_phones_table.price
+    FROM latest_prices_phones_table
+    WHERE tmp.id_shop_phone = latest_prices_phones_table.id_shop_phone AND
+          NOT tmp.is_new_shop
+"""
+
+# Классификация каждого товара пакета в порядке следования, как при поштучном добавлении
+bulk_classify_query = """
+    UPDATE tmp_parse_result_table AS tmp
+    SET status = classified.status
+    FROM (
+        SELECT idx,
+            CASE
+                WHEN is_new_product AND idx = MIN(idx) OVER (PARTITION BY id_product) THEN 'product'
+                WHEN is_new_version AND idx = MIN(idx) OVER (PARTITION BY id_ver_phone) THEN 'shop'
+                WHEN is_new_shop AND idx = MIN(idx) OVER (PARTITION BY id_shop_phone) THEN 'version'
+                WHEN NOT is_new_shop AND last_price IS NULL THEN 'error'
+                WHEN price <> COALESCE(LAG(price) OVER (PARTITION BY id_shop_phone ORDER BY idx), last_price)
+                    THEN 'price'
+            END AS status
+        FROM tmp_parse_result_table
+    ) AS classified
+    WHERE tmp.idx = classified.idx
+"""
+
+# Добавление цен для всех новых и изменившихся позиций и обновление последних цен.
+# clock_timestamp сохраняет порядок цен внутри пакета
+bulk_insert_prices_query = """
+    WITH new_prices AS (
+        INSERT INTO prices_phones_table (id_shop_name, id_product, id_shop_phone, price, datetime)
+        SELECT id_shop_name, id_product, id_shop_phone, price, clock_timestamp()
+        FROM tmp_parse_result_table
+        WHERE status IN ('product', 'shop', 'version', 'price')
+        ORDER BY idx
+        RETURNING id, id_shop_phone, price, datetime
+    )
+    INSERT INTO latest_prices_phones_table (id_shop_phone, price, datetime)
+    SELECT DISTINCT ON (id_shop_phone) id_shop_phone, price, datetime
+    FROM new_prices
+    ORDER BY id_shop_phone, datetime DESC, id DESC
+    ON CONFLICT (id_shop_phone) DO UPDATE SET price = EXCLUDED.price, datetime = EXCLUDED.datetime
+"""
+
+# Результат классификации пакета
+bulk_select_status_query = """
+    SELECT idx, status, id_product, id_ver_phone, id_shop_phone FROM tmp_parse_result_table ORDER BY idx
+"""
+
 # ----------------------- ОБНОВЛЕНИЕ ДАННЫХ ---------------------------
 
 # Обновление даты у цены
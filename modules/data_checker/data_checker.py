@@ -20,21 +20,24 @@ class DataChecker:
         :param pr_data_after_bd_list: список данных, которые отфильтровал DBInserter в процессе добавления данных в БД
         :param pr_parse_result_list: список данных, которые пришли после DataValidator (до БД)
         """
-        self.pc_self_result_list = []
+        self.pc_self_result_list = h.IndexedNamedTupleList()
         self.pr_price_change_list = pr_data_after_bd_list
-        self.pr_parse_result_list = pr_parse_result_list
+        # Поиск по этому списку идет для каждого товара, поэтому он хранится с индексами
+        self.pr_parse_result_list = h.IndexedNamedTupleList(pr_parse_result_list or [])
 
         self.db = DataBase()
         self.config = configparser.ConfigParser()
         self.config.read('config.ini', encoding="utf-8")
         self.min_diff_price_per = float(self.config.defaults()['min_diff_price_per'])
         self.best_shop_for_img_url = (self.config.defaults()['best_shops_for_img_url']).lower().split(', ')
+        # Пакетная проверка: данные для всех комплектаций одним запросом вместо двух запросов на каждый товар
+        self.is_batch_check = self.config.getboolean('DEFAULT', 'checker_batch_check', fallback=True)
 
     def __check_price_for_benefit(self, price, brand_name, model_name, ram, rom):
         """
         Проверка списка товаров с измененной ценой на выгодное предложение
         """
-        pos_price, pos_shop, pos_datetime, pos_color, pos_url = 0, 1, 2, 3, 4
+        pos_shop, pos_datetime, pos_color = 1, 2, 3
         null_result = (None, None, None)
 
         # Получить список всех актуальных цен на данную комплектацию: price, id_shop_name, datetime, color, url_product
@@ -63,10 +66,20 @@ class DataChecker:
                 else:
                     break
             logger.info('One shop: indx = {}, new hist: {}'.format(indx, all_price_data_list[indx:]))
+            if indx >= len(all_price_data_list):
+                return null_result
             hist_min_price = min(all_price_data_list[indx:])
         else:
             hist_min_price = min(all_price_data_list)
 
+        return self.__check_benefit(price, act_price_data_list, hist_min_price, is_one_shop)
+
+    def __check_benefit(self, price, act_price_data_list, hist_min_price, is_one_shop):
+        """
+        Расчет средней цены и поиск выгодных предложений среди актуальных цен товаров в наличии
+        """
+        pos_price, pos_url = 0, 4
+
         # Поиск средней цены для одного магазина или нескольких
         avg_price = ((price + hist_min_price[pos_price]) / 2) if is_one_shop \
             else sum(item[pos_price] for item in act_price_data_list) / len(act_price_data_list)
@@ -87,13 +100,65 @@ class DataChecker:
         min_act_price_in_stock_data_list = h.find_min_price_in_prices_list(act_price_in_stock_data_list)
 
         # Сравнение минимальной цены (любой, они равны) со средней. Если цена не выгодная - очистить список
-        if h.per_num_of_num(min_act_price_in_stock_data_list[0][pos_price], avg_price) < self.min_diff_price_per or \
-                avg_price - min_act_price_in_stock_data_list[0][pos_price] < 1500:
+        if min_act_price_in_stock_data_list and \
+                (h.per_num_of_num(min_act_price_in_stock_data_list[0][pos_price], avg_price) < self.min_diff_price_per
+                 or avg_price - min_act_price_in_stock_data_list[0][pos_price] < 1500):
             min_act_price_in_stock_data_list.clear()
 
         logger.info('YES' if min_act_price_in_stock_data_list else 'NO')
         return min_act_price_in_stock_data_list, avg_price, hist_min_price
 
+    def __get_prices_data_by_versions(self, pr_price_change_list):
+        """
+        Получение данных для проверки выгоды одним запросом для всех комплектаций из списка.
+        Вернет словарь (brand_name, model_name, ram, rom) -> (список актуальных цен, исторический минимум по всем
+        ценам, исторический минимум без последних цен)
+        """
+        versions_list = list(dict.fromkeys((item.brand_name, item.model_name, item.ram, item.rom)
+                                           for item in pr_price_change_list))
+        if not versions_list:
+            return {}
+
+        brand_name_list, model_name_list, ram_list, rom_list = (list(column) for column in zip(*versions_list))
+        result = self.db.execute_read_query(sr.search_prices_data_by_versions_batch_query,
+                                            (brand_name_list, model_name_list, ram_list, rom_list))
+
+        prices_data_dict = {}
+        for row in result or []:
+            version = versions_list[row[0] - 1]
+            if version not in prices_data_dict:
+                hist_min_price = tuple(row[6:9])
+                hist_min_price_without_last = tuple(row[9:12]) if row[9] is not None else None
+                prices_data_dict[version] = ([], hist_min_price, hist_min_price_without_last)
+
+            prices_data_dict[version][0].append(tuple(row[1:6]))
+
+        return prices_data_dict
+
+    def __check_price_for_benefit_batch(self, item, prices_data_dict):
+        """
+        Проверка товара с измененной ценой на выгодное предложение по данным, полученным пакетным запросом.
+        Результат совпадает с __check_price_for_benefit
+        """
+        pos_shop = 1
+        null_result = (None, None, None)
+
+        prices_data = prices_data_dict.get((item.brand_name, item.model_name, item.ram, item.rom))
+        if not prices_data:
+            return null_result
+
+        act_price_data_list, hist_min_price, hist_min_price_without_last = prices_data
+
+        # Если магазин один, то исторический минимум считается без последних добавленных актуальных цен
+        is_one_shop = h.is_all_elem_equal_in_tuple_list(act_price_data_list, pos_shop)
+        if is_one_shop:
+            hist_min_price = hist_min_price_without_last
+            if not hist_min_price:
+                return null_result
+
+        logger.info("-" * 50)
+        return self.__check_benefit(item.price, act_price_data_list, hist_min_price, is_one_shop)
+
     def __check_prices(self, pr_price_change_list=None):
         """
         Запуск проверки товаров с измененной ценой на поиск выгоды
@@ -103,9 +168,14 @@ class DataChecker:
         if not pr_price_change_list:
             pr_price_change_list = self.pr_price_change_list
 
+        prices_data_dict = self.__get_prices_data_by_versions(pr_price_change_list) if self.is_batch_check else None
+
         for item in pr_price_change_list:
-            result_list, avg_price, hist_min_price = \
-                self.__check_price_for_benefit(item.price, item.brand_name, item.model_name, item.ram, item.rom)
+            if self.is_batch_check:
+                result_list, avg_price, hist_min_price = self.__check_price_for_benefit_batch(item, prices_data_dict)
+            else:
+                result_list, avg_price, hist_min_price = \
+                    self.__check_price_for_benefit(item.price, item.brand_name, item.model_name, item.ram, item.rom)
 
             if not result_list or not avg_price or not hist_min_price:
                 continue
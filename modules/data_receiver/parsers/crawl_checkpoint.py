@@ -0,0 +1,102 @@
+import os
+import time
+import pickle
+import threading
+
+import modules.common.helper as h
+
+logger = h.logging.getLogger('CrawlCheckpoint')
+
+
+class CrawlCheckpoint:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Контрольная точка прохода каталога магазина: результаты уже разобранных страниц, записываются на диск после
+    каждой страницы. Если браузер упал посреди прохода, следующий проход того же каталога продолжается со страницы
+    падения, а результаты прошлых страниц берутся из контрольной точки. Контрольная точка старше @max_age_min
+    не используется, после завершения прохода она удаляется.
+
+    :method add_page: Запомнить результаты страницы и записать контрольную точку
+    :method get_resume_page: Номер страницы, с которой продолжается проход
+    :method get_results: Результаты страниц до страницы продолжения
+    :method clear: Удаление контрольной точки
+    """
+    def __init__(self, shop, url, max_age_min=60):
+        self.shop = shop
+        self.url = url
+        self.path = h.CRAWL_CHECKPOINT_PATH + shop + '.pkl'
+        self.mutex = threading.Lock()
+        # Номер страницы -> список результатов
+        self.pages_dict = {}
+        # Проход кэша страниц, в который сохраняются страницы прохода (см. PageCache)
+        self.page_cache_run_id = None
+        self.__load(max_age_min)
+
+    def __load(self, max_age_min):
+        """
+        Чтение контрольной точки прошлого прохода того же каталога
+        """
+        if not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.error("Не удалось прочитать контрольную точку {}, e = {}".format(self.path, e))
+            return
+
+        if data.get('url') != self.url or time.time() - data.get('time', 0) > max_age_min * 60:
+            return
+
+        self.pages_dict = data.get('pages', {})
+        self.page_cache_run_id = data.get('page_cache_run_id')
+
+    def add_page(self, num_page, result_list):
+        """
+        Запомнить результаты страницы @num_page (с 1) и записать контрольную точку. Может вызываться из потоков
+        пула разбора страниц
+        """
+        with self.mutex:
+            self.pages_dict[num_page] = list(result_list)
+            data = {'url': self.url, 'time': time.time(), 'pages': self.pages_dict,
+                    'page_cache_run_id': self.page_cache_run_id}
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path + '.tmp', 'wb') as f:
+                    pickle.dump(data, f)
+                os.replace(self.path + '.tmp', self.path)
+            except Exception as e:
+                logger.error("Не удалось записать контрольную точку {}, e = {}".format(self.path, e))
+
+    def get_resume_page(self):
+        """
+        Номер первой страницы, которой нет в контрольной точке (страницы идут подряд с первой). 1 - проход с начала
+        """
+        with self.mutex:
+            num_page = 1
+            while num_page in self.pages_dict:
+                num_page += 1
+            return num_page
+
+    def get_results(self):
+        """
+        Результаты страниц до страницы продолжения в порядке страниц: (номер страницы, список результатов)
+        """
+        resume_page = self.get_resume_page()
+        with self.mutex:
+            return [(num_page, self.pages_dict[num_page]) for num_page in range(1, resume_page)]
+
+    def clear(self):
+        """
+        Удаление контрольной точки после завершения прохода
+        """
+        with self.mutex:
+            self.pages_dict = {}
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error("Не удалось удалить контрольную точку {}, e = {}".format(self.path, e))
@@ -0,0 +1,128 @@
+import os
+import time
+import pickle
+import hashlib
+
+import modules.common.helper as h
+
+logger = h.logging.getLogger('CrawlState')
+
+
+def get_page_fingerprint(result_list):
+    """
+    Отпечаток страницы каталога - хэш кодов товаров и цен в порядке на странице
+    """
+    md5 = hashlib.md5()
+    for item in result_list:
+        md5.update("{}|{}|{};".format(item.product_code, item.url, item.price).encode('utf-8'))
+
+    return md5.hexdigest()
+
+
+class CrawlState:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Состояние инкрементального прохода каталога магазина: отпечатки и результаты страниц прошлого прохода.
+    Если @stop_pages страниц подряд совпали с прошлым проходом, проход останавливается, а результаты оставшихся
+    страниц берутся из прошлого прохода - иначе товары этих страниц считались бы отсутствующими в наличии.
+    Раз в @full_crawl_hours выполняется полный проход без остановки.
+
+    :method check_page: Запомнить страницу и проверить, можно ли остановить проход
+    :method get_carried_results: Результаты страниц прошлого прохода после страницы остановки
+    :method save: Сохранение состояния на диск
+    """
+    def __init__(self, shop, stop_pages=3, full_crawl_hours=24):
+        self.shop = shop
+        self.stop_pages = stop_pages
+        self.path = h.CRAWL_STATE_PATH + shop + '.pkl'
+        # Номер страницы -> (отпечаток, список результатов) для прошлого и текущего прохода
+        self.prev_pages_dict = {}
+        self.pages_dict = {}
+        self.full_crawl_time = 0
+        self.num_unchanged = 0
+        self.stop_page = None
+        self.__load()
+
+        self.is_full_crawl = not self.prev_pages_dict or time.time() - self.full_crawl_time > full_crawl_hours * 3600
+        if self.is_full_crawl:
+            logger.info("{}: полный проход каталога".format(shop))
+
+    def __load(self):
+        """
+        Чтение состояния прошлого прохода
+        """
+        if not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.error("Не удалось прочитать состояние прохода {}, e = {}".format(self.path, e))
+            return
+
+        self.prev_pages_dict = data.get('pages', {})
+        self.full_crawl_time = data.get('full_crawl_time', 0)
+
+    def check_page(self, num_page, result_list):
+        """
+        Запомнить результаты страницы @num_page. Вернет True, если проход можно остановить: это не полный проход
+        и последние stop_pages страниц не изменились
+        """
+        fingerprint = get_page_fingerprint(result_list)
+        self.pages_dict[num_page] = (fingerprint, list(result_list))
+
+        prev_page = self.prev_pages_dict.get(num_page)
+        if result_list and prev_page and prev_page[0] == fingerprint:
+            self.num_unchanged += 1
+        else:
+            self.num_unchanged = 0
+
+        if self.is_full_crawl or self.num_unchanged < self.stop_pages:
+            return False
+
+        self.stop_page = num_page
+        logger.info("{}: {} стр. подряд не изменились, проход остановлен на странице {}".format(
+            self.shop, self.num_unchanged, num_page))
+        return True
+
+    def get_carried_results(self):
+        """
+        Результаты страниц прошлого прохода после страницы остановки, в порядке страниц. Эти страницы переносятся
+        в текущее состояние
+        """
+        if self.stop_page is None:
+            return []
+
+        result_list = []
+        for num_page in sorted(self.prev_pages_dict):
+            if num_page > self.stop_page:
+                self.pages_dict[num_page] = self.prev_pages_dict[num_page]
+                result_list.extend(self.prev_pages_dict[num_page][1])
+
+        logger.info("{}: из прошлого прохода взято товаров - {}".format(self.shop, len(result_list)))
+        return result_list
+
+    def save(self, is_interrupted=False):
+        """
+        Сохранение состояния. Время полного прохода обновляется, только если полный проход дошел до конца каталога.
+        Состояние прерванного (@is_interrupted) прохода не сохраняется: страниц в нем меньше, чем в каталоге, и
+        следующий проход сравнивался бы с неполным состоянием
+        """
+        if not self.pages_dict:
+            return
+
+        if is_interrupted:
+            logger.warning("{}: проход прерван, состояние прошлого прохода сохранено без изменений".format(self.shop))
+            return
+
+        if self.is_full_crawl and self.stop_page is None:
+            self.full_crawl_time = time.time()
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'wb') as f:
+                pickle.dump({'pages': self.pages_dict, 'full_crawl_time': self.full_crawl_time}, f)
+            os.replace(self.path + '.tmp', self.path)
+        except Exception as e:
+            logger.error("Не удалось сохранить состояние прохода {}, e = {}".format(self.path, e))
@@ -6,7 +6,6 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.expected_conditions import presence_of_element_located
 from modules.data_receiver.parsers.parse_base import ParseBase
 import modules.common.helper as h
-from modules.common.file_worker import FileWorker
 
 DNS_REBUILT_IPHONE = ' "как новый"'
 logger = h.logging.getLogger('dnsparse')
@@ -50,12 +49,12 @@ def dns_parse_model_name(name):
     name += rebuilt
 
     # Проверка названия в словаре исключений названий моделей
-    name = h.replace_value_from_dictionary(h.EXCEPT_MODEL_NAMES_DICT, name)
+    name = h.find_and_replace_except_model_name(name)
 
     # # Проверка названия модели в словаре разрешенных моделей
     if not h.find_allowed_model_names(name):
         logger.info("Обнаружена новая модель, отсутствующая в базе = '{}'".format(name))
-        FileWorker.list_data.save(h.UNDEFINED_MODEL_NAME_LIST_PATH, data=name, overwrite=False)
+        h.save_undefined_model_name(name)
         return None, None, None, 0, 0
 
     # Получить название бренда
@@ -83,8 +82,12 @@ class DNSParse(ParseBase):
     Реализация базового класса ParseBase
     Парсит данные с магазина Днс
     """
-    def __init__(self):
-        super().__init__(domain='https://www.dns-shop.ru', shop='dns', logger=logger, category="смартфоны")
+    def __init__(self, with_browser=True):
+        super().__init__(domain='https://www.dns-shop.ru', shop='dns', logger=logger, category="смартфоны",
+                         parse_model_name_func=dns_parse_model_name, with_browser=with_browser)
+        self.catalog_page_query = 'p'
+        self.is_http_supported = True
+        self.pagination_css_selector = 'a.pagination-widget__page-link'
         self.container_css_selector = 'div.catalog-product.ui-button-widget'
 
     def _wd_city_selection_catalog(self):
@@ -112,7 +115,7 @@ class DNSParse(ParseBase):
             if city_list:
                 for item in city_list:
                     if self.current_city.lower() in item.text.lower():
-                        time.sleep(0.5)
+                        self._wd_wait_clickable(item, 0.5)
                         return self._wd_ac_click_elem(item)
             else:
                 self.logger.info("Не вижу нужный город в списке, пробую вбить вручную")
@@ -138,7 +141,7 @@ class DNSParse(ParseBase):
             if city_list:
                 for item in city_list:
                     if self.current_city.lower() in item.text.lower():
-                        time.sleep(0.5)
+                        self._wd_wait_clickable(item, 0.5)
                         return self._wd_ac_click_elem(item)
             else:
                 self.logger.error("Не вижу нужный город в списке input, выход")
@@ -190,6 +193,12 @@ class DNSParse(ParseBase):
         """
         Переход на заданную страницу num_page через клик (для имитации пользователя)
         """
+        # Ссылка товара текущей страницы - после перехода она должна исчезнуть
+        page_marker = self._wd_get_page_marker('a.catalog-product__name')
+        if not page_marker:
+            self.logger.error('Не удалось получить маркер текущей страницы, на странице нет товаров')
+            return False
+
         for num_try in range(3):
 
             if num_try and not self._wd_check_load_page_catalog():
@@ -208,14 +217,18 @@ class DNSParse(ParseBase):
                 self.logger.info("Достигнут конец каталога")
                 return False
 
+            # Товар текущей страницы - после перехода он должен исчезнуть, и выдержка интервала между переходами
+            page_anchor = self._wd_get_page_anchor()
+            self._wd_polite_wait()
+
             # Клик - переход на следующую страницу
             if not self._wd_ac_click_elem(num_page_elem):
                 self.logger.error("Не могу кликнуть на страницу в __wd_next_page")
                 self.driver.refresh()
                 continue
 
-            # Специальная задержка между переключениями страниц для имитации юзера
-            time.sleep(self.wait_between_pages_sec)
+            # Ожидание прогрузки новой страницы (или фиксированная задержка для имитации юзера)
+            self._wd_wait_page_loaded(page_anchor)
 
             # Ждем, пока не прогрузится страница
             if not self._wd_check_load_page_catalog():
@@ -228,8 +241,7 @@ class DNSParse(ParseBase):
 
             # Особенность ДНС - при переключении страницы иногда не меняется контент. Если так - обновляем страницу
             try:
-                self.wait.until_not(presence_of_element_located((By.XPATH, "//a[@href='{}']".format(
-                    self.pr_result_list[-5].url.replace(self.domain, '')))))
+                self.wait.until_not(presence_of_element_located((By.XPATH, "//a[@href='{}']".format(page_marker))))
 
                 self.logger.info("Cur_page = {}".format(self.cur_page))
                 self.cur_page += 1
@@ -239,9 +251,6 @@ class DNSParse(ParseBase):
                 self.logger.error("TimeoutException в __wd_next_page, обновляю страницу")
                 self.driver.refresh()
                 continue
-            except IndexError:
-                self.logger.error('Список pr_result_list[-5] оказался пуст, выход за границы списка')
-                return False
         else:
             self.logger.error("!! После 3 попыток не получилось переключить страницу #{} !!".format(self.cur_page))
             return False
@@ -270,13 +279,18 @@ class DNSParse(ParseBase):
             self.logger.info("Товар '{}' по предзаказу, пропуск".format(model_name))
             return
 
-        # Ссылка на изображение товара
+        # Ссылка на изображение товара. Класс loaded картинке добавляет скрипт ленивой загрузки, в html с сервера
+        # (HttpParse) картинка еще не загружена и ссылка на нее есть только в data-src
         img_url = block.select_one('img.loaded')
+        if img_url:
+            img_url = img_url.get('src')
+        else:
+            img_url = block.select_one('img')
+            img_url = (img_url.get('data-src') or img_url.get('src')) if img_url else None
+
         if not img_url:
             self.logger.warning("No img url")
             return
-        else:
-            img_url = img_url.get('src')
 
         # Рейтинг товара
         rating_block = block.select_one('a.catalog-product__rating.ui-link.ui-link_black')
@@ -310,7 +324,7 @@ class DNSParse(ParseBase):
             price = int(re.findall(r'\d+', price.text.replace(' ', ''))[0])
 
         # Парсинг названия модели
-        brand_name, model_name, color, ram, rom = dns_parse_model_name(model_name)
+        brand_name, model_name, color, ram, rom = self._parse_model_name(model_name)
         if not brand_name or not model_name or not color or not rom:
             self.logger.warning("No brand name, model name, color or rom")
             return
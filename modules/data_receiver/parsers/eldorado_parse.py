@@ -5,7 +5,6 @@ from selenium.webdriver.common.by import By
 from modules.data_receiver.parsers.parse_base import ParseBase
 
 import modules.common.helper as h
-from modules.common.file_worker import FileWorker
 
 logger = h.logging.getLogger('eldoradoparse')
 ELDORADO_REBUILT_IPHONE = 'как новый'
@@ -60,12 +59,12 @@ def eldorado_parse_model_name(name):
     name += rebuilt
 
     # Проверка названия в словаре исключений названий моделей
-    name = h.replace_value_from_dictionary(h.EXCEPT_MODEL_NAMES_DICT, name)
+    name = h.find_and_replace_except_model_name(name)
 
     # Проверка названия модели в словаре разрешенных моделей
     if not h.find_allowed_model_names(name):
         logger.info("Обнаружена новая модель, отсутствующая в базе = '{}'".format(name))
-        FileWorker.list_data.save(h.UNDEFINED_MODEL_NAME_LIST_PATH, data=name, overwrite=False)
+        h.save_undefined_model_name(name)
         return None, None, None
 
     # Получить название бренда
@@ -82,8 +81,12 @@ class EldoradoParse(ParseBase):
     Парсит данные с магазина Эльдорадо
     """
 
-    def __init__(self):
-        super().__init__(domain="https://www.eldorado.ru", shop="eldorado", logger=logger, category="смартфоны")
+    def __init__(self, with_browser=True):
+        super().__init__(domain="https://www.eldorado.ru", shop="eldorado", logger=logger, category="смартфоны",
+                         parse_model_name_func=eldorado_parse_model_name, with_browser=with_browser)
+        self.catalog_page_query = 'page'
+        self.is_http_supported = True
+        self.pagination_css_selector = "a[aria-label^='Page ']"
         self.is_grid = True
         self.container_css_selector = 'li[databases-dy="product"]'
 
@@ -112,7 +115,7 @@ class EldoradoParse(ParseBase):
             if city_list:
                 for item in city_list:
                     if self.current_city.lower() in item.text.lower():
-                        time.sleep(1.5)
+                        self._wd_wait_clickable(item, 1.5)
                         return self._wd_ac_click_elem(item)
             else:
                 self.logger.info("Не вижу нужный город в списке, пробую вбить вручную")
@@ -124,7 +127,7 @@ class EldoradoParse(ParseBase):
                 return False
 
             # Кликнуть на форму для ввода текста
-            time.sleep(1)
+            self._wd_wait_clickable(input_city, 1)
             if not self._wd_ac_click_elem(input_city):
                 self.logger.error("Не могу кликнуть на форму для ввода текста")
                 return False
@@ -211,14 +214,18 @@ class EldoradoParse(ParseBase):
                 self.logger.info("Достигнут конец каталога")
                 return False
 
+            # Товар текущей страницы - после перехода он должен исчезнуть, и выдержка интервала между переходами
+            page_anchor = self._wd_get_page_anchor()
+            self._wd_polite_wait()
+
             # Клик - переход на следующую страницу
             if not self._wd_ac_click_elem(num_page_elem):
                 self.logger.error("Не могу кликнуть на страницу в __wd_next_page")
                 self.driver.refresh()
                 continue
 
-            # Специальная задержка между переключениями страниц для имитации юзера
-            time.sleep(self.wait_between_pages_sec)
+            # Ожидание прогрузки новой страницы (или фиксированная задержка для имитации юзера)
+            self._wd_wait_page_loaded(page_anchor)
 
             # Ждем, пока не прогрузится страница
             if not self._wd_check_load_page_catalog():
@@ -314,7 +321,7 @@ class EldoradoParse(ParseBase):
             price = int(re.findall(r'\d+', price.text.replace(' ', ''))[0])
 
         # Парсинг названия модели
-        brand_name, model_name, color = eldorado_parse_model_name(full_name)
+        brand_name, model_name, color = self._parse_model_name(full_name)
         if not brand_name or not model_name or not color:
             self.logger.warning("No brand name, model name or color")
             return
@@ -0,0 +1,93 @@
+"""
+Извлечение блоков товаров из html страницы каталога. Поддерживаются два движка:
+    - bs4: BeautifulSoup с парсером lxml, дерево всей страницы строится в python-объектах
+    - lxml: lxml.html + cssselect, селекторы компилируются в XPath один раз и переиспользуются для всех страниц
+
+Блоки движка lxml оборачиваются в LxmlBlock с тем же интерфейсом, что используется в _parse_catalog_block
+парсеров: select, select_one, text, get. Если lxml или cssselect не установлены, используется bs4
+"""
+import functools
+
+import bs4
+import modules.common.helper as h
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+    IS_LXML_AVAILABLE = True
+except ImportError:
+    IS_LXML_AVAILABLE = False
+
+logger = h.logging.getLogger('HtmlExtractor')
+
+ENGINE_BS4 = 'bs4'
+ENGINE_LXML = 'lxml'
+
+
+@functools.lru_cache(maxsize=None)
+def get_css_selector(css):
+    """
+    Скомпилированный селектор, компилируется один раз на процесс
+    """
+    return CSSSelector(css)
+
+
+class LxmlBlock:
+    """
+    Обертка над элементом lxml с интерфейсом тега bs4, который используется парсерами
+    """
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    def select(self, css):
+        """
+        Все потомки, подходящие под селектор (как в bs4, сам элемент не учитывается)
+        """
+        return [LxmlBlock(item) for item in get_css_selector(css)(self.element) if item is not self.element]
+
+    def select_one(self, css):
+        """
+        Первый потомок, подходящий под селектор, или None
+        """
+        for item in get_css_selector(css)(self.element):
+            if item is not self.element:
+                return LxmlBlock(item)
+
+        return None
+
+    @property
+    def text(self):
+        return self.element.text_content()
+
+    def get(self, key, default=None):
+        return self.element.get(key, default)
+
+
+def get_engine(engine):
+    """
+    Проверка выбранного движка, при отсутствии lxml - bs4
+    """
+    if engine == ENGINE_LXML and not IS_LXML_AVAILABLE:
+        logger.warning("lxml или cssselect не установлены, используется bs4")
+        return ENGINE_BS4
+
+    return engine if engine in (ENGINE_BS4, ENGINE_LXML) else ENGINE_BS4
+
+
+def select_blocks(html, css, engine=ENGINE_BS4):
+    """
+    Список блоков товаров страницы @html по селектору контейнера @css
+    """
+    if engine == ENGINE_LXML:
+        try:
+            root = lxml.html.fromstring(html)
+        except ValueError:
+            # lxml не принимает str с объявлением кодировки
+            root = lxml.html.fromstring(html.encode('utf-8'))
+
+        return [LxmlBlock(item) for item in get_css_selector(css)(root)]
+
+    soup = bs4.BeautifulSoup(html, 'lxml')
+    return soup.select(css)
@@ -0,0 +1,223 @@
+import os
+import time
+import pickle
+import configparser
+from urllib.parse import urlsplit, urlunsplit, quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import modules.common.helper as h
+from modules.data_receiver.parsers.page_cache import PageCache
+
+logger = h.logging.getLogger('HttpParse')
+
+
+def get_fixture_name(url):
+    """
+    Имя файла записанной страницы для url. По этому же имени страницу отдает http_stub_server
+    """
+    parts = urlsplit(url)
+    return quote(parts.path + ('?' + parts.query if parts.query else ''), safe='') + '.html'
+
+
+class HttpParse:
+    """
+    РЕАЛИЗАЦИЯ ОДНОГО ИЗ ОСНОВНЫХ МОДУЛЕЙ ПРОЕКТА - DataReceiver
+    Получение каталога без браузера: страницы каталога, которые магазин отдает уже отрисованными на сервере,
+    загружаются по http через одну сессию с пулом соединений и разбираются тем же _parse_catalog_page, что и в
+    Selenium парсере, поэтому результат - те же h.ParseResult.
+
+    Selenium используется только для получения cookies с выбранным городом, cookies сохраняются на диск и
+    используются повторно, пока не устареют.
+
+    Для проверки без сети можно передать @base_url - адрес локального http_stub_server с записанными страницами,
+    а @record_dir - каталог, куда записываются загруженные страницы для такого сервера.
+    """
+    def __init__(self, parser_class, base_url=None, record_dir=None):
+        self.parser_class = parser_class
+        # Парсер без браузера - только для разбора страниц
+        self.parser = parser_class(with_browser=False)
+        self.shop = self.parser.shop
+        # Без браузера следующая страница каталога открывается только по url с номером страницы
+        self.is_supported = self.parser.is_http_supported and bool(self.parser.catalog_page_query)
+        self.base_url = base_url
+        self.record_dir = record_dir
+
+        config = configparser.ConfigParser()
+        config.read('config.ini', encoding="utf-8")
+        self.wait_between_pages_sec = config.getfloat('DEFAULT', 'http_wait_between_pages_sec', fallback=1.0)
+        self.cookies_ttl_sec = config.getint('DEFAULT', 'http_cookies_ttl_sec', fallback=24 * 60 * 60)
+        self.max_pages = config.getint('DEFAULT', 'http_max_pages', fallback=100)
+        self.timeout_sec = config.getfloat('DEFAULT', 'http_timeout_sec', fallback=20.0)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __get_cookies_path(self):
+        return h.HTTP_COOKIES_PATH + self.shop + '.pkl'
+
+    def __load_cookies(self):
+        """
+        Чтение сохраненных cookies и user-agent, если они не устарели
+        """
+        path = self.__get_cookies_path()
+        if not os.path.isfile(path) or time.time() - os.path.getmtime(path) > self.cookies_ttl_sec:
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.error("Не удалось прочитать cookies {}, e = {}".format(path, e))
+            return None
+
+    def __save_cookies(self, data):
+        path = self.__get_cookies_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                pickle.dump(data, f)
+        except Exception as e:
+            logger.error("Не удалось сохранить cookies {}, e = {}".format(path, e))
+
+    def __bootstrap_cookies(self, url):
+        """
+        Открытие каталога в браузере с выбором города и получение cookies и user-agent
+        """
+        parser = self.parser_class()
+        if not parser.driver:
+            return None
+
+        try:
+            if not parser._wd_open_browser_catalog(url):
+                logger.error("{}: не удалось открыть каталог для получения cookies".format(self.shop))
+                return None
+
+            return {
+                'cookies': parser.driver.get_cookies(),
+                'user_agent': parser.driver.execute_script("return navigator.userAgent"),
+            }
+        finally:
+            parser._wd_close_browser()
+
+    def __prepare_session(self, url):
+        """
+        Настройка сессии: cookies с выбранным городом и user-agent браузера
+        """
+        if self.base_url:
+            return True
+
+        data = self.__load_cookies()
+        if not data:
+            data = self.__bootstrap_cookies(url)
+            if not data:
+                return False
+            self.__save_cookies(data)
+
+        self.session.headers['User-Agent'] = data['user_agent']
+        for cookie in data['cookies']:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'),
+                                     path=cookie.get('path', '/'))
+
+        return True
+
+    def __get_url(self, url):
+        """
+        Замена адреса магазина на адрес локального сервера, если он задан
+        """
+        if not self.base_url:
+            return url
+
+        parts = urlsplit(url)
+        base_parts = urlsplit(self.base_url)
+        return urlunsplit((base_parts.scheme, base_parts.netloc, parts.path, parts.query, ''))
+
+    def __get_page(self, url):
+        """
+        Загрузка одной страницы. Вернет html или None
+        """
+        try:
+            response = self.session.get(self.__get_url(url), timeout=self.timeout_sec)
+        except requests.RequestException as e:
+            logger.error("{}: ошибка загрузки {}, e = {}".format(self.shop, url, e))
+            return None
+
+        if response.status_code != 200:
+            logger.info("{}: код ответа {} для {}".format(self.shop, response.status_code, url))
+            return None
+
+        if self.record_dir:
+            path = os.path.join(self.record_dir, self.shop)
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, get_fixture_name(url)), 'w', encoding='utf-8') as f:
+                f.write(response.text)
+
+        return response.text
+
+    def run_catalog(self, url):
+        """
+        Загрузка и разбор всех страниц каталога. Вернет список результатов или None при ошибке
+        """
+        if not self.is_supported:
+            logger.error("{}: магазин не поддерживает получение каталога без браузера".format(self.shop))
+            return None
+
+        if not self.__prepare_session(url):
+            return None
+
+        # Страницы с локального сервера в кэш не сохраняются
+        page_cache = PageCache(self.shop, self.parser.page_cache_max_size_mb) \
+            if self.parser.is_page_cache and not self.base_url else None
+
+        prev_page_result = None
+        for num_page in range(1, self.max_pages + 1):
+            # Ограничение частоты запросов к домену, общее с Selenium парсерами
+            if self.parser.rate_limiter:
+                self.parser.rate_limiter.acquire()
+
+            html = self.__get_page(self.parser._get_catalog_page_url(url, num_page))
+            if not html:
+                break
+
+            self.parser.cur_page = num_page + 1
+            len_before = len(self.parser.pr_result_list)
+            num_blocks = self.parser._parse_catalog_page(html)
+            page_result = self.parser.pr_result_list[len_before:]
+
+            # Страница без товаров или повтор прошлой (магазин отдает последнюю страницу вместо несуществующей)
+            if not num_blocks or (page_result and page_result == prev_page_result):
+                del self.parser.pr_result_list[len_before:]
+                break
+
+            # Блоки есть, но ни один не разобран - в html с сервера нет данных, которые дорисовывает браузер
+            if not page_result:
+                logger.warning("{}: на странице {} блоков {}, но нет ни одного товара, остановка".format(
+                    self.shop, num_page, num_blocks))
+                break
+
+            prev_page_result = page_result
+            self.parser._handle_page_results(page_result)
+            if page_cache:
+                page_cache.save_page(num_page, html)
+
+            logger.info("{}: страница {}, товаров {}".format(self.shop, num_page, len(page_result)))
+            if not self.parser.rate_limiter:
+                time.sleep(self.wait_between_pages_sec)
+
+        self.session.close()
+        if page_cache:
+            page_cache.finish()
+
+        self.parser._save_span_metrics()
+        if not self.parser.pr_result_list:
+            return None
+
+        self.parser._save_result()
+        h.flush_undefined_model_names()
+        if self.parser.model_name_cache:
+            self.parser.model_name_cache.save()
+
+        return self.parser.pr_result_list
@@ -0,0 +1,44 @@
+"""
+Локальный http сервер, который отдает записанные HttpParse страницы каталога (параметр record_dir) вместо магазина.
+Страница ищется в <fixtures_dir>/<shop>/ по имени get_fixture_name(url), на остальные запросы - 404.
+
+Запуск: python -m modules.data_receiver.parsers.http_stub_server <fixtures_dir> <shop> [port]
+Затем HttpParse(parser_class, base_url='http://127.0.0.1:<port>') работает без сети и без браузера
+"""
+import os
+import sys
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from modules.data_receiver.parsers.http_parse import get_fixture_name
+
+
+def create_server(fixtures_path, port=8765):
+    """
+    Создание сервера, отдающего страницы из каталога @fixtures_path
+    """
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = os.path.join(fixtures_path, get_fixture_name(self.path))
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return HTTPServer(('127.0.0.1', port), FixtureHandler)
+
+
+if __name__ == '__main__':
+    server = create_server(os.path.join(sys.argv[1], sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 8765)
+    print("Stub server: http://127.0.0.1:{}".format(server.server_port))
+    server.serve_forever()
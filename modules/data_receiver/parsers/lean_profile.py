@@ -0,0 +1,115 @@
+import json
+
+import modules.common.helper as h
+
+logger = h.logging.getLogger('LeanProfile')
+
+# Облегченный профиль браузера: парсерам нужен только текст страниц и атрибуты src изображений, поэтому картинки,
+# видео, шрифты и счетчики можно не загружать. Картинки отключаются настройкой Chrome, остальное блокируется
+# по шаблонам url через CDP (Network.setBlockedURLs)
+
+CATEGORY_IMAGES = 'images'
+CATEGORY_MEDIA = 'media'
+CATEGORY_FONTS = 'fonts'
+CATEGORY_TRACKERS = 'trackers'
+
+# Шаблоны url для блокировки через CDP по категориям
+BLOCKED_URL_PATTERNS_DICT = {
+    CATEGORY_IMAGES: ['*.jpg', '*.jpg?*', '*.jpeg', '*.jpeg?*', '*.png', '*.png?*', '*.webp', '*.webp?*',
+                      '*.gif', '*.gif?*', '*.svg', '*.svg?*', '*.ico'],
+    CATEGORY_MEDIA: ['*.mp4', '*.mp4?*', '*.webm', '*.webm?*', '*.mp3', '*.m3u8', '*.ogg'],
+    CATEGORY_FONTS: ['*.woff', '*.woff?*', '*.woff2', '*.woff2?*', '*.ttf', '*.ttf?*', '*.otf', '*.eot'],
+    CATEGORY_TRACKERS: ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                        '*mc.yandex.ru*', '*an.yandex.ru*', '*top-fwz1.mail.ru*', '*connect.facebook.net*',
+                        '*vk.com/rtrg*', '*criteo.*', '*adriver.ru*', '*mindbox.ru*', '*flocktory.com*',
+                        '*hotjar.com*', '*mail.ru/counter*', '*ads.adfox.ru*', '*tiktok.com*'],
+}
+
+# Блокировка картинок настройкой Chrome: src остается в DOM, но файл не загружается
+IMAGES_DISABLED_PREFS = {'profile.managed_default_content_settings.images': 2}
+
+
+def parse_config_list(value):
+    """
+    Разбор списка из config.ini вида 'images, fonts'
+    """
+    return {item.strip().lower() for item in value.split(',') if item.strip()}
+
+
+def get_blocked_categories(shop):
+    """
+    Категории ресурсов, которые нужно блокировать для магазина @shop (lean_block без lean_allow_<shop>).
+    Пустое множество - облегченный профиль выключен (lean_profile = False). Настройки читает runner_helper.read_config
+    """
+    if not h.LEAN_PROFILE:
+        return set()
+
+    return h.LEAN_BLOCK_SET - h.LEAN_ALLOW_DICT.get(shop, set())
+
+
+def is_report_enabled():
+    """
+    Включен ли сбор статистики трафика страниц
+    """
+    return h.LEAN_REPORT
+
+
+def apply_options(options, blocked_set, is_report=False):
+    """
+    Настройки запуска Chrome для облегченного профиля. Вернет capabilities для запуска браузера
+    """
+    if CATEGORY_IMAGES in blocked_set:
+        options.add_experimental_option('prefs', IMAGES_DISABLED_PREFS)
+
+    capabilities = options.to_capabilities()
+    if is_report:
+        capabilities['goog:loggingPrefs'] = {'performance': 'ALL'}
+
+    return capabilities
+
+
+def apply_driver(driver, blocked_set):
+    """
+    Блокировка ресурсов через CDP в запущенном браузере. Вернет False, если браузер не поддерживает CDP
+    """
+    url_list = []
+    for category in sorted(blocked_set):
+        url_list.extend(BLOCKED_URL_PATTERNS_DICT[category])
+
+    if not url_list:
+        return True
+
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': url_list})
+    except Exception as e:
+        logger.error("Не удалось включить блокировку ресурсов через CDP, {}".format(e))
+        return False
+
+    return True
+
+
+def collect_traffic_stats(driver):
+    """
+    Статистика трафика из журнала производительности Chrome с прошлого вызова: (загружено байт, кол-во загруженных
+    запросов, кол-во заблокированных запросов). Вернет None, если журнал недоступен
+    """
+    try:
+        log_list = driver.get_log('performance')
+    except Exception:
+        return None
+
+    num_bytes, num_loaded, num_blocked = 0, 0, 0
+    for item in log_list:
+        try:
+            message = json.loads(item['message'])['message']
+        except (KeyError, ValueError):
+            continue
+
+        if message.get('method') == 'Network.loadingFinished':
+            num_bytes += int(message['params'].get('encodedDataLength', 0))
+            num_loaded += 1
+        elif message.get('method') == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+            num_blocked += 1
+
+    return num_bytes, num_loaded, num_blocked
@@ -0,0 +1,139 @@
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+
+import modules.common.helper as h
+
+logger = h.logging.getLogger('ModelNameCache')
+
+# Отпечаток данных, от которых зависит результат парсинга названий, вычисляется один раз на процесс
+MODEL_NAMES_FINGERPRINT = None
+
+
+def get_model_names_fingerprint():
+    """
+    Отпечаток словаря исключений, списка разрешенных моделей и настроек парсинга названий. При изменении любого из них
+    сохраненный кэш названий становится недействительным
+    """
+    global MODEL_NAMES_FINGERPRINT
+
+    if MODEL_NAMES_FINGERPRINT is None:
+        md5 = hashlib.md5()
+        for path in (h.EXCEPT_MODEL_NAMES_PATH, h.LIST_MODEL_NAMES_BASE_PATH):
+            try:
+                with open(path, 'rb') as f:
+                    md5.update(f.read())
+            except OSError:
+                md5.update(b'-')
+
+        md5.update(repr((h.REBUILT_IPHONE_NAME, h.IGNORE_WORDS_FOR_COLOR)).encode('utf-8'))
+        MODEL_NAMES_FINGERPRINT = md5.hexdigest()
+
+    return MODEL_NAMES_FINGERPRINT
+
+
+class ModelNameCache:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Ограниченный LRU кэш результатов функции парсинга названия модели одного магазина: сырое название -> кортеж
+    результата (brand_name, model_name, color, ...). Результаты для неизвестных моделей не кэшируются, чтобы они
+    каждый раз попадали в список неопределенных моделей.
+
+    Кэш может сохраняться на диск между запусками, сохраненный кэш используется, только если не изменился
+    отпечаток get_model_names_fingerprint.
+
+    :method parse: Получить результат парсинга названия из кэша или вызвать функцию парсинга
+    :method pop_new_items: Новые записи кэша с прошлого вызова (кэш процесса пула разбора страниц)
+    :method update: Добавление записей из кэша другого процесса
+    :method save: Сохранение кэша на диск
+    """
+    def __init__(self, shop, parse_func, max_size=5000, is_persistent=False):
+        self.parse_func = parse_func
+        self.max_size = max_size
+        self.path = (h.MODEL_NAME_CACHE_PATH + shop + '.pkl') if is_persistent else None
+        self.cache = OrderedDict()
+        self.hits, self.misses = 0, 0
+        # Новые записи для передачи в основной процесс, None - не запоминаются (см. parse_worker)
+        self.new_items_list = None
+        self.__load()
+
+    def __load(self):
+        """
+        Чтение кэша с диска
+        """
+        if not self.path or not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.error("Не удалось прочитать кэш названий, path = {}, e = {}".format(self.path, e))
+            return
+
+        if data.get('fingerprint') != get_model_names_fingerprint():
+            logger.info("Кэш названий {} устарел - изменились словари".format(self.path))
+            return
+
+        self.cache = OrderedDict(data.get('items', []))
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def save(self):
+        """
+        Сохранение кэша на диск через временный файл
+        """
+        logger.info("Кэш названий: попаданий - {}, промахов - {}".format(self.hits, self.misses))
+        if not self.path:
+            return
+
+        tmp_path = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'fingerprint': get_model_names_fingerprint(), 'items': list(self.cache.items())}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error("Не удалось сохранить кэш названий, path = {}, e = {}".format(self.path, e))
+
+    def parse(self, name):
+        """
+        Результат парсинга названия @name из кэша, при промахе - вызов функции парсинга
+        """
+        result = self.cache.get(name)
+        if result is not None:
+            self.cache.move_to_end(name)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = self.parse_func(name)
+
+        # Неизвестные модели не кэшируются
+        if result and result[0] is not None:
+            self.__add(name, result)
+            if self.new_items_list is not None:
+                self.new_items_list.append((name, result))
+
+        return result
+
+    def __add(self, name, result):
+        self.cache[name] = result
+        self.cache.move_to_end(name)
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def pop_new_items(self):
+        """
+        Записи, добавленные с прошлого вызова: список (название, результат)
+        """
+        items_list, self.new_items_list = self.new_items_list or [], []
+        return items_list
+
+    def update(self, items_list):
+        """
+        Добавление записей (название, результат), найденных в другом процессе
+        """
+        for name, result in items_list:
+            self.__add(name, result)
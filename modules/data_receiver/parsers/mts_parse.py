@@ -5,7 +5,6 @@ from selenium.webdriver.common.by import By
 from modules.data_receiver.parsers.parse_base import ParseBase
 
 import modules.common.helper as h
-from modules.common.file_worker import FileWorker
 
 logger = h.logging.getLogger('mtsparse')
 
@@ -60,13 +59,12 @@ def mts_parse_model_name(name):
         replace(samsung_code, '').replace('  ', ' ').strip()
 
     # Проверка названия в словаре исключений названий моделей
-    name = h.replace_value_from_dictionary(h.EXCEPT_MODEL_NAMES_DICT, name)
+    name = h.find_and_replace_except_model_name(name)
 
     # Проверка названия модели в словаре разрешенных моделей
     if not h.find_allowed_model_names(name):
         logger.info("Обнаружена новая модель, отсутствующая в базе = '{}'".format(name))
         h.save_undefined_model_name(name)
-        FileWorker.list_data.save(h.UNDEFINED_MODEL_NAME_LIST_PATH, data=name, overwrite=False)
         return None, None, None, 0, 0
 
     # Получить название бренда
@@ -82,8 +80,10 @@ class MTSParse(ParseBase):
     Реализация базового класса ParseBase
     Парсит данные с магазина МТС
     """
-    def __init__(self):
-        super().__init__(domain="https://www.shop.mts.ru", shop="mts", logger=logger, category="смартфоны")
+    def __init__(self, with_browser=True):
+        super().__init__(domain="https://www.shop.mts.ru", shop="mts", logger=logger, category="смартфоны",
+                         parse_model_name_func=mts_parse_model_name, with_browser=with_browser)
+        self.pagination_css_selector = 'div.pagination__page a'
         self.container_css_selector = 'div.card-product-wrapper.card-product-wrapper--catalog'
 
     def _wd_city_selection_catalog(self):
@@ -109,7 +109,7 @@ class MTSParse(ParseBase):
             if city_list:
                 for item in city_list:
                     if self.current_city.lower() in item.text.lower():
-                        time.sleep(1.5)
+                        self._wd_wait_clickable(item, 1.5)
                         return self._wd_ac_click_elem(item)
             else:
                 self.logger.warning("Нет списка городов, попробую вбить вручную")
@@ -121,7 +121,7 @@ class MTSParse(ParseBase):
                 self.logger.error("Не найдено поле, куда вводить новый город")
                 return False
 
-            time.sleep(1)
+            self._wd_wait_clickable(input_city, 1)
 
             # Кликнуть на форму для ввода текста
             if not self._wd_ac_click_elem(input_city):
@@ -184,14 +184,14 @@ class MTSParse(ParseBase):
             self.logger.error("Не удалось прогрузить страницу после скролла в __wd_open_browser (3)")
             return False
 
-        time.sleep(4)
+        self._wd_wait_content_stable(4)
 
         # Скролл страницы 2 (подргужается автоматически)
         if not self._wd_scroll_down(count_press=10, timeout=0.3):
             self.logger.error("Не удалось прогрузить страницу после скролла в __wd_open_browser (4)")
             return False
 
-        time.sleep(2)
+        self._wd_wait_content_stable(2)
         return True
 
     def _wd_open_browser_product(self, url):
@@ -218,14 +218,18 @@ class MTSParse(ParseBase):
                 self.logger.info("Достигнут конец каталога")
                 return False
 
+            # Товар текущей страницы - после перехода он должен исчезнуть, и выдержка интервала между переходами
+            page_anchor = self._wd_get_page_anchor()
+            self._wd_polite_wait()
+
             # Клик - переход на следующую страницу
             if not self._wd_ac_click_elem(num_page_elem):
                 self.logger.error("Не могу кликнуть на страницу в __wd_next_page")
                 self.driver.refresh()
                 continue
 
-            # Специальная задержка между переключениями страниц для имитации юзера
-            time.sleep(self.wait_between_pages_sec)
+            # Ожидание прогрузки новой страницы (или фиксированная задержка для имитации юзера)
+            self._wd_wait_page_loaded(page_anchor)
 
             no_in_stock = self._wd_find_all_elems(By.XPATH, '//div[contains(text(), "Нет в наличии") or contains(text(), "Скоро в продаже")]')
             if no_in_stock and len(no_in_stock) == 30:
@@ -250,6 +254,15 @@ class MTSParse(ParseBase):
             self.logger.error("!! После 3 попыток не получилось переключить страницу #{} !!".format(self.cur_page))
             return False
 
+    def _get_catalog_page_url(self, url, num_page):
+        """
+        Адрес страницы каталога с номером @num_page: у МТС номер страницы - часть пути, /catalog/smartfony/2/
+        """
+        if num_page <= 1:
+            return url
+
+        return url.rstrip('/') + '/{}/'.format(num_page)
+
     def _parse_product_page(self, html, url):
         """
         Метод для парсинга html страницы продукта
@@ -336,7 +349,7 @@ class MTSParse(ParseBase):
         #             break
 
         # Парсинг названия модели
-        brand_name, model_name, color, ram, rom = mts_parse_model_name(full_name)
+        brand_name, model_name, color, ram, rom = self._parse_model_name(full_name)
         if not brand_name or not model_name or not color:
             self.logger.warning("No brand name, model name or color")
             return
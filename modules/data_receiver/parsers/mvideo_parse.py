@@ -7,7 +7,6 @@ from selenium.webdriver.support import expected_conditions as ec
 
 from modules.data_receiver.parsers.parse_base import ParseBase
 import modules.common.helper as h
-from modules.common.file_worker import FileWorker
 
 logger = h.logging.getLogger('mvideoparse')
 MVIDEO_REBUILT_IPHONE = ' восст.'
@@ -62,12 +61,12 @@ def mvideo_parse_model_name(name):
     name += rebuilt
 
     # Проверка названия в словаре исключений названий моделей
-    name = h.replace_value_from_dictionary(h.EXCEPT_MODEL_NAMES_DICT, name)
+    name = h.find_and_replace_except_model_name(name)
 
     # Проверка названия модели в словаре разрешенных моделей
     if not h.find_allowed_model_names(name):
         logger.info("Обнаружена новая модель, отсутствующая в базе = '{}'".format(name))
-        FileWorker.list_data.save(h.UNDEFINED_MODEL_NAME_LIST_PATH, data=name, overwrite=False)
+        h.save_undefined_model_name(name)
         return None, None, None
 
     # Получить название бренда
@@ -83,8 +82,11 @@ class MVideoParse(ParseBase):
     Реализация базового класса ParseBase
     Парсит данные с магазина МВидео
     """
-    def __init__(self):
-        super().__init__(domain="https://www.mvideo.ru", shop="mvideo", logger=logger, category="смартфоны")
+    def __init__(self, with_browser=True):
+        super().__init__(domain="https://www.mvideo.ru", shop="mvideo", logger=logger, category="смартфоны",
+                         parse_model_name_func=mvideo_parse_model_name, with_browser=with_browser)
+        self.catalog_page_query = 'page'
+        self.pagination_css_selector = 'li.page-item.number-item a'
         self.container_css_selector = 'div.product-cards-layout__item'
 
     def _wd_city_selection_catalog(self):
@@ -112,7 +114,7 @@ class MVideoParse(ParseBase):
             if city_list:
                 for item in city_list:
                     if self.current_city.lower() in item.text.lower():
-                        time.sleep(1.5)
+                        self._wd_wait_clickable(item, 1.5)
                         return self._wd_ac_click_elem(item)
             else:
                 self.logger.warning("Нет списка городов, попробую вбить вручную")
@@ -124,7 +126,7 @@ class MVideoParse(ParseBase):
                 return False
 
             # Кликнуть на форму для ввода текста
-            time.sleep(1)
+            self._wd_wait_clickable(input_city, 1)
             if not self._wd_ac_click_elem(input_city):
                 self.logger.error("Не могу нажать на форму ввода текста")
                 return False
@@ -262,6 +264,12 @@ class MVideoParse(ParseBase):
         """
         Переход на заданную страницу num_page через клик (для имитации пользователя)
         """
+        # Ссылка товара текущей страницы - после перехода она должна исчезнуть
+        page_marker = self._wd_get_page_marker('a.product-title__text')
+        if not page_marker:
+            self.logger.error('Не удалось получить маркер текущей страницы, на странице нет товаров')
+            return False
+
         for num_try in range(3):
 
             if num_try and not self._wd_check_load_page_catalog():
@@ -276,13 +284,17 @@ class MVideoParse(ParseBase):
                 self.logger.info("Достигнут конец каталога")
                 return False
 
+            # Товар текущей страницы - после перехода он должен исчезнуть, и выдержка интервала между переходами
+            page_anchor = self._wd_get_page_anchor()
+            self._wd_polite_wait()
+
             # Клик - переход на следующую страницу
             if not self._wd_ac_click_elem(num_page_elem):
                 self.logger.error("Не могу кликнуть на страницу в __wd_next_page")
                 return False
 
-            # Специальная задержка между переключениями страниц для имитации юзера
-            time.sleep(self.wait_between_pages_sec)
+            # Ожидание прогрузки новой страницы (или фиксированная задержка для имитации юзера)
+            self._wd_wait_page_loaded(page_anchor)
 
             # Скролл вниз
             self._wd_scroll_down(count_press=35)
@@ -302,15 +314,11 @@ class MVideoParse(ParseBase):
             # оставляет старые данные с эффектом размытия. Ждем, пока они не исчезнут
             try:
                 self.wait.until_not(ec.presence_of_element_located((By.XPATH, "//a[@href='{}']".format(
-                    self.pr_result_list[-5].url))))
+                    page_marker))))
             except se.TimeoutException:
                 self.logger.error('Не пропадает телефон с прошлой страницы, не могу прогрузить текущую')
                 self.driver.refresh()
                 continue
-            except IndexError:
-                self.logger.error(
-                    'По непонятной причине список pr_result_list[-5] оказался пуст, выход за границы списка')
-                return False
 
             self.cur_page += 1
             return True
@@ -421,7 +429,7 @@ class MVideoParse(ParseBase):
             return
 
         # Парсинг названия модели
-        brand_name, model_name, color = mvideo_parse_model_name(full_name)
+        brand_name, model_name, color = self._parse_model_name(full_name)
         if not brand_name or not model_name or not color:
             self.logger.warning("No brand name, model name, color or not in the list of allowed")
             return
@@ -0,0 +1,136 @@
+import os
+import gzip
+import glob
+import shutil
+from datetime import datetime
+
+import modules.common.helper as h
+
+logger = h.logging.getLogger('PageCache')
+
+# Файл-отметка завершенного прохода каталога: незавершенные и частичные проходы (инкрементальный проход,
+# остановленный раньше конца каталога) не используются для воспроизведения
+COMPLETE_MARKER_NAME = '_complete'
+
+
+def get_run_id():
+    """
+    Идентификатор прохода каталога - время его начала
+    """
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+
+def get_dir_size(path):
+    """
+    Размер всех файлов каталога в байтах
+    """
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+
+    return size
+
+
+class PageCache:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Сжатый кэш html страниц каталога: h.PAGE_CACHE_PATH/<shop>/<run_id>/<номер страницы>.html.gz, где run_id - время
+    начала прохода. После завершения прохода самые старые проходы всех магазинов удаляются, пока кэш больше
+    @max_size_mb. Сохраненные проходы можно воспроизвести без браузера (ParseBase.run_catalog_replay).
+
+    :method save_page: Сохранение страницы текущего прохода
+    :method finish: Отметка о завершении прохода и удаление старых проходов
+    :method get_runs: Список завершенных проходов магазина
+    :method load_pages: Чтение страниц прохода в порядке номеров
+    """
+    def __init__(self, shop, max_size_mb=500, run_id=None):
+        self.shop = shop
+        self.max_size = max_size_mb * 1024 * 1024
+        self.run_id = run_id or get_run_id()
+        self.path = os.path.join(h.PAGE_CACHE_PATH, shop, self.run_id)
+        self.num_pages = 0
+
+    def save_page(self, num_page, html):
+        """
+        Сохранение страницы @num_page (с 1) текущего прохода
+        """
+        if not html:
+            return False
+
+        path = os.path.join(self.path, '{:04d}.html.gz'.format(num_page))
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8', compresslevel=6) as f:
+                f.write(html)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.error("{}: не удалось сохранить страницу {} в кэш, e = {}".format(self.shop, num_page, e))
+            return False
+
+        self.num_pages += 1
+        return True
+
+    def finish(self, is_complete=True):
+        """
+        Отметка о завершении прохода и удаление самых старых проходов сверх размера кэша. Частичный проход
+        (@is_complete = False) остается в кэше без отметки
+        """
+        if not self.num_pages:
+            return
+
+        if is_complete:
+            try:
+                open(os.path.join(self.path, COMPLETE_MARKER_NAME), 'w').close()
+            except OSError as e:
+                logger.error("{}: не удалось завершить проход {} в кэше, e = {}".format(self.shop, self.run_id, e))
+
+        logger.info("{}: в кэш сохранено страниц - {}, проход {}{}".format(
+            self.shop, self.num_pages, self.run_id, "" if is_complete else " (частичный)"))
+        self.evict()
+
+    def evict(self):
+        """
+        Удаление самых старых проходов всех магазинов, пока кэш больше max_size. Текущий проход не удаляется
+        """
+        runs_list = []
+        for path in glob.glob(os.path.join(h.PAGE_CACHE_PATH, '*', '*')):
+            if os.path.isdir(path) and os.path.abspath(path) != os.path.abspath(self.path):
+                runs_list.append((os.path.basename(path), path, get_dir_size(path)))
+
+        total_size = get_dir_size(self.path) + sum(size for _, _, size in runs_list)
+        for _, path, size in sorted(runs_list):
+            if total_size <= self.max_size:
+                break
+
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            logger.info("Удален проход {} из кэша страниц".format(path))
+
+    @staticmethod
+    def get_runs(shop):
+        """
+        Идентификаторы завершенных проходов магазина @shop от старых к новым
+        """
+        return sorted(os.path.basename(os.path.dirname(path)) for path in
+                      glob.glob(os.path.join(h.PAGE_CACHE_PATH, shop, '*', COMPLETE_MARKER_NAME)))
+
+    @staticmethod
+    def load_pages(shop, run_id=None):
+        """
+        Генератор html страниц прохода @run_id в порядке номеров, по умолчанию - последнего завершенного прохода
+        """
+        if not run_id:
+            runs_list = PageCache.get_runs(shop)
+            if not runs_list:
+                logger.error("{}: в кэше нет завершенных проходов".format(shop))
+                return
+
+            run_id = runs_list[-1]
+
+        for path in sorted(glob.glob(os.path.join(h.PAGE_CACHE_PATH, shop, run_id, '*.html.gz'))):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                yield f.read()
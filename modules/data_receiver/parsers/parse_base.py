@@ -1,17 +1,62 @@
 from abc import ABC, abstractmethod
 import time
 import csv
+import queue
+import threading
 import configparser
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
-import bs4
 import selenium.common.exceptions as se
-from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.expected_conditions import presence_of_element_located, presence_of_all_elements_located
+from selenium.webdriver.support.expected_conditions import presence_of_element_located, \
+    presence_of_all_elements_located, staleness_of
 from selenium.webdriver.common.keys import Keys
 import modules.common.helper as h
 from modules.common.file_worker import FileWorker
+from modules.common import proxy_pool
+from modules.common.rate_limiter import RateLimiter
+from modules.data_receiver.parsers.model_name_cache import ModelNameCache
+from modules.data_receiver.parsers.page_cache import PageCache
+from modules.data_receiver.parsers.crawl_state import CrawlState
+from modules.data_receiver.parsers.crawl_checkpoint import CrawlCheckpoint
+from modules.data_receiver.parsers import html_extractor, parse_worker, webdriver_profiles, lean_profile, span_metrics
+
+# Время последнего перехода по страницам для каждого домена - общее для всех парсеров процесса
+_LAST_NAVIGATION_TIME_DICT = {}
+_LAST_NAVIGATION_MUTEX = threading.Lock()
+# Ограничение одновременных загрузок страниц одного домена: домен -> семафор
+_DOMAIN_SEMAPHORES_DICT = {}
+# Методы, время которых учитывается в метриках прохода (span_metrics), в том числе переопределенные в наследниках
+TIMED_METHODS_LIST = ['_wd_open_browser_catalog', '_wd_next_page', '_wd_scroll_down', '_wd_get_cur_page',
+                      '_parse_catalog_page', '_wd_polite_wait', '_wd_wait_page_loaded']
+
+# Кол-во и изменения DOM товаров каталога. Изменения считает MutationObserver на родителе товаров (сетка каталога),
+# при перерисовке сетки наблюдатель переустанавливается
+_JS_GET_GRID_STATE = """
+var items = document.querySelectorAll(arguments[0]);
+var grid = items.length ? items[0].parentNode : null;
+var state = window.__parserGridState;
+if (grid && (!state || state.grid !== grid)) {
+    if (state) { state.observer.disconnect(); }
+    state = window.__parserGridState = {grid: grid, count: 0, observer: null};
+    state.observer = new MutationObserver(function(list) { state.count += list.length; });
+    state.observer.observe(grid, {childList: true, subtree: true});
+}
+return [items.length, state ? state.count : 0];
+"""
+
+# Признаки страницы блокировки или проверки на робота
+BAN_SIGNALS_LIST = ['access denied', 'доступ запрещен', 'доступ ограничен', 'captcha', 'капча',
+                    'вы не робот', 'are you a robot', 'too many requests', '403 forbidden']
+
+# Положение прокрутки страницы
+_JS_GET_SCROLL_STATE = """
+var doc = document.scrollingElement || document.documentElement;
+return [window.pageYOffset, doc.scrollHeight, window.innerHeight];
+"""
 
 
 class ParseBase(ABC):
@@ -20,28 +65,26 @@ class ParseBase(ABC):
     Абстрактный базовый класс для всех парсеров, использующий Selenium
     """
 
-    def __init__(self, domain, shop, logger, category, is_proxy=False, cur_page=2):
+    def __init_subclass__(cls, **kwargs):
+        """
+        Методы из TIMED_METHODS_LIST, переопределенные в наследнике, оборачиваются для учета времени
+        """
+        super().__init_subclass__(**kwargs)
+        for name in TIMED_METHODS_LIST:
+            if name in cls.__dict__:
+                setattr(cls, name, span_metrics.timed(cls.__dict__[name]))
+
+    def __init__(self, domain, shop, logger, category, is_proxy=False, cur_page=2, parse_model_name_func=None,
+                 with_browser=True):
         self.logger = logger
         self.container_css_selector = None
-
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-
-        # options.add_argument("window-size=1920,1080")
-        # options.add_argument("--disable-notifications")
-        if is_proxy:
-            options.add_argument("--proxy-server=%s" % h.get_proxy())
-
-        try:
-            self.driver = webdriver.Chrome(executable_path=h.WD_PATH, options=options)
-        except se.WebDriverException as e:
-            self.logger.error("НЕ СМОГ ИНИЦИАЛИЗИРОВАТЬ WEBDRIVER, {}".format(e))
-            self.driver = None
-            return
-
-        self.driver.implicitly_wait(1.5)
-        self.wait = WebDriverWait(self.driver, 20)
+        # Параметр запроса с номером страницы каталога (см. _get_catalog_page_url)
+        self.catalog_page_query = None
+        # Ссылки с номерами страниц в пагинации каталога (см. _wd_get_num_pages)
+        self.pagination_css_selector = None
+        # Магазин отдает страницы каталога отрисованными на сервере - каталог можно получать через HttpParse
+        # (только вместе с catalog_page_query: без браузера на следующую страницу можно перейти только по url)
+        self.is_http_supported = False
         self.pr_result_list = []
         self.cur_page = cur_page
         # Данные магазина
@@ -53,6 +96,96 @@ class ParseBase(ABC):
         self.config.read('config.ini', encoding="utf-8")
         self.current_city = self.config.defaults()['current_city']
         self.wait_between_pages_sec = int(self.config.defaults()['wait_between_pages_sec'])
+        # Адаптивное ожидание: вместо фиксированных задержек ждем прогрузки страницы по состоянию DOM
+        self.is_adaptive_wait = self.config.getboolean('DEFAULT', 'adaptive_wait', fallback=False)
+        # Минимальный интервал между переходами по страницам магазина, можно задать для магазина отдельно
+        self.polite_min_interval_sec = self.config.getfloat(
+            'DEFAULT', 'polite_min_interval_sec_' + shop,
+            fallback=self.config.getfloat('DEFAULT', 'polite_min_interval_sec', fallback=0))
+        # Ограничение частоты переходов по страницам домена, общее для всех потоков и процессов. Задается
+        # в переходах в минуту, можно задать для магазина отдельно. 0 - только минимальный интервал в процессе
+        rate_limit_per_min = self.config.getfloat(
+            'DEFAULT', 'rate_limit_per_min_' + shop,
+            fallback=self.config.getfloat('DEFAULT', 'rate_limit_per_min', fallback=0))
+        self.rate_limiter = RateLimiter(
+            domain, rate_limit_per_min, burst=self.config.getint('DEFAULT', 'rate_limit_burst', fallback=1)) \
+            if rate_limit_per_min > 0 else None
+        # Сэкономленное на каждой странице время относительно фиксированной задержки wait_between_pages_sec
+        self.wait_saved_sec_list = []
+        # Статистика трафика страниц (загружено байт, запросов, заблокировано запросов), см. lean_profile
+        self.is_traffic_report = lean_profile.is_report_enabled()
+        self.traffic_stats_list = []
+        self.__navigation_start_time = None
+        # Кэш результатов парсинга названий моделей
+        self.model_name_cache = ModelNameCache(
+            shop, parse_model_name_func,
+            max_size=self.config.getint('DEFAULT', 'model_name_cache_size', fallback=5000),
+            is_persistent=self.config.getboolean('DEFAULT', 'model_name_cache_persistent', fallback=False),
+        ) if parse_model_name_func else None
+        # Движок разбора html страниц каталога: bs4 или lxml
+        self.html_engine = html_extractor.get_engine(
+            self.config.defaults().get('html_parser_engine', html_extractor.ENGINE_BS4).lower())
+
+        # Кол-во процессов для разбора страниц параллельно с работой браузера, 0 - разбор в текущем потоке
+        self.parse_workers = self.config.getint('DEFAULT', 'parse_workers', fallback=0)
+
+        # Сжатый кэш html страниц каталога для воспроизведения прохода без браузера (run_catalog_replay)
+        self.is_page_cache = self.config.getboolean('DEFAULT', 'page_cache', fallback=False)
+        self.page_cache_max_size_mb = self.config.getint('DEFAULT', 'page_cache_max_size_mb', fallback=500)
+        self.page_cache = None
+
+        # Инкрементальный проход: остановка, когда incremental_stop_pages страниц подряд не изменились
+        self.is_incremental_crawl = self.config.getboolean('DEFAULT', 'incremental_crawl', fallback=False)
+        self.incremental_stop_pages = self.config.getint('DEFAULT', 'incremental_stop_pages', fallback=3)
+        self.incremental_full_crawl_hours = self.config.getint('DEFAULT', 'incremental_full_crawl_hours',
+                                                               fallback=24)
+        self.crawl_state = None
+
+        # Параллельная загрузка диапазонов страниц каталога несколькими браузерами, 1 - последовательный проход
+        self.fanout_drivers = self.config.getint('DEFAULT', 'fanout_drivers', fallback=1)
+        self.fanout_max_per_domain = self.config.getint('DEFAULT', 'fanout_max_per_domain', fallback=2)
+
+        # Обработчик результатов каждой разобранной страницы для потоковой передачи дальше по конвейеру,
+        # вызывается с готовым списком товаров страницы (см. iter_catalog)
+        self.page_result_handler = None
+        self.__num_handled_futures = 0
+
+        # Контрольная точка прохода: при падении браузера проход продолжается со страницы падения в новом браузере
+        # (до crawl_max_retries попыток, см. runner.run_parser)
+        self.is_crawl_checkpoint = self.config.getboolean('DEFAULT', 'crawl_checkpoint', fallback=False)
+        self.crawl_checkpoint_max_age_min = self.config.getint('DEFAULT', 'crawl_checkpoint_max_age_min', fallback=60)
+        self.crawl_max_retries = self.config.getint('DEFAULT', 'crawl_max_retries', fallback=2)
+        self.checkpoint = None
+        self.is_crawl_interrupted = False
+        # Результаты страниц контрольной точки уже переданы page_result_handler прерванной попыткой
+        self.is_checkpoint_handled = False
+
+        # Метрики времени методов прохода по страницам (JSON lines и сводная таблица в логе)
+        self.span_metrics = span_metrics.SpanMetrics(shop) \
+            if self.config.getboolean('DEFAULT', 'span_metrics', fallback=False) else None
+
+        # Без браузера парсер может только разбирать готовые html страницы (_parse_catalog_page)
+        if not with_browser:
+            self.driver = None
+            return
+
+        # Браузер запускается в постоянном профиле магазина, если профили включены
+        self.profile_slots = webdriver_profiles.get_profile_slots()
+        self.is_driver_broken = False
+        if self.profile_slots:
+            self.driver = self.profile_slots.borrow(shop, is_proxy, domain)
+        else:
+            self.driver = webdriver_profiles.create_driver(is_proxy, shop=shop, domain=domain)
+
+        if not self.driver:
+            self.logger.error("НЕ СМОГ ИНИЦИАЛИЗИРОВАТЬ WEBDRIVER")
+            return
+
+        # Proxy браузера: результаты загрузки страниц учитываются в пуле proxy
+        self.proxy = getattr(self.driver, 'proxy_address', None)
+
+        self.driver.implicitly_wait(1.5)
+        self.wait = WebDriverWait(self.driver, 20)
 
     def _wd_find_elem(self, by, xpath):
         """
@@ -138,21 +271,203 @@ class ParseBase(ABC):
             self.logger.error("Не смог нажать на элемент через click, {}".format(e))
             return False
 
+    @span_metrics.timed
     def _wd_scroll_down(self, count_press=7, timeout=0.2):
         """
-        Скролл вниз для прогрузки товаров на странице
+        Скролл вниз для прогрузки товаров на странице. При адаптивном ожидании после нажатия ждет окончания прокрутки
+        не дольше @timeout и прекращает скролл, когда достигнут низ страницы и новые товары больше не подгружаются
         """
-        for _ in range(count_press):
-            ActionChains(self.driver).send_keys(Keys.PAGE_DOWN).perform()
-            time.sleep(timeout)
+        return self.__wd_scroll(Keys.PAGE_DOWN, count_press, timeout)
 
     def _wd_scroll_up(self, count_press=7, timeout=0.2):
         """
-        Скролл вверх для прогрузки товаров на странице
+        Скролл вверх для прогрузки товаров на странице. При адаптивном ожидании прекращается на верху страницы
         """
-        for _ in range(count_press):
-            ActionChains(self.driver).send_keys(Keys.PAGE_UP).perform()
-            time.sleep(timeout)
+        return self.__wd_scroll(Keys.PAGE_UP, count_press, timeout)
+
+    def __wd_scroll(self, key, count_press, timeout):
+        """
+        Нажатие @key @count_press раз. Вернет False, если браузер не ответил
+        """
+        try:
+            for _ in range(count_press):
+                ActionChains(self.driver).send_keys(key).perform()
+                if not self.is_adaptive_wait:
+                    time.sleep(timeout)
+                    continue
+
+                pos, height, view_height = self.__wd_wait_scroll_finished(timeout)
+                if key == Keys.PAGE_UP:
+                    if pos <= 0:
+                        break
+                    continue
+
+                if pos + view_height < height - 2:
+                    continue
+
+                # Низ страницы - ждем подгрузки товаров и продолжаем, только если страница выросла
+                self._wd_wait_items_stable(timeout=max(timeout * 5, 1))
+                if self.driver.execute_script(_JS_GET_SCROLL_STATE)[1] <= height:
+                    break
+        except se.WebDriverException as e:
+            self.logger.error("Не смог прокрутить страницу, {}".format(e))
+            return False
+
+        return True
+
+    def __wd_wait_scroll_finished(self, timeout):
+        """
+        Ожидание окончания прокрутки страницы не дольше @timeout. Вернет [позиция, высота страницы, высота окна]
+        """
+        state_list = [self.driver.execute_script(_JS_GET_SCROLL_STATE)]
+
+        def is_finished(driver):
+            state_list.append(driver.execute_script(_JS_GET_SCROLL_STATE))
+            return state_list[-1] == state_list[-2]
+
+        self._wd_wait_until(is_finished, timeout, poll_sec=0.05)
+        return state_list[-1]
+
+    def _wd_wait_until(self, condition, timeout, poll_sec=0.1):
+        """
+        Ожидание выполнения условия @condition(driver) не дольше @timeout сек. Вернет True, если условие выполнено
+        """
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=poll_sec).until(condition)
+            return True
+        except se.TimeoutException:
+            return False
+        except se.WebDriverException as e:
+            self.logger.warning("Ошибка при ожидании условия на странице, {}".format(e))
+            return False
+
+    def _wd_wait_document_ready(self, timeout):
+        """
+        Ожидание завершения загрузки документа
+        """
+        return self._wd_wait_until(
+            lambda driver: driver.execute_script("return document.readyState;") == 'complete', timeout)
+
+    def _wd_wait_items_stable(self, timeout, stable_sec=0.5):
+        """
+        Ожидание, пока кол-во товаров каталога и сетка товаров не перестанут меняться в течение @stable_sec
+        """
+        state = {'value': None, 'since': time.time()}
+
+        def is_stable(driver):
+            value = driver.execute_script(_JS_GET_GRID_STATE, self.container_css_selector)
+            now = time.time()
+            if value != state['value']:
+                state['value'], state['since'] = value, now
+                return False
+            return value[0] > 0 and now - state['since'] >= stable_sec
+
+        return self._wd_wait_until(is_stable, timeout)
+
+    def _wd_wait_content_stable(self, max_wait_sec):
+        """
+        Замена фиксированной задержки @max_wait_sec: при адаптивном ожидании ждем только стабилизации товаров
+        """
+        if not self.is_adaptive_wait:
+            time.sleep(max_wait_sec)
+            return
+
+        self._wd_wait_document_ready(max_wait_sec)
+        self._wd_wait_items_stable(max_wait_sec)
+
+    def _wd_wait_clickable(self, element, max_wait_sec):
+        """
+        Замена фиксированной задержки перед кликом: при адаптивном ожидании ждем, пока элемент не станет доступен
+        """
+        if not self.is_adaptive_wait:
+            time.sleep(max_wait_sec)
+            return
+
+        self._wd_wait_until(lambda driver: element.is_displayed() and element.is_enabled(), max_wait_sec)
+
+    def _wd_get_page_anchor(self):
+        """
+        Первый товар на текущей странице. После перехода на другую страницу элемент исчезает из DOM
+        """
+        try:
+            return self.driver.execute_script("return document.querySelector(arguments[0]);",
+                                              self.container_css_selector)
+        except se.WebDriverException as e:
+            self.logger.error("Не смог получить товар текущей страницы, {}".format(e))
+            return None
+
+    @span_metrics.timed
+    def _wd_polite_wait(self):
+        """
+        Вызывается перед переходом на страницу магазина. При включенном ограничении частоты забирает токен домена,
+        иначе выдерживает минимальный интервал между переходами по страницам домена из парсеров процесса
+        """
+        self.__navigation_start_time = time.time()
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+            self.__load_start_time = time.time()
+            return
+
+        with _LAST_NAVIGATION_MUTEX:
+            now = time.time()
+            delay = _LAST_NAVIGATION_TIME_DICT.get(self.domain, 0) + self.polite_min_interval_sec - now
+            _LAST_NAVIGATION_TIME_DICT[self.domain] = now + max(delay, 0)
+
+        if delay > 0:
+            time.sleep(delay)
+        self.__load_start_time = time.time()
+
+    @span_metrics.timed
+    def _wd_wait_page_loaded(self, page_anchor=None):
+        """
+        Вызывается после перехода на страницу каталога. При адаптивном ожидании ждем исчезновения товара
+        прошлой страницы @page_anchor, загрузки документа и стабилизации товаров, иначе - фиксированная задержка
+        wait_between_pages_sec. Фиксированная задержка - верхняя граница каждого ожидания
+        """
+        if not self.is_adaptive_wait:
+            time.sleep(self.wait_between_pages_sec)
+        else:
+            if page_anchor:
+                self._wd_wait_until(staleness_of(page_anchor), self.wait_between_pages_sec)
+            self._wd_wait_document_ready(self.wait_between_pages_sec)
+            self._wd_wait_items_stable(self.wait_between_pages_sec)
+
+        if self.__load_start_time:
+            self._report_proxy_page_load(self._wd_get_page_anchor() is not None, time.time() - self.__load_start_time)
+            self.__load_start_time = None
+
+        if self.__navigation_start_time:
+            spent_sec = time.time() - self.__navigation_start_time
+            self.wait_saved_sec_list.append(self.wait_between_pages_sec - spent_sec)
+            self.__navigation_start_time = None
+            self.logger.debug("Ожидание страницы {:.2f} сек, сэкономлено {:.2f} сек".format(
+                spent_sec, self.wait_saved_sec_list[-1]))
+
+    def _wd_is_banned(self):
+        """
+        Проверка, что вместо страницы магазина открыта страница блокировки или проверки на робота
+        """
+        try:
+            text = self.driver.execute_script(
+                "return document.title + ' ' + (document.body ? document.body.innerText.slice(0, 2000) : '');")
+        except se.WebDriverException:
+            return False
+
+        text = (text or '').lower()
+        return any(signal in text for signal in BAN_SIGNALS_LIST)
+
+    def _report_proxy_page_load(self, is_loaded, latency_sec):
+        """
+        Учет результата загрузки страницы в пуле proxy: задержка при успехе, ошибка или бан при неудаче
+        """
+        if not self.proxy:
+            return
+
+        if is_loaded:
+            proxy_pool.get_pool().report_success(self.proxy, self.domain, latency_sec)
+            return
+
+        proxy_pool.get_pool().report_failure(self.proxy, self.domain, is_ban=self._wd_is_banned())
 
     def _multiple_func_call(self, fun, count=3, true_result=True):
         """
@@ -169,6 +484,12 @@ class ParseBase(ABC):
         self.logger.info("Успешный вызов метода {} в цикле MULTI_CALL".format(fun))
         return True
 
+    def _parse_model_name(self, name):
+        """
+        Парсинг названия модели функцией магазина через кэш результатов
+        """
+        return self.model_name_cache.parse(name)
+
     def _add_to_pr_result_list(self, brand_name, model_name, color, price, ram, rom,
                                img_url, url, rating, num_rating, product_code):
         """
@@ -194,6 +515,7 @@ class ParseBase(ABC):
             product_code=product_code.lower(),
         ))
 
+    @span_metrics.timed
     def _wd_get_cur_page(self):
         """
         Получить текущий код страницы
@@ -202,6 +524,21 @@ class ParseBase(ABC):
             return self.driver.page_source
         except Exception as e:
             self.logger.error("Не смог получить код страницы, {}".format(e))
+            self.is_driver_broken = True
+            return None
+
+    def _wd_get_page_marker(self, css_selector, pos=-5):
+        """
+        Значение href ссылки товара под номером @pos на текущей странице. Используется, чтобы после перехода
+        дождаться исчезновения товаров прошлой страницы, не дожидаясь разбора страницы
+        """
+        try:
+            return self.driver.execute_script(
+                "var items = document.querySelectorAll(arguments[0]);"
+                "return items.length ? items[Math.max(items.length + arguments[1], 0)].getAttribute('href') : null;",
+                css_selector, pos)
+        except se.WebDriverException as e:
+            self.logger.error("Не смог получить маркер страницы, {}".format(e))
             return None
 
     def _wd_close_browser(self):
@@ -209,23 +546,43 @@ class ParseBase(ABC):
         Завершение работы браузера
         """
         self.logger.info("Завершение работы")
-        if self.driver:
+        if not self.driver:
+            return
+
+        if self.profile_slots:
+            self.profile_slots.release(self.driver)
+        else:
             self.driver.quit()
+        self.driver = None
 
+    def _get_catalog_page_url(self, url, num_page):
+        """
+        Адрес страницы каталога с номером @num_page (с 1), номер задается параметром запроса catalog_page_query
+        """
+        if num_page <= 1 or not self.catalog_page_query:
+            return url
+
+        parts = urlsplit(url)
+        query_list = [(key, val) for key, val in parse_qsl(parts.query) if key != self.catalog_page_query]
+        query_list.append((self.catalog_page_query, str(num_page)))
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query_list), parts.fragment))
+
+    @span_metrics.timed
     def _parse_catalog_page(self, html):
         """
-        Парсинг блоков каталога
+        Парсинг блоков каталога. Вернет кол-во найденных блоков
         """
         if not self.container_css_selector:
             raise AttributeError('self.container_css_selector not initialized in child class.')
 
-        soup = bs4.BeautifulSoup(html, 'lxml')
-
         # Контейнер с элементами
-        container = soup.select(self.container_css_selector)
+        container = html_extractor.select_blocks(html, self.container_css_selector, self.html_engine)
         for block in container:
             self._parse_catalog_block(block)
+
+        num_blocks = len(container)
         del container
+        return num_blocks
 
     def _save_result(self):
         """
@@ -234,6 +591,352 @@ class ParseBase(ABC):
         FileWorker.csv_data.save(path=h.CSV_PATH_RAW + self.shop + '.csv',
                                  data=self.pr_result_list, namedtuple_type=h.ParseResult)
 
+    def __run_catalog_loop(self, executor=None):
+        """
+        Проход по страницам каталога. Если передан пул @executor, html каждой страницы отправляется на разбор в пул,
+        и браузер сразу переходит к следующей странице (несовместимо с инкрементальным проходом).
+        Вернет список задач разбора в порядке страниц
+        """
+        futures_list = []
+        while True:
+            if self.is_traffic_report:
+                self.__collect_traffic_stats()
+
+            html = self._wd_get_cur_page()
+            if self.is_driver_broken:
+                break
+
+            num_page = self.cur_page - 1
+            if self.page_cache:
+                self.page_cache.save_page(num_page, html)
+
+            page_result_list = []
+            if executor:
+                if html:
+                    futures_list.append(executor.submit(parse_worker.parse_catalog_page, type(self), html))
+                    if self.checkpoint:
+                        futures_list[-1].add_done_callback(partial(self.__add_checkpoint_page, num_page))
+                    if self.span_metrics:
+                        futures_list[-1].add_done_callback(partial(self.__add_parse_span, num_page))
+                self.__handle_done_futures(futures_list)
+            else:
+                len_before = len(self.pr_result_list)
+                self._parse_catalog_page(html)
+                page_result_list = self.pr_result_list[len_before:]
+                self._handle_page_results(page_result_list)
+                if self.checkpoint:
+                    self.checkpoint.add_page(num_page, page_result_list)
+
+            if self.crawl_state and self.crawl_state.check_page(num_page, page_result_list):
+                break
+
+            try:
+                if not self._wd_next_page():
+                    break
+            except se.WebDriverException as e:
+                self.logger.error("Ошибка браузера при переходе на страницу {}, {}".format(self.cur_page, e))
+                self.is_driver_broken = True
+                break
+
+        # Упавший браузер не всегда дает исключение - переход на страницу просто не удается
+        if not self.is_driver_broken and not self.__wd_is_alive():
+            self.is_driver_broken = True
+        self.is_crawl_interrupted = self.is_driver_broken
+        return futures_list
+
+    def __wd_is_alive(self):
+        """
+        Проверка, что браузер отвечает
+        """
+        try:
+            return self.driver.execute_script("return 1;") == 1
+        except se.WebDriverException:
+            return False
+
+    def __add_checkpoint_page(self, num_page, future):
+        """
+        Запись в контрольную точку результатов страницы, разбор которой в пуле завершен
+        """
+        self.checkpoint.add_page(num_page, self.__get_future_result_list(future))
+
+    def __add_parse_span(self, num_page, future):
+        """
+        Запись в метрики прохода времени разбора страницы в пуле
+        """
+        try:
+            time_start, duration_sec = future.result()[3]
+        except Exception:
+            return
+
+        self.span_metrics.add('_parse_catalog_page', num_page, time_start, duration_sec)
+
+    def __wd_resume_from_checkpoint(self, url):
+        """
+        Продолжение прерванного прохода: результаты страниц до страницы падения берутся из контрольной точки,
+        браузер переходит на страницу падения. Вернет False, если перейти на нее не удалось
+        """
+        resume_page = self.checkpoint.get_resume_page()
+        if resume_page <= 1:
+            return True
+
+        for num_page, result_list in self.checkpoint.get_results():
+            self.pr_result_list.extend(result_list)
+            if not self.is_checkpoint_handled:
+                self._handle_page_results(result_list)
+            if self.crawl_state:
+                self.crawl_state.check_page(num_page, result_list)
+
+        self.logger.info("Продолжение прохода со страницы {}, из контрольной точки взято товаров - {}".format(
+            resume_page, len(self.pr_result_list)))
+
+        # Переход по прямой ссылке, если магазин ее поддерживает, иначе по пагинации
+        if self.catalog_page_query:
+            if not self._wd_open_catalog_page(url, resume_page):
+                return False
+
+            self.cur_page = resume_page + 1
+            return True
+
+        while self.cur_page <= resume_page:
+            if not self._wd_next_page():
+                return False
+
+        return True
+
+    def _wd_get_num_pages(self):
+        """
+        Кол-во страниц каталога по наибольшему номеру в пагинации. Вернет 0, если пагинации нет
+        """
+        if not self.pagination_css_selector:
+            return 0
+
+        try:
+            return self.driver.execute_script(
+                "var num = 0;"
+                "document.querySelectorAll(arguments[0]).forEach(function(el) {"
+                "    var val = parseInt(el.textContent.trim(), 10); if (val > num) { num = val; }"
+                "});"
+                "return num;", self.pagination_css_selector) or 0
+        except se.WebDriverException as e:
+            self.logger.error("Не смог получить кол-во страниц каталога, {}".format(e))
+            return 0
+
+    def __get_domain_semaphore(self):
+        """
+        Семафор, ограничивающий кол-во одновременных загрузок страниц домена (fanout_max_per_domain)
+        """
+        with _LAST_NAVIGATION_MUTEX:
+            if self.domain not in _DOMAIN_SEMAPHORES_DICT:
+                _DOMAIN_SEMAPHORES_DICT[self.domain] = threading.BoundedSemaphore(max(self.fanout_max_per_domain, 1))
+            return _DOMAIN_SEMAPHORES_DICT[self.domain]
+
+    def _wd_open_catalog_page(self, url, num_page):
+        """
+        Переход на страницу каталога @num_page по прямой ссылке, ожидание прогрузки и скролл
+        """
+        with self.__get_domain_semaphore():
+            self._wd_polite_wait()
+            try:
+                self.driver.get(self._get_catalog_page_url(url, num_page))
+            except se.WebDriverException as e:
+                self.logger.error("Не смог загрузить страницу {}, {}".format(num_page, e))
+                self.is_driver_broken = True
+                return False
+
+            self._wd_wait_page_loaded()
+            if not self._wd_check_load_page_catalog():
+                return False
+
+            # При адаптивном ожидании скролл останавливается на низу страницы
+            return self._wd_scroll_down(count_press=35)
+
+    def __fetch_catalog_pages(self, url, pages_list):
+        """
+        Загрузка и разбор страниц каталога @pages_list текущим браузером. Вернет словарь номер страницы -> результаты
+        """
+        page_results_dict = {}
+        for num_page in pages_list:
+            if self.is_driver_broken:
+                break
+
+            # Текущая страница для метрик прохода
+            self.cur_page = num_page + 1
+            if not self._wd_open_catalog_page(url, num_page):
+                self.logger.error("Не удалось прогрузить страницу {}".format(num_page))
+                continue
+
+            html = self._wd_get_cur_page()
+            if self.page_cache:
+                self.page_cache.save_page(num_page, html)
+
+            len_before = len(self.pr_result_list)
+            self._parse_catalog_page(html)
+            page_results_dict[num_page] = self.pr_result_list[len_before:]
+            del self.pr_result_list[len_before:]
+
+        return page_results_dict
+
+    @classmethod
+    def _run_catalog_pages(cls, url, pages_list, metrics=None):
+        """
+        Загрузка страниц каталога @pages_list отдельным парсером со своим браузером и выбранным городом.
+        Время методов записывается в общие метрики прохода @metrics.
+        Вернет словарь номер страницы -> результаты или None, если браузер не удалось подготовить
+        """
+        parser = cls()
+        parser.span_metrics = metrics
+        if not parser.driver:
+            return None
+
+        try:
+            if not parser._wd_open_browser_catalog(url):
+                parser.is_driver_broken = True
+                return None
+
+            return parser.__fetch_catalog_pages(url, pages_list)
+        finally:
+            parser._wd_close_browser()
+
+    def __run_catalog_fanout(self, url):
+        """
+        Проход каталога несколькими браузерами: текущая страница разбирается сразу, по пагинации определяется
+        кол-во страниц, оставшиеся страницы делятся на диапазоны и загружаются параллельно. Страницы, которые
+        не удалось загрузить в других браузерах, догружаются текущим. Результаты объединяются в порядке страниц
+        без повторов товаров
+        """
+        self._parse_catalog_page(self._wd_get_cur_page())
+        num_pages = self._wd_get_num_pages()
+        pages_list = list(range(self.cur_page, num_pages + 1))
+        if not pages_list:
+            return
+
+        num_drivers = min(self.fanout_drivers, self.fanout_max_per_domain, len(pages_list))
+        chunk_size = -(-len(pages_list) // num_drivers)
+        chunks_list = [pages_list[i:i + chunk_size] for i in range(0, len(pages_list), chunk_size)]
+        self.logger.info("Страниц каталога - {}, браузеров - {}".format(num_pages, len(chunks_list)))
+
+        with ThreadPoolExecutor(max_workers=max(len(chunks_list) - 1, 1)) as executor:
+            futures_list = [executor.submit(type(self)._run_catalog_pages, url, chunk, self.span_metrics)
+                            for chunk in chunks_list[1:]]
+            page_results_dict = self.__fetch_catalog_pages(url, chunks_list[0])
+
+            for future in futures_list:
+                try:
+                    page_results_dict.update(future.result() or {})
+                except Exception as e:
+                    self.logger.error("Ошибка загрузки диапазона страниц, {}".format(e))
+
+        missed_pages_list = [num_page for num_page in pages_list if num_page not in page_results_dict]
+        if missed_pages_list:
+            self.logger.warning("Догружаю страницы текущим браузером: {}".format(missed_pages_list))
+            page_results_dict.update(self.__fetch_catalog_pages(url, missed_pages_list))
+
+        for num_page in sorted(page_results_dict):
+            self.pr_result_list.extend(page_results_dict[num_page])
+
+        # Повторы товаров известны только после загрузки всех страниц, поэтому результаты передаются одним списком
+        self.__remove_duplicate_results()
+        self._handle_page_results(self.pr_result_list)
+
+    def __remove_duplicate_results(self):
+        """
+        Удаление повторов товаров (страницы могли сместиться во время параллельной загрузки). Товар определяется
+        по коду, а у магазинов без кода товара - по url
+        """
+        key_set = set()
+        result_list = []
+        for item in self.pr_result_list:
+            key = item.url if item.product_code == 'none' else item.product_code
+            if key not in key_set:
+                key_set.add(key)
+                result_list.append(item)
+
+        if len(result_list) != len(self.pr_result_list):
+            self.logger.info("Удалено повторов товаров - {}".format(len(self.pr_result_list) - len(result_list)))
+        self.pr_result_list = result_list
+
+    def __collect_traffic_stats(self):
+        """
+        Сохранение статистики трафика, накопленной браузером с прошлой страницы
+        """
+        stats = lean_profile.collect_traffic_stats(self.driver)
+        if not stats:
+            return
+
+        self.traffic_stats_list.append(stats)
+        self.logger.debug("Трафик страницы: {:.1f} КБ, запросов - {}, заблокировано - {}".format(
+            stats[0] / 1024, stats[1], stats[2]))
+
+    def __log_wait_and_traffic_stats(self):
+        """
+        Итоговая статистика ожидания и трафика страниц каталога
+        """
+        if self.wait_saved_sec_list:
+            saved_sec = sum(self.wait_saved_sec_list)
+            num_pages = len(self.wait_saved_sec_list)
+            self.logger.info("Ожидание страниц: {} стр., сэкономлено {:.1f} сек (в среднем {:.2f} сек на страницу)".
+                             format(num_pages, saved_sec, saved_sec / num_pages))
+
+        if self.traffic_stats_list:
+            num_pages = len(self.traffic_stats_list)
+            num_bytes, num_loaded, num_blocked = (sum(item) for item in zip(*self.traffic_stats_list))
+            self.logger.info("Трафик страниц: {} стр., {:.1f} КБ на страницу, запросов на страницу - {:.1f}, "
+                             "заблокировано - {:.1f}".format(num_pages, num_bytes / 1024 / num_pages,
+                                                             num_loaded / num_pages, num_blocked / num_pages))
+
+    def __get_future_result_list(self, future):
+        """
+        Результаты страницы из задачи разбора в пуле процессов
+        """
+        try:
+            return future.result()[0]
+        except Exception as e:
+            self.logger.error("Ошибка разбора страницы в пуле процессов, {}".format(e))
+            return []
+
+    def _handle_page_results(self, result_list):
+        """
+        Передача результатов страницы обработчику page_result_handler, если он задан
+        """
+        if not self.page_result_handler or not result_list:
+            return
+
+        try:
+            self.page_result_handler(list(result_list))
+        except Exception as e:
+            self.logger.error("Ошибка обработчика результатов страницы, {}".format(e))
+
+    def __handle_done_futures(self, futures_list):
+        """
+        Передача обработчику результатов страниц, разбор которых в пуле уже завершен, в порядке страниц
+        """
+        if not self.page_result_handler:
+            return
+
+        while self.__num_handled_futures < len(futures_list) and futures_list[self.__num_handled_futures].done():
+            self._handle_page_results(self.__get_future_result_list(futures_list[self.__num_handled_futures]))
+            self.__num_handled_futures += 1
+
+    def __merge_parse_results(self, futures_list):
+        """
+        Объединение результатов разбора страниц в pr_result_list в порядке страниц. Результаты страниц, еще не
+        переданные обработчику во время прохода, передаются сейчас
+        """
+        for i, future in enumerate(futures_list):
+            try:
+                result_list, undefined_model_names_list, new_cache_items_list, _ = future.result()
+            except Exception as e:
+                self.logger.error("Ошибка разбора страницы в пуле процессов, {}".format(e))
+                continue
+
+            self.pr_result_list.extend(result_list)
+            if self.model_name_cache:
+                self.model_name_cache.update(new_cache_items_list)
+            if i >= self.__num_handled_futures:
+                self._handle_page_results(result_list)
+            for name in undefined_model_names_list:
+                h.save_undefined_model_name(name)
+
     def run_catalog(self, url, cur_page=None):
         """
         Запуск работы парсера для каталога
@@ -242,24 +945,146 @@ class ParseBase(ABC):
             self._wd_close_browser()
             return None
 
+        time_start = time.time()
         if not self._wd_open_browser_catalog(url):
             self.logger.error("Open browser fail")
+            self._report_proxy_page_load(False, time.time() - time_start)
+            self.is_driver_broken = True
             self._wd_close_browser()
+            self._save_span_metrics()
             return None
 
+        self._report_proxy_page_load(True, time.time() - time_start)
+
         if cur_page:
             self.cur_page = cur_page + 1
 
-        while True:
-            html = self._wd_get_cur_page()
+        self.crawl_state = CrawlState(self.shop, self.incremental_stop_pages, self.incremental_full_crawl_hours) \
+            if self.is_incremental_crawl else None
+        # Параллельная загрузка страниц несовместима с инкрементальным проходом, которому нужен порядок страниц,
+        # и возможна только для магазинов с прямой ссылкой на страницу каталога (catalog_page_query).
+        # Она сама догружает страницы, не загруженные другими браузерами, поэтому контрольная точка ей не нужна
+        is_fanout = self.fanout_drivers > 1 and not self.crawl_state and bool(self.catalog_page_query)
+        # Контрольная точка возможна только для прохода с первой страницы
+        self.checkpoint = CrawlCheckpoint(self.shop, url, self.crawl_checkpoint_max_age_min) \
+            if self.is_crawl_checkpoint and not cur_page and not is_fanout else None
+
+        # Продолженный проход сохраняет страницы в тот же проход кэша страниц
+        self.page_cache = PageCache(self.shop, self.page_cache_max_size_mb,
+                                    self.checkpoint.page_cache_run_id if self.checkpoint else None) \
+            if self.is_page_cache else None
+        if self.checkpoint and self.page_cache:
+            self.checkpoint.page_cache_run_id = self.page_cache.run_id
+
+        if self.checkpoint and not self.__wd_resume_from_checkpoint(url):
+            self.logger.error("Не удалось продолжить проход с контрольной точки")
+            self.is_crawl_interrupted = True
+            self._wd_close_browser()
+        elif is_fanout:
+            self.__run_catalog_fanout(url)
+            self._wd_close_browser()
+        elif self.parse_workers > 0 and not self.crawl_state:
+            # Инкрементальному проходу результат страницы нужен до перехода на следующую, поэтому пул бы только
+            # добавил передачу страниц между процессами - разбор идет в текущем потоке
+            with parse_worker.create_executor(self.parse_workers) as executor:
+                futures_list = self.__run_catalog_loop(executor)
+                self._wd_close_browser()
+                self.__merge_parse_results(futures_list)
+        else:
+            self.__run_catalog_loop()
+            self._wd_close_browser()
+
+        # Прерванный проход будет продолжен с контрольной точки: кэш страниц и состояние инкрементального прохода
+        # сохраняются только после его завершения
+        if self.is_crawl_interrupted and self.checkpoint:
+            self.__log_wait_and_traffic_stats()
+            return self.__save_run_result()
+
+        # Прерванный падением браузера или остановленный инкрементальный проход сохранил не все страницы -
+        # его воспроизведение потеряло бы товары остальных страниц
+        if self.page_cache:
+            self.page_cache.finish(is_complete=not self.is_crawl_interrupted and
+                                   (not self.crawl_state or self.crawl_state.stop_page is None))
+
+        # Товары страниц, до которых проход не дошел, берутся из прошлого прохода
+        if self.crawl_state:
+            carried_result_list = self.crawl_state.get_carried_results()
+            self.pr_result_list.extend(carried_result_list)
+            self._handle_page_results(carried_result_list)
+            self.crawl_state.save(is_interrupted=self.is_crawl_interrupted)
+
+        if self.checkpoint:
+            self.checkpoint.clear()
+
+        self.__log_wait_and_traffic_stats()
+        return self.__save_run_result()
+
+    def run_catalog_replay(self, run_id=None):
+        """
+        Воспроизведение прохода каталога из кэша страниц без браузера, по умолчанию - последнего завершенного.
+        Вернет тот же результат, что и run_catalog при разборе этих страниц
+        """
+        num_pages = 0
+        for html in PageCache.load_pages(self.shop, run_id):
+            num_pages += 1
+            self.cur_page = num_pages + 1
+            len_before = len(self.pr_result_list)
             self._parse_catalog_page(html)
-            if not self._wd_next_page():
+            self._handle_page_results(self.pr_result_list[len_before:])
+
+        self.logger.info("Воспроизведено страниц из кэша - {}, товаров - {}".format(
+            num_pages, len(self.pr_result_list)))
+        if not self.pr_result_list:
+            return None
+
+        return self.__save_run_result()
+
+    def iter_catalog(self, url, cur_page=None):
+        """
+        Потоковый проход каталога: генератор списков товаров каждой страницы по мере их разбора. Проход (run_catalog)
+        идет в отдельном потоке, итоговый результат остается в pr_result_list
+        """
+        page_queue = queue.Queue()
+        self.page_result_handler = page_queue.put
+
+        def run():
+            try:
+                self.run_catalog(url, cur_page)
+            finally:
+                page_queue.put(None)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        while True:
+            result_list = page_queue.get()
+            if result_list is None:
                 break
+            yield result_list
+
+        thread.join()
 
-        self._wd_close_browser()
+    def __save_run_result(self):
+        """
+        Сохранение результата прохода каталога, неизвестных моделей и кэша названий
+        """
         self._save_result()
+        h.flush_undefined_model_names()
+        if self.model_name_cache:
+            self.model_name_cache.save()
+        self._save_span_metrics()
         return self.pr_result_list
 
+    def _save_span_metrics(self):
+        """
+        Запись метрик прохода в JSON lines и вывод сводной таблицы в лог
+        """
+        if not self.span_metrics:
+            return
+
+        summary = self.span_metrics.get_summary()
+        if self.span_metrics.save():
+            self.logger.info(summary)
+
     def run_product(self, url):
         """
         Запуск работы парсера для продукта
@@ -271,6 +1096,9 @@ class ParseBase(ABC):
         """
         Запуск браузера, загрузка начальной страницы каталога, выбор города
         """
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
         try:
             self.driver.get(url)
         except Exception as e:
@@ -287,7 +1115,8 @@ class ParseBase(ABC):
             self.logger.info("Не могу выбрать город")
             return False
 
-        time.sleep(2)
+        # Ожидание перезагрузки каталога после смены города
+        self._wd_wait_content_stable(2)
 
         # Ждем, пока не прогрузится страница
         if not self._wd_check_load_page_catalog():
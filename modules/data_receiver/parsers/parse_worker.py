@@ -0,0 +1,63 @@
+"""
+Разбор html страниц каталога в отдельных процессах. Браузер парсера только снимает html страниц и отправляет их
+в пул, а разбор (_parse_catalog_page) идет параллельно с переходом на следующие страницы
+"""
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import modules.common.helper as h
+
+# Парсеры без браузера, созданные в процессе пула: класс парсера -> экземпляр
+PARSERS_DICT = {}
+
+
+def init_worker(except_model_names_dict, allowed_model_names_list, rebuilt_iphone_name, ignore_words_for_color):
+    """
+    Инициализация процесса пула данными, которые нужны для разбора названий моделей
+    """
+    h.EXCEPT_MODEL_NAMES_DICT = except_model_names_dict
+    h.ALLOWED_MODEL_NAMES_LIST_FOR_BASE = allowed_model_names_list
+    h.REBUILT_IPHONE_NAME = rebuilt_iphone_name
+    h.IGNORE_WORDS_FOR_COLOR = ignore_words_for_color
+    h.compile_model_names_data()
+
+
+def create_executor(max_workers):
+    """
+    Пул процессов для разбора страниц с данными текущего процесса. Процессы запускаются через spawn: fork процесса,
+    в котором уже работают потоки парсеров и браузеры, может унаследовать захваченные блокировки и зависнуть
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_worker, initargs=(
+        h.EXCEPT_MODEL_NAMES_DICT, h.ALLOWED_MODEL_NAMES_LIST_FOR_BASE,
+        h.REBUILT_IPHONE_NAME, h.IGNORE_WORDS_FOR_COLOR))
+
+
+def parse_catalog_page(parser_class, html):
+    """
+    Разбор одной страницы каталога в процессе пула. Вернет список результатов страницы, неизвестные модели,
+    найденные на странице, новые записи кэша названий (их записывает основной процесс) и время разбора
+    (время начала, длительность в секундах) для метрик прохода
+    """
+    parser = PARSERS_DICT.get(parser_class)
+    if not parser:
+        parser = parser_class(with_browser=False)
+        # Время разбора передается в метрики основного процесса
+        parser.span_metrics = None
+        if parser.model_name_cache:
+            parser.model_name_cache.new_items_list = []
+        PARSERS_DICT[parser_class] = parser
+
+    parser.pr_result_list = []
+    time_start = time.time()
+    perf_start = time.perf_counter()
+    parser._parse_catalog_page(html)
+    parse_span = (time_start, time.perf_counter() - perf_start)
+
+    with h.UNDEFINED_MODEL_NAMES_MUTEX:
+        undefined_model_names_list = list(h.UNDEFINED_MODEL_NAMES_SET)
+        h.UNDEFINED_MODEL_NAMES_SET.clear()
+
+    new_cache_items_list = parser.model_name_cache.pop_new_items() if parser.model_name_cache else []
+    return parser.pr_result_list, undefined_model_names_list, new_cache_items_list, parse_span
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import functools
+import threading
+from datetime import datetime
+
+import modules.common.helper as h
+from modules.common.file_worker import FileLock
+
+logger = h.logging.getLogger('SpanMetrics')
+
+
+def timed(func):
+    """
+    Декоратор метода парсера: время каждого вызова записывается в span_metrics парсера, если метрики включены.
+    Номер страницы берется из cur_page парсера после вызова. Вложенный вызов метода с тем же именем (например,
+    через super()) отдельно не учитывается
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        metrics = getattr(self, 'span_metrics', None)
+        if not metrics or not metrics.enter(name):
+            return func(self, *args, **kwargs)
+
+        time_start = time.time()
+        perf_start = time.perf_counter()
+        error = None
+        try:
+            return func(self, *args, **kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            metrics.leave(name)
+            metrics.add(name, getattr(self, 'cur_page', 2) - 1, time_start, time.perf_counter() - perf_start, error)
+
+    return wrapper
+
+
+def get_percentile(sorted_list, percent):
+    """
+    Значение перцентиля @percent отсортированного списка
+    """
+    return sorted_list[min(int(len(sorted_list) * percent / 100), len(sorted_list) - 1)]
+
+
+class SpanMetrics:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Метрики времени методов парсера (spans): для каждого вызова запоминается метод, страница каталога, время начала
+    и длительность. По завершении прохода записи дописываются в JSON lines файл дня h.SPAN_METRICS_PATH/
+    spans_<дата>.jsonl (общий для всех магазинов и процессов, запись под FileLock), а в лог выводится сводная
+    таблица по методам. Один экземпляр может использоваться парсерами из нескольких потоков (fanout_drivers).
+
+    :method enter: Начало вызова метода в текущем потоке
+    :method leave: Завершение вызова метода в текущем потоке
+    :method add: Запись вызова
+    :method save: Запись в JSON lines файл
+    :method get_summary: Сводная таблица по методам
+    """
+    def __init__(self, shop, path=None):
+        self.shop = shop
+        self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        self.path = path or os.path.join(h.SPAN_METRICS_PATH,
+                                         'spans_{}.jsonl'.format(datetime.now().strftime('%Y.%m.%d')))
+        self.time_start = time.time()
+        self.mutex = threading.Lock()
+        self.local = threading.local()
+        self.records_list = []
+
+    def enter(self, name):
+        """
+        Начало вызова метода @name. Вернет False, если метод уже выполняется в текущем потоке
+        """
+        active_set = getattr(self.local, 'active_set', None)
+        if active_set is None:
+            active_set = self.local.active_set = set()
+
+        if name in active_set:
+            return False
+
+        active_set.add(name)
+        return True
+
+    def leave(self, name):
+        self.local.active_set.discard(name)
+
+    def add(self, name, num_page, time_start, duration_sec, error=None):
+        """
+        Запись вызова метода @name на странице @num_page
+        """
+        record = {'run_id': self.run_id, 'shop': self.shop, 'page': num_page, 'span': name,
+                  'start': round(time_start, 3), 'sec': round(duration_sec, 4)}
+        if error:
+            record['error'] = error
+
+        with self.mutex:
+            self.records_list.append(record)
+
+    def save(self):
+        """
+        Дописать накопленные записи в JSON lines файл. Вернет кол-во записей
+        """
+        with self.mutex:
+            records_list, self.records_list = self.records_list, []
+
+        if not records_list:
+            return 0
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with FileLock(self.path + '.lock'):
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records_list)
+        except OSError as e:
+            logger.error("Не удалось записать метрики {}, e = {}".format(self.path, e))
+
+        return len(records_list)
+
+    def get_summary(self, records_list=None):
+        """
+        Сводная таблица по методам: кол-во вызовов, суммарное, среднее, p95 и максимальное время, доля от времени
+        прохода. Вложенные методы входят и в свою строку, и во время внешних, поэтому доли в сумме больше 100%
+        """
+        if records_list is None:
+            with self.mutex:
+                records_list = list(self.records_list)
+
+        durations_dict = {}
+        for record in records_list:
+            durations_dict.setdefault(record['span'], []).append(record['sec'])
+
+        total_sec = max(time.time() - self.time_start, 1e-9)
+        num_pages = len({record['page'] for record in records_list})
+        line_list = ["{}: метрики прохода, страниц - {}, время - {:.1f} сек".format(self.shop, num_pages, total_sec),
+                     "{:<26} {:>6} {:>9} {:>9} {:>9} {:>9} {:>6}".format(
+                         "span", "calls", "total, s", "avg, ms", "p95, ms", "max, ms", "share")]
+        for name, durations_list in sorted(durations_dict.items(), key=lambda item: -sum(item[1])):
+            durations_list.sort()
+            span_sec = sum(durations_list)
+            line_list.append("{:<26} {:>6} {:>9.2f} {:>9.1f} {:>9.1f} {:>9.1f} {:>5.1f}%".format(
+                name, len(durations_list), span_sec, span_sec / len(durations_list) * 1000,
+                get_percentile(durations_list, 95) * 1000, durations_list[-1] * 1000, span_sec / total_sec * 100))
+
+        return '\n'.join(line_list)
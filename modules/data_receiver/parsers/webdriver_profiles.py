@@ -0,0 +1,132 @@
+import os
+import threading
+
+import selenium.common.exceptions as se
+from selenium import webdriver
+
+import modules.common.helper as h
+from modules.data_receiver.parsers import lean_profile
+
+logger = h.logging.getLogger('WebDriverProfiles')
+
+
+def create_driver(is_proxy=False, profile_path=None, shop=None, blocked_set=None, is_report=None, domain=None):
+    """
+    Запуск нового headless Chrome. С @profile_path браузер использует постоянный профиль (cookies, выбранный
+    город, кэш сохраняются между запусками). Для магазина @shop применяется облегченный профиль (lean_profile),
+    @blocked_set и @is_report позволяют задать его настройки в обход config.ini. Proxy выбирается из пула proxy
+    для домена @domain и сохраняется в атрибуте браузера proxy_address.
+    Вернет None, если браузер не запустился
+    """
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+
+    # options.add_argument("window-size=1920,1080")
+    # options.add_argument("--disable-notifications")
+    proxy = h.get_proxy(domain) if is_proxy else None
+    if proxy:
+        options.add_argument("--proxy-server=%s" % proxy)
+
+    if profile_path:
+        os.makedirs(profile_path, exist_ok=True)
+        options.add_argument("--user-data-dir=%s" % profile_path)
+
+    # Облегченный профиль: блокировка картинок, видео, шрифтов и счетчиков
+    if blocked_set is None:
+        blocked_set = lean_profile.get_blocked_categories(shop)
+    if is_report is None:
+        is_report = lean_profile.is_report_enabled()
+    capabilities = lean_profile.apply_options(options, blocked_set, is_report)
+
+    try:
+        driver = webdriver.Chrome(executable_path=h.WD_PATH, options=options, desired_capabilities=capabilities)
+    except se.WebDriverException as e:
+        logger.error("НЕ СМОГ ИНИЦИАЛИЗИРОВАТЬ WEBDRIVER, {}".format(e))
+        return None
+
+    if blocked_set and lean_profile.apply_driver(driver, blocked_set):
+        logger.info("{}: облегченный профиль, блокируются {}".format(shop, ', '.join(sorted(blocked_set))))
+
+    driver.proxy_address = proxy
+    return driver
+
+
+class ProfileSlots:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Постоянные профили браузеров магазинов (слоты) в h.WEBDRIVER_PROFILES_PATH: cookies с выбранным городом и кэш
+    браузера сохраняются между запусками. Браузер запускается в свободном слоте своего магазина, поэтому
+    одновременно работающие браузеры одного магазина (fanout_drivers, повторная попытка прохода) получают разные
+    профили - Chrome не открывает один профиль в двух браузерах.
+    Запущенные браузеры не переиспользуются: runner делает один проход по каталогам и завершается, поэтому
+    между запусками сохраняется только профиль.
+
+    :method borrow: Запустить браузер магазина в свободном слоте профиля
+    :method release: Закрыть браузер и освободить слот
+    """
+    def __init__(self):
+        self.mutex = threading.Lock()
+        # (shop, is_proxy) -> {slot, ...} - слоты профилей, занятые запущенными браузерами
+        self.busy_slots_dict = {}
+        # id(driver) -> (shop, is_proxy, slot) - запущенные браузеры
+        self.borrowed_dict = {}
+
+    def borrow(self, shop, is_proxy=False, domain=None):
+        """
+        Запуск браузера магазина @shop в свободном слоте профиля. Вернет None, если браузер не запустился
+        """
+        key = (shop, is_proxy)
+        with self.mutex:
+            busy_slots_set = self.busy_slots_dict.setdefault(key, set())
+            slot = 0
+            while slot in busy_slots_set:
+                slot += 1
+            busy_slots_set.add(slot)
+
+        profile_path = os.path.join(h.WEBDRIVER_PROFILES_PATH, "{}{}_{}".format(
+            shop, '_proxy' if is_proxy else '', slot))
+        driver = create_driver(is_proxy, profile_path, shop, domain=domain)
+
+        with self.mutex:
+            if not driver:
+                busy_slots_set.discard(slot)
+                return None
+
+            self.borrowed_dict[id(driver)] = (shop, is_proxy, slot)
+
+        logger.info("{}: браузер запущен в слоте профиля {}".format(shop, slot))
+        return driver
+
+    def release(self, driver):
+        """
+        Закрытие браузера. Слот профиля свободен, только когда браузер закрыт
+        """
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error("Ошибка при закрытии браузера, {}".format(e))
+
+        with self.mutex:
+            info = self.borrowed_dict.pop(id(driver), None)
+            if info:
+                shop, is_proxy, slot = info
+                self.busy_slots_dict[(shop, is_proxy)].discard(slot)
+
+
+# Слоты профилей процесса, создаются при первом обращении
+PROFILE_SLOTS = None
+PROFILE_SLOTS_MUTEX = threading.Lock()
+
+
+def get_profile_slots():
+    """
+    Слоты профилей текущего процесса. None, если постоянные профили выключены (webdriver_profiles = False)
+    """
+    global PROFILE_SLOTS
+
+    with PROFILE_SLOTS_MUTEX:
+        if PROFILE_SLOTS is None:
+            PROFILE_SLOTS = ProfileSlots() if h.WEBDRIVER_PROFILES else False
+
+    return PROFILE_SLOTS or None
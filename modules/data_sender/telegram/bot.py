@@ -154,18 +154,24 @@ class Bot(TelegramSender):
         Разбор списка продуктов, группировка по цветам, отправка в телеграм
         """
         versions_list = []
+        pc_product_list = h.IndexedNamedTupleList(self.pc_product_list)
+        # id элементов, уже попавших в какую-либо группу (вместо удаления из списка)
+        taken_set = set()
         # Проход по всему списку, группировка элементов по версии и цвету, пост группы
-        while self.pc_product_list:
-            # Взятие группы комплектации с разными цветами
-            item = self.pc_product_list[0]
-            one_version_list = h.find_in_namedtuple_list(self.pc_product_list,
-                                                         brand_name=item.brand_name, model_name=item.model_name,
-                                                         ram=item.ram, rom=item.rom, price=item.price)
+        for item in pc_product_list:
+            if id(item) in taken_set:
+                continue
+
+            # Взятие группы комплектации с разными цветами из еще не взятых элементов
+            one_version_list = [group_item for group_item in h.find_in_namedtuple_list(
+                pc_product_list, brand_name=item.brand_name, model_name=item.model_name,
+                ram=item.ram, rom=item.rom, price=item.price) if id(group_item) not in taken_set]
+            taken_set.update(id(group_item) for group_item in one_version_list)
+
             # Составление списка комплектаций
             versions_list.append(one_version_list)
-            # Удаление из основного списка взятой группы one_version_list
-            for item in one_version_list:
-                self.pc_product_list.remove(item)
+
+        self.pc_product_list = []
 
         # Отправка постов в телеграм. Звук только у последних 2-ух
         for i in range(len(versions_list)):
@@ -273,6 +279,10 @@ class Bot(TelegramSender):
         """
         self.db.connect_or_create("parser", "postgres", "1990", "127.0.0.1", "5432")
 
+        # Поиск по списку товаров в наличии идет для каждого поста, поэтому он хранится с индексами
+        if not isinstance(pr_product_in_stock_list, h.IndexedNamedTupleList):
+            pr_product_in_stock_list = h.IndexedNamedTupleList(pr_product_in_stock_list)
+
         # Проход по всем актуальным постам, их проверка на полную, частичную актуальность и неактуальность
         new_posts_in_telegram_list = []
         for item in self.posts_in_telegram_list:
@@ -30,6 +30,17 @@ class DataValidator:
 
         return False
 
+    @staticmethod
+    def iter_validated(chunks_iter):
+        """
+        Потоковая валидация: генератор проверенных списков для каждого списка из @chunks_iter (например, товаров
+        одной страницы каталога). Пустые после проверки списки пропускаются
+        """
+        for chunk in chunks_iter:
+            result = [item for item in chunk if DataValidator.validation_item(item)]
+            if result:
+                yield result
+
     def __validation_list(self):
         """
         ОБЯЗАТЕЛЬНЫЙ МЕТОД
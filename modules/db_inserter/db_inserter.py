@@ -2,9 +2,23 @@ import configparser
 
 from modules.common.db_wrapper import DataBase
 from modules.common import sql_req as sr, helper as h
+from modules.db_inserter.id_cache import IdCache
 
 logger = h.logging.getLogger('AddingToDB')
 
+# Основная база данных проекта
+MAIN_DB_NAME = "parser"
+
+# Максимальная длина строковых полей товара - как у столбцов таблиц БД (sql_req)
+FIELD_MAX_LEN_DICT = {
+    'brand_name': 20,
+    'model_name': 100,
+    'img_url': 200,
+    'url': 200,
+    'product_code': 20,
+    'color': 50,
+}
+
 
 # Функция, которая вернет true, если хоть у одного поля поврежденные данные
 def check_item_on_errors(item):
@@ -28,15 +42,22 @@ class DbInserter:
     подготавливает список выгодных товаров для отправки в телеграм бот
     """
 
-    def __init__(self, parse_result_list=None):
+    def __init__(self, parse_result_list=None, db_name=MAIN_DB_NAME):
         self.db = DataBase()
+        self.db_name = db_name
         self.config = configparser.ConfigParser()
         self.config.read('config.ini', encoding="utf-8")
         self.best_shop_for_img_url = (self.config.defaults()['best_shops_for_img_url']).lower().split(', ')
+        self.is_bulk_insert = self.config.getboolean('DEFAULT', 'db_bulk_insert', fallback=True)
+        # Кэш id: при поштучном добавлении заменяет поиск id в БД, при пакетном заполняет id товаров пакета,
+        # и запросы поиска id выполняются только для остальных. Снимок кэша id относится к основной базе
+        self.id_cache = IdCache(self.db, h.ID_CACHE_SNAPSHOT_PATH
+                                if self.config.getboolean('DEFAULT', 'db_id_cache_snapshot', fallback=False)
+                                and db_name == MAIN_DB_NAME else None)
         self.pr_parse_result_list = parse_result_list
         # Базовая переменная, в которую необходимо помещать те позиции, которые были добавлены в базу и подходят для
         # следующего этапа - проверки перед публикацией
-        self.pr_price_change_list = []
+        self.pr_price_change_list = h.IndexedNamedTupleList()
 
     def __insert_product_in_products_table(self, id_category_name, brand_name, model_name, total_rating):
         """
@@ -44,8 +65,10 @@ class DbInserter:
         """
         id_product = self.db.execute_read_query(sr.insert_into_products_table_query,
                                                 [(id_category_name, brand_name, model_name, total_rating), ])
+        id_product = id_product[0][0] if id_product else None
 
-        return id_product[0][0] if id_product else None
+        self.id_cache.add_product(id_product, brand_name, model_name)
+        return id_product
 
     def __insert_version_in_versions_phones_table(self, id_product, ram, rom, img_url):
         """
@@ -53,8 +76,10 @@ class DbInserter:
         """
         id_ver_phone = self.db.execute_read_query(sr.insert_into_versions_phones_table_query,
                                                   [(id_product, ram, rom, img_url), ])
+        id_ver_phone = id_ver_phone[0][0] if id_ver_phone else None
 
-        return id_ver_phone[0][0] if id_ver_phone else None
+        self.id_cache.add_version(id_ver_phone, id_product, ram, rom)
+        return id_ver_phone
 
     def __insert_shop_in_shops_phones_table(self, id_shop_name, id_product, id_ver_phone, url, product_code, var_color,
                                             local_rating, num_local_rating, bonus_rubles=0):
@@ -65,15 +90,17 @@ class DbInserter:
                                                    [(id_shop_name, id_product, id_ver_phone, url, product_code,
                                                      var_color,
                                                      local_rating, num_local_rating, bonus_rubles), ])
+        id_shop_phone = id_shop_phone[0][0] if id_shop_phone else None
 
-        return id_shop_phone[0][0] if id_shop_phone else None
+        self.id_cache.add_shop(id_shop_phone, id_ver_phone, id_shop_name, url)
+        return id_shop_phone
 
     def __insert_price_in_prices_phones_table(self, id_shop_name, id_product, id_shop_phone, price, date_time='now()'):
         """
         Добавление цены в таблицу prices_phones_table
         """
-        self.db.execute_query(sr.insert_into_prices_phones_table_query,
-                              [(id_shop_name, id_product, id_shop_phone, price, date_time), ])
+        return self.db.execute_query(sr.insert_into_prices_phones_table_query,
+                                     [(id_shop_name, id_product, id_shop_phone, price, date_time), ])
 
     def __add_product_to_bd(self, category_name, shop_name, brand_name, model_name, var_rom, var_ram, var_color,
                             img_url, url, product_code, local_rating, num_rating, price, bonus_rubles=0):
@@ -97,26 +124,21 @@ class DbInserter:
             logger.error("ERROR get category_name or shop_name = {}".format(e))
             return 'error'
 
-        id_product = self.db.execute_read_query(sr.select_id_product_query, (brand_name, model_name))
+        id_product = self.id_cache.get_id_product(brand_name, model_name)
         # + Продукт присутствует в #products_table
         if id_product:
 
             logger.info("---id_prod = {}".format(id_product))
-            id_product = id_product[0][0]
-            id_ver_phone = self.db.execute_read_query(sr.select_id_ver_phone_query,
-                                                      (id_product, var_ram, var_rom))
+            id_ver_phone = self.id_cache.get_id_ver_phone(id_product, var_ram, var_rom)
             # ++ Комплектация присутствует в #version_phones_table
             if id_ver_phone:
                 logger.info("---id_ver_phone = {}".format(id_ver_phone))
-                id_ver_phone = id_ver_phone[0][0]
-                id_shop_phone = self.db.execute_read_query(sr.select_id_shop_phone_query,
-                                                           (id_ver_phone, id_shop_name, url))
+                id_shop_phone = self.id_cache.get_id_shop_phone(id_ver_phone, id_shop_name, url)
 
                 # +++ Данную комплектацию можно купить в этом магазине в #shop_phones_table
                 if id_shop_phone:
                     logger.info("---id_shop_phone = {}".format(id_shop_phone))
-                    id_shop_phone = id_shop_phone[0][0]
-                    price_phone = self.db.execute_read_query(sr.select_price_in_price_phone_query, (id_shop_phone,))
+                    price_phone = self.db.execute_read_query(sr.select_latest_price_query, (id_shop_phone,))
 
                     if not price_phone:
                         logger.error("Нет цены, id_prod = {}, "
@@ -124,19 +146,21 @@ class DbInserter:
                         return 'error'
 
                     # ++++ Цена данной комплектации в данном магазине не изменилась - ничего не делаем
-                    if price_phone[-1][0] == price:
+                    if price_phone[0][0] == price:
                         logger.info("---price_phone = {}".format(price_phone))
                         # Если ничего не изменилось - обновить дату у цены
                         logger.info("NO CHANGE, IGNORE; "
                                     "id_prod = {}, id_ver = {}, id_shop = {}, price = {}".format(id_product,
                                                                                                  id_ver_phone,
                                                                                                  id_shop_phone,
-                                                                                                 price_phone[-1][0]))
+                                                                                                 price_phone[0][0]))
 
                     # ---- Цена данной комплектации в данном магазине изменилась - добавляем в список цен
                     else:
                         logger.info("Новая цена на эту комплектацию в этом магазине, добавляю цену")
-                        self.__insert_price_in_prices_phones_table(id_shop_name, id_product, id_shop_phone, price)
+                        if not self.__insert_price_in_prices_phones_table(id_shop_name, id_product, id_shop_phone,
+                                                                          price):
+                            return 'error'
                         return 'price'
 
                 # --- Данную комплектацию нельзя купить в этом магазине, магазин отсутствует в #shop_phones_table
@@ -178,40 +202,131 @@ class DbInserter:
 
         return 'error'
 
+    def __add_item_to_bd(self, item):
+        """
+        Поштучное добавление одного товара @item в БД
+        """
+        return self.__add_product_to_bd(
+            category_name=item.category,
+            shop_name=item.shop,
+            brand_name=item.brand_name,
+            model_name=item.model_name,
+            var_color=item.color,
+            var_ram=item.ram,
+            var_rom=item.rom,
+            price=item.price,
+            img_url=item.img_url,
+            url=item.url,
+            product_code=item.product_code,
+            local_rating=item.rating,
+            num_rating=item.num_rating)
+
+    def __add_input_list_to_db_bulk(self, pr_product_list):
+        """
+        Пакетное добавление всех товаров в базу: весь список загружается во временную таблицу через COPY, после
+        чего продукты, комплектации, магазины и цены добавляются несколькими запросами над всем набором сразу.
+        Известные id продуктов, комплектаций и магазинов берутся из кэша id, в БД ищутся только остальные.
+        Товары, которые не поместятся в столбцы таблиц, в пакет не попадают. Если пакет все равно не добавился,
+        товары добавляются поштучно, чтобы ошибка в одном товаре не отменяла добавление остальных.
+        Возвращает список статусов ('product', 'shop', 'version', 'price', 'error' или None - без изменений)
+        в порядке @pr_product_list
+        """
+        status_list = ['error'] * len(pr_product_list)
+        if not self.db.connection:
+            logger.warning("Can't execute query - no connection")
+            return status_list
+
+        # Подготовка строк для COPY, idx - позиция товара во входном списке. Id, которых нет в кэше, - NULL
+        rows = []
+        for idx, item in enumerate(pr_product_list):
+            try:
+                id_category_name = h.CATEGORIES_NAME_LIST.index((item.category,)) + 1
+                id_shop_name = h.SHOPS_NAME_LIST.index((item.shop,)) + 1
+            except ValueError as e:
+                logger.error("ERROR get category_name or shop_name = {}".format(e))
+                continue
+
+            too_long_field_list = [field for field, max_len in FIELD_MAX_LEN_DICT.items()
+                                   if len(getattr(item, field)) > max_len]
+            if too_long_field_list:
+                logger.warning("Продукт {} {} в магазине {}: слишком длинные поля {}, SKIP".format(
+                    item.brand_name, item.model_name, item.shop, ', '.join(too_long_field_list)))
+                continue
+
+            rows.append((idx, id_category_name, id_shop_name, item.brand_name, item.model_name, item.ram, item.rom,
+                         item.img_url, item.url, item.product_code, item.color, item.rating, item.num_rating, 0,
+                         item.price) + self.id_cache.find_ids(item.brand_name, item.model_name, item.ram, item.rom,
+                                                              id_shop_name, item.url))
+
+        if not rows:
+            return status_list
+
+        query_list = [
+            sr.bulk_insert_products_query,
+            sr.bulk_select_id_product_query,
+            sr.bulk_insert_versions_query,
+            sr.bulk_select_id_ver_phone_query,
+            sr.bulk_insert_shops_phones_query,
+            sr.bulk_select_id_shop_phone_query,
+            sr.bulk_select_last_price_query,
+            sr.bulk_classify_query,
+            sr.bulk_insert_prices_query,
+        ]
+
+        self.db.begin_transaction()
+        result = self.db.execute_query(sr.create_tmp_parse_result_table_query) and \
+            self.db.execute_query(sr.truncate_tmp_parse_result_table_query) and \
+            self.db.execute_copy_query(sr.copy_into_tmp_parse_result_table_query, rows) and \
+            all(self.db.execute_query(query) for query in query_list) and \
+            self.db.execute_read_query(sr.bulk_select_status_query)
+
+        if not result or not self.db.commit_transaction():
+            logger.error("Ошибка пакетного добавления в БД, откат транзакции и поштучное добавление")
+            self.db.rollback_transaction()
+            for row in rows:
+                status_list[row[0]] = self.__add_item_to_bd(pr_product_list[row[0]])
+            return status_list
+
+        # Id новых записей пакета - в кэш, следующие пакеты найдут их без запросов
+        for idx, status, id_product, id_ver_phone, id_shop_phone in result:
+            status_list[idx] = status
+            item = pr_product_list[idx]
+            self.id_cache.add_product(id_product, item.brand_name, item.model_name)
+            self.id_cache.add_version(id_ver_phone, id_product, item.ram, item.rom)
+            self.id_cache.add_shop(id_shop_phone, id_ver_phone, h.SHOPS_NAME_LIST.index((item.shop,)) + 1, item.url)
+
+        logger.info("Пакетное добавление: {} товаров, новых цен - {}".format(
+            len(rows), sum(1 for status in status_list if status == 'price')))
+
+        return status_list
+
     def __add_input_list_to_db(self, pr_product_list=None):
         """
         ОБЯЗАТЕЛЬНЫЙ МЕТОД
         Добавление всех товаров в базу
         """
-        if not pr_product_list or not self.pr_parse_result_list:
+        pr_product_list = pr_product_list or self.pr_parse_result_list
+        if not pr_product_list:
             logger.warning('pr_product_list is empty')
             return
 
-        pr_product_list = pr_product_list or self.pr_parse_result_list
+        # Проверка элементов на некорректные поля
+        valid_product_list = []
         for item in pr_product_list:
-
-            # Проверка элемента на некорректные поля
             if not check_item_on_errors(item):
                 logger.warning("Продукт {} {} с артиклом {} в магазине {} содержит 'None', SKIP".format(
                     item.brand_name, item.model_name, item.product_code, item.shop))
                 continue
 
-            # Сохранение данных в базу. Если цена изменилась - вернет предыдущую
-            resp = self.__add_product_to_bd(
-                category_name=item.category,
-                shop_name=item.shop,
-                brand_name=item.brand_name,
-                model_name=item.model_name,
-                var_color=item.color,
-                var_ram=item.ram,
-                var_rom=item.rom,
-                price=item.price,
-                img_url=item.img_url,
-                url=item.url,
-                product_code=item.product_code,
-                local_rating=item.rating,
-                num_rating=item.num_rating)
+            valid_product_list.append(item)
+
+        if self.is_bulk_insert:
+            resp_list = self.__add_input_list_to_db_bulk(valid_product_list)
+        else:
+            # Сохранение данных в базу по одному товару
+            resp_list = [self.__add_item_to_bd(item) for item in valid_product_list]
 
+        for item, resp in zip(valid_product_list, resp_list):
             # Если при добавлении товара в базу была изменена только цена -
             # добавляем в очередь на проверку выгоды
             if resp == 'price' and not h.find_in_namedtuple_list(self.pr_price_change_list, brand_name=item.brand_name,
@@ -225,8 +340,39 @@ class DbInserter:
         ОБЯЗАТЕЛЬНЫЙ МЕТОД
         Запуск
         """
-        self.db.connect_or_create("parser", "postgres", "1990", "127.0.0.1", "5432")
+        if not self.db.connect_or_create(self.db_name, "postgres", "1990", "127.0.0.1", "5432"):
+            logger.error("Нет соединения с базой '{}', товары не добавлены".format(self.db_name))
+            return self.pr_price_change_list
+
+        self.id_cache.warm_up()
         self.__add_input_list_to_db()
+        self.id_cache.save_snapshot()
+        self.db.disconnect()
+        return self.pr_price_change_list
+
+    def run_stream(self, chunks_iter):
+        """
+        Потоковый запуск: товары добавляются в базу порциями по мере поступления из @chunks_iter, соединение с БД
+        и кэш id общие для всех порций. Вернет тот же список товаров с измененной ценой, что и run
+        """
+        if not self.db.connect_or_create(self.db_name, "postgres", "1990", "127.0.0.1", "5432"):
+            logger.error("Нет соединения с базой '{}', товары не добавлены".format(self.db_name))
+            # Порции все равно выбираются до конца - вместе с ними проходит валидация товаров
+            for _ in chunks_iter:
+                pass
+            return self.pr_price_change_list
+
+        self.id_cache.warm_up()
+
+        num_chunks = 0
+        for chunk in chunks_iter:
+            self.__add_input_list_to_db(chunk)
+            num_chunks += 1
+
+        logger.info("Потоковое добавление: порций - {}, товаров с новой ценой - {}".format(
+            num_chunks, len(self.pr_price_change_list)))
+
+        self.id_cache.save_snapshot()
         self.db.disconnect()
         return self.pr_price_change_list
 
@@ -0,0 +1,200 @@
+import os
+import pickle
+
+from modules.common import sql_req as sr, helper as h
+
+logger = h.logging.getLogger('IdCache')
+
+
+class IdCache:
+    """
+    ВСПОМОГАТЕЛЬНЫЙ КЛАСС
+    Кэш id продуктов, комплектаций и магазинов для DbInserter. Заполняется одним запросом на таблицу при запуске,
+    дополняется при каждом добавлении в БД и позволяет не искать id в базе для каждого товара. При пакетном
+    добавлении id из кэша сразу записываются в пакет (find_ids), и в БД ищутся только отсутствующие в кэше.
+
+    При промахе id ищется в БД старым запросом, поэтому неполный кэш не приводит к дубликатам в таблицах.
+
+    Снимок кэша можно сохранить на диск: при следующем запуске он используется без прогрева, если количество
+    записей и максимальные id в таблицах не изменились.
+
+    :method warm_up: Заполнение кэша из снимка на диске или из БД
+    :method save_snapshot: Сохранение снимка кэша на диск
+    :method get_id_product: Поиск id продукта по (brand_name, model_name)
+    :method get_id_ver_phone: Поиск id комплектации по (id_product, ram, rom)
+    :method get_id_shop_phone: Поиск id магазина по (id_ver_phone, id_shop_name, url_product)
+    :method find_ids: Поиск id продукта, комплектации и магазина товара только в кэше
+    :method add_product, add_version, add_shop: Добавление новых id в кэш
+    """
+    def __init__(self, db, snapshot_path=None):
+        self.db = db
+        self.snapshot_path = snapshot_path
+        # (brand_name, model_name) -> id_product
+        self.products_dict = {}
+        # (id_product, ram, rom) -> id_ver_phone
+        self.versions_dict = {}
+        # (id_ver_phone, id_shop_name, url_product) -> id_shop_phone
+        self.shops_dict = {}
+        # Состояние таблиц, для которого актуален кэш
+        self.tables_state = None
+
+    def __load_snapshot(self, tables_state):
+        """
+        Чтение снимка кэша с диска. Снимок используется, только если состояние таблиц не изменилось
+        """
+        if not self.snapshot_path or not os.path.isfile(self.snapshot_path):
+            return False
+
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            logger.error("Не удалось прочитать снимок кэша id, path = {}, e = {}".format(self.snapshot_path, e))
+            return False
+
+        if snapshot.get('tables_state') != tables_state:
+            logger.info("Снимок кэша id устарел, загружаю из БД")
+            return False
+
+        self.products_dict = snapshot['products']
+        self.versions_dict = snapshot['versions']
+        self.shops_dict = snapshot['shops']
+        return True
+
+    def __load_from_db(self):
+        """
+        Заполнение кэша из БД - по одному запросу на каждую таблицу
+        """
+        self.products_dict.clear()
+        self.versions_dict.clear()
+        self.shops_dict.clear()
+
+        # Записи отсортированы по id, при дубликатах в кэше остается запись с наименьшим id
+        for id_product, brand_name, model_name in self.db.execute_read_query(sr.select_all_products_query) or []:
+            self.products_dict.setdefault((brand_name, model_name), id_product)
+
+        for id_ver_phone, id_product, ram, rom in self.db.execute_read_query(sr.select_all_versions_query) or []:
+            self.versions_dict.setdefault((id_product, ram, rom), id_ver_phone)
+
+        for id_shop_phone, id_ver_phone, id_shop_name, url_product in \
+                self.db.execute_read_query(sr.select_all_shops_phones_query) or []:
+            self.shops_dict.setdefault((id_ver_phone, id_shop_name, url_product), id_shop_phone)
+
+    def warm_up(self):
+        """
+        ОБЯЗАТЕЛЬНЫЙ МЕТОД
+        Заполнение кэша из снимка на диске или из БД
+        """
+        tables_state = self.db.execute_read_query(sr.select_id_tables_state_query)
+        self.tables_state = tuple(tables_state[0]) if tables_state else None
+
+        if self.tables_state and self.__load_snapshot(self.tables_state):
+            logger.info("Кэш id загружен из снимка")
+        else:
+            self.__load_from_db()
+            logger.info("Кэш id загружен из БД")
+
+        logger.info("Кэш id: продуктов - {}, комплектаций - {}, магазинов - {}".format(
+            len(self.products_dict), len(self.versions_dict), len(self.shops_dict)))
+
+    def save_snapshot(self):
+        """
+        Сохранение снимка кэша на диск вместе с текущим состоянием таблиц
+        """
+        if not self.snapshot_path:
+            return
+
+        tables_state = self.db.execute_read_query(sr.select_id_tables_state_query)
+        if not tables_state:
+            return
+
+        try:
+            with open(self.snapshot_path, 'wb') as f:
+                pickle.dump({
+                    'tables_state': tuple(tables_state[0]),
+                    'products': self.products_dict,
+                    'versions': self.versions_dict,
+                    'shops': self.shops_dict,
+                }, f)
+        except Exception as e:
+            logger.error("Не удалось сохранить снимок кэша id, path = {}, e = {}".format(self.snapshot_path, e))
+
+    def __select_id(self, query, variables):
+        """
+        Поиск id в БД при промахе кэша
+        """
+        result = self.db.execute_read_query(query, variables)
+        return result[0][0] if result else None
+
+    def get_id_product(self, brand_name, model_name):
+        """
+        Поиск id продукта
+        """
+        id_product = self.products_dict.get((brand_name, model_name))
+        if id_product is None:
+            id_product = self.__select_id(sr.select_id_product_query, (brand_name, model_name))
+            self.add_product(id_product, brand_name, model_name)
+
+        return id_product
+
+    def get_id_ver_phone(self, id_product, ram, rom):
+        """
+        Поиск id комплектации. Как и в select_id_ver_phone_query, комплектация с RAM = 0 подходит под любой RAM
+        """
+        id_ver_phone = self.versions_dict.get((id_product, ram, rom))
+        if id_ver_phone is None:
+            id_ver_phone = self.versions_dict.get((id_product, 0, rom))
+        if id_ver_phone is None:
+            id_ver_phone = self.__select_id(sr.select_id_ver_phone_query, (id_product, ram, rom))
+            self.add_version(id_ver_phone, id_product, ram, rom)
+
+        return id_ver_phone
+
+    def get_id_shop_phone(self, id_ver_phone, id_shop_name, url_product):
+        """
+        Поиск id магазина, в котором продается комплектация
+        """
+        id_shop_phone = self.shops_dict.get((id_ver_phone, id_shop_name, url_product))
+        if id_shop_phone is None:
+            id_shop_phone = self.__select_id(sr.select_id_shop_phone_query, (id_ver_phone, id_shop_name, url_product))
+            self.add_shop(id_shop_phone, id_ver_phone, id_shop_name, url_product)
+
+        return id_shop_phone
+
+    def find_ids(self, brand_name, model_name, ram, rom, id_shop_name, url_product):
+        """
+        Поиск id продукта, комплектации и магазина товара только в кэше, без запросов к БД.
+        Вернет (id_product, id_ver_phone, id_shop_phone), None - нет в кэше
+        """
+        id_product = self.products_dict.get((brand_name, model_name))
+        if id_product is None:
+            return None, None, None
+
+        id_ver_phone = self.versions_dict.get((id_product, ram, rom))
+        if id_ver_phone is None:
+            id_ver_phone = self.versions_dict.get((id_product, 0, rom))
+        if id_ver_phone is None:
+            return id_product, None, None
+
+        return id_product, id_ver_phone, self.shops_dict.get((id_ver_phone, id_shop_name, url_product))
+
+    def add_product(self, id_product, brand_name, model_name):
+        """
+        Добавление нового продукта в кэш
+        """
+        if id_product is not None:
+            self.products_dict.setdefault((brand_name, model_name), id_product)
+
+    def add_version(self, id_ver_phone, id_product, ram, rom):
+        """
+        Добавление новой комплектации в кэш
+        """
+        if id_ver_phone is not None:
+            self.versions_dict.setdefault((id_product, ram, rom), id_ver_phone)
+
+    def add_shop(self, id_shop_phone, id_ver_phone, id_shop_name, url_product):
+        """
+        Добавление нового магазина в кэш
+        """
+        if id_shop_phone is not None:
+            self.shops_dict.setdefault((id_ver_phone, id_shop_name, url_product), id_shop_phone)
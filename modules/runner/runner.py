@@ -1,4 +1,7 @@
 from time import time
+import queue
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import modules.runner.runner_helper as rh
 import modules.common.helper as h
@@ -8,6 +11,8 @@ from modules.data_receiver.parsers.mvideo_parse import MVideoParse
 from modules.data_receiver.parsers.mts_parse import MTSParse
 from modules.data_receiver.parsers.eldorado_parse import EldoradoParse
 from modules.data_receiver.parsers.citilink_parse import CitilinkParse
+from modules.data_receiver.parsers.http_parse import HttpParse
+from modules.common import proxy_pool
 from modules.data_validator.data_validator import DataValidator
 from modules.data_checker.data_checker import DataChecker
 from modules.db_inserter.db_inserter import DbInserter
@@ -15,6 +20,57 @@ from modules.data_sender.telegram.bot import Bot as DataSender
 
 logger = h.logging.getLogger('Runner')
 
+# Список всех парсеров этапа получения данных: класс парсера, название магазина, url каталога
+PARSERS_LIST = [
+    (MVideoParse, "Мвидео", "https://www.mvideo.ru/smartfony-i-svyaz-10/smartfony-205?sort=price_asc"),
+    (MTSParse, "МТС", "https://shop.mts.ru/catalog/smartfony/"),
+    (DNSParse, "ДНС", "https://www.dns-shop.ru/catalog/17a8a01d16404e77/smartfony/"),
+    (CitilinkParse, "Ситилинк", "https://www.citilink.ru/catalog/mobile/smartfony/"),
+    (EldoradoParse, "Эльдорадо", "https://www.eldorado.ru/c/smartfony/"),
+]
+
+
+def run_parser(parser_class, url, page_result_handler=None):
+    """
+    Запуск одного парсера. Вынесено на уровень модуля, чтобы функцию можно было передать в пул процессов.
+    При receiver_backend = http магазины, отдающие каталог без браузера, загружаются через HttpParse,
+    при receiver_backend = replay разбираются страницы последнего прохода из кэша страниц без браузера.
+    Прерванный падением браузера проход продолжается с контрольной точки (crawl_checkpoint).
+    @page_result_handler получает товары каждой страницы сразу после ее разбора (потоковый конвейер)
+    """
+    if rh.RECEIVER_BACKEND == 'replay':
+        parser = parser_class(with_browser=False)
+        parser.page_result_handler = page_result_handler
+        return parser.run_catalog_replay()
+
+    if rh.RECEIVER_BACKEND == 'http':
+        http_parser = HttpParse(parser_class)
+        if http_parser.is_supported:
+            http_parser.parser.page_result_handler = page_result_handler
+            return http_parser.run_catalog(url=url)
+
+    parser = parser_class()
+    parser.page_result_handler = page_result_handler
+    result = parser.run_catalog(url=url)
+
+    # Браузер упал посреди прохода - проход продолжается с контрольной точки в новом браузере
+    for num_retry in range(parser.crawl_max_retries):
+        if not parser.is_crawl_interrupted or not parser.checkpoint:
+            break
+
+        logger.warning("{}: проход прерван, продолжение с контрольной точки, попытка {}".format(
+            parser.shop, num_retry + 1))
+        parser = parser_class()
+        parser.page_result_handler = page_result_handler
+        parser.is_checkpoint_handled = True
+        result = parser.run_catalog(url=url) or result
+
+    # В дочернем процессе статистика proxy сохраняется сразу, иначе она пропадет вместе с процессом
+    if multiprocessing.parent_process() is not None:
+        proxy_pool.save_pool()
+
+    return result
+
 
 class Runner:
     def __init__(self):
@@ -34,12 +90,10 @@ class Runner:
         h.del_old_logs()
         rh.load_data()
 
-    def __run_one_parser(self, parser_class, url, name=""):
+    def __add_parser_result(self, result, name=""):
         """
-        Запустить один парсер
+        Добавить результат одного парсера к общему списку. Если парсер упал - увеличить счетчик падений
         """
-        parser = parser_class()
-        result = parser.run_catalog(url=url)
         # result = rh.load_result_from_csv("mts.csv")
         if not result:
             rh.inc_count_crash(name)
@@ -47,28 +101,57 @@ class Runner:
 
         self.data_receiver_result_list.extend(result)
 
-    def receiver_stage(self):
+    def __run_one_parser(self, parser_class, url, name="", page_result_handler=None):
+        """
+        Запустить один парсер
+        """
+        self.__add_parser_result(run_parser(parser_class, url, page_result_handler), name)
+
+    def __run_all_parsers_concurrently(self, page_result_handler=None):
+        """
+        Запуск всех парсеров одновременно в пуле потоков или процессов. Каждый парсер работает со своим
+        браузером, поэтому общее время этапа примерно равно времени самого медленного магазина.
+        Результаты объединяются в порядке PARSERS_LIST, счетчик падений изменяется только в основном потоке.
+        Обработчик страниц нельзя передать в другой процесс, поэтому в потоковом режиме используется пул потоков
+        """
+        if rh.RECEIVER_POOL_TYPE == 'process' and page_result_handler:
+            logger.warning("Потоковый конвейер не поддерживает пул процессов, парсеры запущены в пуле потоков")
+
+        if rh.RECEIVER_POOL_TYPE == 'process' and not page_result_handler:
+            # В дочерних процессах необходимо заново загрузить словари и конфиг
+            executor = ProcessPoolExecutor(max_workers=rh.RECEIVER_MAX_WORKERS, initializer=rh.load_data)
+        else:
+            executor = ThreadPoolExecutor(max_workers=rh.RECEIVER_MAX_WORKERS)
+
+        with executor:
+            futures_list = [(name, executor.submit(run_parser, parser_class, url, page_result_handler))
+                            for parser_class, name, url in PARSERS_LIST]
+
+            for name, future in futures_list:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error("Парсер {} завершился с ошибкой: {}".format(name, e))
+                    result = None
+
+                self.__add_parser_result(result, name)
+
+    def receiver_stage(self, page_result_handler=None):
         """
         ОБЯЗАТЕЛЬНЫЙ МЕТОД.
         Этап 1: Получение сырых данных
         """
         rh.create_lock_file()
 
-        self.__run_one_parser(MVideoParse, name="Мвидео",
-                              url="https://www.mvideo.ru/smartfony-i-svyaz-10/smartfony-205?sort=price_asc")
-
-        # self.__run_one_parser(MTSParse, name="МТС",
-        #                       url="https://shop.mts.ru/catalog/smartfony/")
-        #
-        # self.__run_one_parser(DNSParse, name="ДНС",
-        #                       url="https://www.dns-shop.ru/catalog/17a8a01d16404e77/smartfony/")
-        #
-        # self.__run_one_parser(CitilinkParse, name="Ситилинк",
-        #                       url="https://www.citilink.ru/catalog/mobile/smartfony/")
-        #
-        # self.__run_one_parser(EldoradoParse, name="Эльдорадо",
-        #                       url="https://www.eldorado.ru/c/smartfony/")
+        if rh.RECEIVER_POOL_TYPE in ('thread', 'process') and rh.RECEIVER_MAX_WORKERS > 1:
+            self.__run_all_parsers_concurrently(page_result_handler)
+        else:
+            for parser_class, name, url in PARSERS_LIST:
+                self.__run_one_parser(parser_class, url, name, page_result_handler)
+
+        proxy_pool.save_pool()
 
+        h.flush_undefined_model_names()
         rh.delete_lock_file()
         rh.clear_count_crash()
         FileWorker.csv_data.save(h.CSV_PATH, data=self.data_receiver_result_list, namedtuple_type=h.ParseResult)
@@ -86,9 +169,56 @@ class Runner:
         ОБЯЗАТЕЛЬНЫЙ МЕТОД.
         Этап 3: Добавление валидных данных в БД и выборка по определенным критериям
         """
-        inserter = DbInserter(self.data_validator_result_list)
+        inserter = self.__create_inserter(self.data_validator_result_list)
         self.db_inserter_result_list = inserter.run()
 
+    @staticmethod
+    def __create_inserter(parse_result_list=None):
+        """
+        DbInserter для текущего способа получения данных: при воспроизведении из кэша страниц данные добавляются
+        в отдельную базу rh.REPLAY_DB_NAME, чтобы устаревшие цены не попали в историю цен основной базы
+        """
+        if rh.RECEIVER_BACKEND == 'replay':
+            return DbInserter(parse_result_list, db_name=rh.REPLAY_DB_NAME)
+
+        return DbInserter(parse_result_list)
+
+    @staticmethod
+    def __iter_queue(chunk_queue):
+        """
+        Генератор списков товаров из очереди до None - признака завершения этапа получения данных
+        """
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    def __iter_validated(self, chunk_queue):
+        """
+        Генератор проверенных списков товаров из очереди, проверенные товары также собираются для этапов 4-5
+        """
+        for chunk in DataValidator.iter_validated(self.__iter_queue(chunk_queue)):
+            self.data_validator_result_list.extend(chunk)
+            yield chunk
+
+    def streaming_stage(self):
+        """
+        ОБЯЗАТЕЛЬНЫЙ МЕТОД.
+        Этапы 1-3 в потоковом режиме: товары каждой разобранной страницы через очередь передаются в отдельный
+        поток, где проходят валидацию и добавляются в БД, пока парсеры продолжают работу. Проверка выгоды (этап 4)
+        сравнивает цены всех магазинов, поэтому запускается после добавления в БД товаров всех магазинов
+        """
+        chunk_queue = queue.Queue()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            inserter_future = executor.submit(self.__create_inserter().run_stream, self.__iter_validated(chunk_queue))
+            try:
+                self.receiver_stage(page_result_handler=chunk_queue.put)
+            finally:
+                chunk_queue.put(None)
+
+            self.db_inserter_result_list = inserter_future.result()
+
     def checker_stage(self):
         """
         ОБЯЗАТЕЛЬНЫЙ МЕТОД.
@@ -114,14 +244,25 @@ class Runner:
         # result_list = load_result_from_csv("goods2.csv")
         time_start = time()
 
-        # Этап 1: Получение сырых данных
-        self.receiver_stage()
+        if rh.PIPELINE_MODE == 'stream':
+            # Этапы 1-3: Получение, валидация и добавление данных в БД по мере разбора страниц
+            self.streaming_stage()
+        else:
+            # Этап 1: Получение сырых данных
+            self.receiver_stage()
 
-        # Этап 2: Валидация сырых данных
-        self.validator_stage()
+            # Этап 2: Валидация сырых данных
+            self.validator_stage()
 
-        # Этап 3: Добавление валидных данных в БД и выборка по определенным критериям
-        self.inserter_stage()
+            # Этап 3: Добавление валидных данных в БД и выборка по определенным критериям
+            self.inserter_stage()
+
+        # Воспроизведение из кэша страниц нужно для повторяемых замеров: по устаревшим ценам нельзя публиковать
+        # посты и проверять актуальность уже опубликованных
+        if rh.RECEIVER_BACKEND == 'replay':
+            logger.info("Воспроизведение из кэша страниц: проверка выгоды и отправка пропущены")
+            logger.info(f"Время выполнения: {time() - time_start} сек")
+            return
 
         # Этап 4: Выборка данных для отправки после выборки с БД
         self.checker_stage()
@@ -4,6 +4,7 @@ import configparser
 
 import modules.common.helper as h
 from modules.common.file_worker import FileWorker
+from modules.data_receiver.parsers import lean_profile
 
 logger = h.logging.getLogger('Runner')
 
@@ -12,6 +13,16 @@ BOT_TOKEN = ''
 BOT_CHAT_ID = 0
 COUNT_CRASH = 0
 MAX_COUNT_CRASH_FOR_ALARM = 3
+# Режим запуска парсеров: thread, process или off (последовательно)
+RECEIVER_POOL_TYPE = 'off'
+RECEIVER_MAX_WORKERS = 1
+# Способ получения каталога: selenium, http (для магазинов, которые его поддерживают) или replay (кэш страниц)
+RECEIVER_BACKEND = 'selenium'
+# База данных для воспроизведения из кэша страниц: устаревшие цены не должны попасть в основную базу
+REPLAY_DB_NAME = 'parser_replay'
+# Режим конвейера этапов: batch (каждый этап получает полный список) или stream (валидация и добавление в БД
+# идут параллельно с работой парсеров по мере разбора страниц)
+PIPELINE_MODE = 'batch'
 
 
 def load_result_from_csv(name):
@@ -25,13 +36,32 @@ def read_config():
     """
     Чтение данных с config.ini
     """
-    global BOT_TOKEN, BOT_CHAT_ID
+    global BOT_TOKEN, BOT_CHAT_ID, RECEIVER_POOL_TYPE, RECEIVER_MAX_WORKERS, RECEIVER_BACKEND, PIPELINE_MODE, \
+        REPLAY_DB_NAME
 
     config = configparser.ConfigParser()
     config.read('config.ini', encoding="utf-8")
+    RECEIVER_POOL_TYPE = config.defaults().get('receiver_pool_type', 'off').lower()
+    RECEIVER_MAX_WORKERS = int(config.defaults().get('receiver_max_workers', 1))
+    RECEIVER_BACKEND = config.defaults().get('receiver_backend', 'selenium').lower()
+    PIPELINE_MODE = config.defaults().get('pipeline_mode', 'batch').lower()
+    REPLAY_DB_NAME = config.defaults().get('replay_db_name', 'parser_replay')
     h.REBUILT_IPHONE_NAME = ' ' + config.defaults()['rebuilt_iphone_name']
     h.IGNORE_WORDS_FOR_COLOR = config['parser']['color_ignore'].lower().split('\n')
 
+    h.LEAN_PROFILE = config.getboolean('DEFAULT', 'lean_profile', fallback=False)
+    h.LEAN_BLOCK_SET = lean_profile.parse_config_list(config.get('DEFAULT', 'lean_block', fallback=''))
+    unknown_set = h.LEAN_BLOCK_SET - lean_profile.BLOCKED_URL_PATTERNS_DICT.keys()
+    if unknown_set:
+        logger.warning("Неизвестные категории ресурсов в lean_block: {}".format(unknown_set))
+        h.LEAN_BLOCK_SET -= unknown_set
+    h.LEAN_ALLOW_DICT = {key[len('lean_allow_'):]: lean_profile.parse_config_list(value)
+                         for key, value in config.defaults().items() if key.startswith('lean_allow_')}
+    h.LEAN_REPORT = config.getboolean('DEFAULT', 'lean_report', fallback=False)
+    h.WEBDRIVER_PROFILES = config.getboolean('DEFAULT', 'webdriver_profiles', fallback=False)
+    h.PROXY_COOLDOWN_SEC = config.getint('DEFAULT', 'proxy_cooldown_sec', fallback=600)
+    h.PROXY_MAX_FAILURE_RATE = config.getfloat('DEFAULT', 'proxy_max_failure_rate', fallback=0.5)
+
     h.REF_LINK_MVIDEO = config['admitad']['ref_link_mvideo']
     h.REF_LINK_MTS = config['admitad']['ref_link_mts']
     h.REF_LINK_ELDORADO = config['admitad']['ref_link_eldorado']
@@ -53,6 +83,9 @@ def load_data():
     # Чтение списка разрешенных названий моделей для добавления в БД
     h.ALLOWED_MODEL_NAMES_LIST_FOR_BASE = FileWorker.list_data.load(h.LIST_MODEL_NAMES_BASE_PATH)
 
+    # Подготовка словаря исключений и списка разрешенных моделей для всех парсеров
+    h.compile_model_names_data()
+
     # Чтение значения кол-ва раз подряд, когда система падала
     COUNT_CRASH = FileWorker.list_data_int.load(h.CRASH_DATA_PATH)
     COUNT_CRASH = COUNT_CRASH[0] \
@@ -0,0 +1,122 @@
+"""
+Проверка HttpParse без сети: страницы каталога отдает http_stub_server из записанных страниц tests/fixtures/http
+"""
+import os
+import shutil
+import threading
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('bs4')
+pytest.importorskip('selenium')
+
+import modules.common.helper as h  # noqa: E402
+from modules.data_receiver.parsers import http_stub_server  # noqa: E402
+from modules.data_receiver.parsers.http_parse import HttpParse, get_fixture_name  # noqa: E402
+from modules.data_receiver.parsers.dns_parse import DNSParse  # noqa: E402
+from modules.data_receiver.parsers.mts_parse import MTSParse  # noqa: E402
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'http')
+DNS_URL = 'https://www.dns-shop.ru/catalog/17a8a01d16404e77/smartfony/'
+
+
+@pytest.fixture(autouse=True)
+def data_path(tmp_path, monkeypatch):
+    """
+    Все файлы проекта (результаты, кэши, метрики) пишутся во временный каталог, список известных моделей - свой
+    """
+    root_path = h.ROOT_PATH
+    for name in dir(h):
+        value = getattr(h, name)
+        if '_PATH' in name and isinstance(value, str) and value.startswith(root_path):
+            path = str(tmp_path) + '/' + value[len(root_path):]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            monkeypatch.setattr(h, name, path)
+
+    monkeypatch.setattr(h, 'ALLOWED_MODEL_NAMES_LIST_FOR_BASE', ['apple iphone 12', 'samsung galaxy a52'])
+    monkeypatch.setattr(h, 'ALLOWED_MODEL_NAMES_SET', None)
+    return tmp_path
+
+
+def serve(fixtures_path):
+    """
+    Запуск http_stub_server на свободном порту. Вернет (сервер, base_url)
+    """
+    server = http_stub_server.create_server(fixtures_path, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_port)
+
+
+def run_http_parse(parser_class, fixtures_path, url):
+    server, base_url = serve(fixtures_path)
+    try:
+        http_parser = HttpParse(parser_class, base_url=base_url)
+        http_parser.wait_between_pages_sec = 0
+        http_parser.parser.rate_limiter = None
+        return http_parser.run_catalog(url)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def copy_fixtures(shop, dst_path):
+    path = os.path.join(dst_path, shop)
+    shutil.copytree(os.path.join(FIXTURES_PATH, shop), path)
+    return path
+
+
+def test_dns_catalog_from_recorded_pages():
+    result_list = run_http_parse(DNSParse, os.path.join(FIXTURES_PATH, 'dns'), DNS_URL)
+
+    assert [(item.brand_name, item.model_name, item.rom, item.price) for item in result_list] == [
+        ('apple', 'iphone 12', 128, 71999),
+        ('samsung', 'galaxy a52', 128, 26999),
+        ('apple', 'iphone 12', 64, 64999),
+        ('samsung', 'galaxy a52', 256, 31999),
+    ]
+
+
+def test_dns_lazy_image_url_from_data_src():
+    result_list = run_http_parse(DNSParse, os.path.join(FIXTURES_PATH, 'dns'), DNS_URL)
+
+    assert [item.img_url for item in result_list] == [
+        'https://c.dns-shop.ru/thumb/st4/iphone12-black.jpg',
+        'https://c.dns-shop.ru/thumb/st4/galaxy-a52-blue.jpg',
+        'https://c.dns-shop.ru/thumb/st4/iphone12-white.jpg',
+        'https://c.dns-shop.ru/thumb/st4/galaxy-a52-black.jpg',
+    ]
+
+
+def test_stop_on_repeated_page(data_path):
+    # Магазин отдает последнюю страницу вместо несуществующей
+    path = copy_fixtures('dns', data_path / 'fixtures')
+    page_2 = os.path.join(path, get_fixture_name(DNS_URL + '?p=2'))
+    shutil.copy(page_2, os.path.join(path, get_fixture_name(DNS_URL + '?p=3')))
+
+    result_list = run_http_parse(DNSParse, path, DNS_URL)
+
+    assert len(result_list) == 4
+
+
+def test_stop_on_page_with_blocks_but_no_items(data_path):
+    # Блоки на месте, но цены дорисовывает браузер - страница не должна считаться пустой
+    path = copy_fixtures('dns', data_path / 'fixtures')
+    page_2 = os.path.join(path, get_fixture_name(DNS_URL + '?p=2'))
+    with open(page_2, encoding='utf-8') as f:
+        html = f.read().replace('product-buy__price', 'product-buy__price-placeholder')
+    with open(page_2, 'w', encoding='utf-8') as f:
+        f.write(html)
+    # Страница за ней тоже есть, но проход до нее дойти не должен
+    shutil.copy(os.path.join(path, get_fixture_name(DNS_URL)), os.path.join(path, get_fixture_name(DNS_URL + '?p=3')))
+
+    result_list = run_http_parse(DNSParse, path, DNS_URL)
+
+    assert [item.price for item in result_list] == [71999, 26999]
+
+
+def test_shop_without_page_query_is_not_supported():
+    http_parser = HttpParse(MTSParse, base_url='http://127.0.0.1:1')
+
+    assert not http_parser.is_supported
+    assert http_parser.run_catalog('https://shop.mts.ru/catalog/smartfony/') is None
@@ -0,0 +1,132 @@
+"""
+Проверка ProxyPool на локальных proxy-заглушках: выбор proxy для домена, остывание после ошибок и сохранение
+статистики между запусками
+"""
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+from modules.common.proxy_pool import ProxyPool  # noqa: E402
+
+URL = 'http://shop.test/catalog/'
+DOMAIN = 'http://shop.test'
+
+
+def start_dummy_proxy(status=200, delay_sec=0.0):
+    """
+    Proxy-заглушка: на любой запрос отвечает @status через @delay_sec. Вернет (сервер, адрес host:port)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay_sec)
+            self.send_response(status)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, '127.0.0.1:{}'.format(server.server_address[1])
+
+
+def get_dead_proxy():
+    """
+    Адрес, на котором никто не слушает
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return '127.0.0.1:{}'.format(sock.getsockname()[1])
+
+
+@pytest.fixture
+def proxies():
+    servers_list = []
+
+    def create(status=200, delay_sec=0.0):
+        server, address = start_dummy_proxy(status, delay_sec)
+        servers_list.append(server)
+        return address
+
+    yield create
+    for server in servers_list:
+        server.shutdown()
+        server.server_close()
+
+
+def test_untested_proxy_is_selected_first():
+    pool = ProxyPool(proxy_list=['1.1.1.1:1', '2.2.2.2:2'])
+    pool.report_success('1.1.1.1:1', DOMAIN, 0.1)
+
+    assert pool.get_proxy(DOMAIN) == '2.2.2.2:2'
+
+
+def test_probe_selects_fastest_working_proxy(proxies):
+    fast, slow, banned, dead = proxies(delay_sec=0.0), proxies(delay_sec=0.3), proxies(status=403), get_dead_proxy()
+    pool = ProxyPool(proxy_list=[slow, dead, banned, fast], cooldown_sec=60)
+
+    pool.probe(URL, timeout_sec=2)
+
+    assert pool.get_proxy(DOMAIN) == fast
+    stats_dict = {proxy: pool.stats_dict[(proxy, DOMAIN)] for proxy in (fast, slow, banned, dead)}
+    assert stats_dict[fast].avg_latency < stats_dict[slow].avg_latency
+    assert stats_dict[dead].num_failures == 1 and stats_dict[dead].cooldown_until > time.time()
+    assert stats_dict[banned].num_bans == 1
+    # Остывание после бана в 4 раза дольше, чем после ошибки
+    assert stats_dict[banned].cooldown_until - stats_dict[dead].cooldown_until > 120
+
+
+def test_proxy_is_skipped_while_cooling_down():
+    pool = ProxyPool(proxy_list=['1.1.1.1:1', '2.2.2.2:2'], cooldown_sec=0.2)
+    pool.report_success('1.1.1.1:1', DOMAIN, 0.1)
+    pool.report_success('2.2.2.2:2', DOMAIN, 0.5)
+    pool.report_failure('1.1.1.1:1', DOMAIN)
+
+    assert pool.get_proxy(DOMAIN) == '2.2.2.2:2'
+    # Статистика ведется по доменам: на другом домене proxy не остывает
+    assert pool.get_proxy('http://other.test') in ('1.1.1.1:1', '2.2.2.2:2')
+
+    time.sleep(0.25)
+    assert pool.get_proxy(DOMAIN) == '1.1.1.1:1'
+
+
+def test_cooldown_grows_with_failures_in_row():
+    pool = ProxyPool(proxy_list=['1.1.1.1:1'], cooldown_sec=10)
+    pool.report_failure('1.1.1.1:1', DOMAIN)
+    first_cooldown = pool.stats_dict[('1.1.1.1:1', DOMAIN)].cooldown_until - time.time()
+    pool.report_failure('1.1.1.1:1', DOMAIN)
+    second_cooldown = pool.stats_dict[('1.1.1.1:1', DOMAIN)].cooldown_until - time.time()
+
+    assert 9 < first_cooldown <= 10
+    assert 19 < second_cooldown <= 20
+    # Исправных proxy нет - выбирается тот, что раньше закончит остывать
+    assert pool.get_proxy(DOMAIN) == '1.1.1.1:1'
+
+
+def test_unhealthy_proxy_is_not_selected():
+    pool = ProxyPool(proxy_list=['1.1.1.1:1', '2.2.2.2:2'], cooldown_sec=0, max_failure_rate=0.5, min_requests=3)
+    for _ in range(3):
+        pool.report_failure('1.1.1.1:1', DOMAIN)
+    pool.report_success('2.2.2.2:2', DOMAIN, 5.0)
+
+    assert pool.get_proxy(DOMAIN) == '2.2.2.2:2'
+
+
+def test_stats_are_saved_and_loaded(proxies, tmp_path):
+    good, dead = proxies(), get_dead_proxy()
+    stats_path = str(tmp_path / 'proxy_stats.csv')
+    pool = ProxyPool(proxy_list=[good, dead], stats_path=stats_path, cooldown_sec=60)
+    pool.probe(URL, timeout_sec=2)
+    pool.save()
+
+    loaded_pool = ProxyPool(proxy_list=[good, dead], stats_path=stats_path, cooldown_sec=60)
+
+    assert loaded_pool.stats_dict == pool.stats_dict
+    assert loaded_pool.get_proxy(DOMAIN) == good